@@ -0,0 +1,85 @@
+"""Periodic compaction of finished and inactive users into the archive worksheet."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Set
+
+import metrics
+import sheets_client
+from config import BotConfig
+from models import User
+from user_table import UserTable, chat_ids
+
+logger = logging.getLogger(__name__)
+
+_task: asyncio.Task[None] | None = None
+
+
+def archivable_users(users: List[User], config: BotConfig, now: datetime | None = None) -> Iterable[int]:
+    """Chat ids of users who finished onboarding ``ARCHIVE_COMPLETED_DAYS`` ago or idled ``ARCHIVE_INACTIVE_DAYS``."""
+
+    now = now or datetime.utcnow()
+    table = UserTable.from_users(users)
+    return chat_ids(
+        table.archivable(
+            completed_before=now - timedelta(days=config.archive_completed_days),
+            inactive_before=now - timedelta(days=config.archive_inactive_days),
+        )
+    )
+
+
+async def run_once(config: BotConfig) -> int:
+    """Archive everything that is due, ``ARCHIVE_BATCH_SIZE`` users per move; return the total.
+
+    A user restored while the run is in progress is left for the next run.
+    """
+
+    archived: Set[int] = set()
+
+    def select(users: List[User]) -> Iterable[int]:
+        return [chat_id for chat_id in archivable_users(users, config) if chat_id not in archived]
+
+    while True:
+        moved = await sheets_client.archive_users(select, config.archive_batch_size)
+        archived.update(moved)
+        metrics.USERS_ARCHIVED.inc(amount=len(moved))
+        if len(moved) < config.archive_batch_size:
+            break
+    total = len(archived)
+    if total:
+        logger.info("Archive compaction moved %s users", total)
+    return total
+
+
+async def _run(config: BotConfig) -> None:
+    interval = config.archive_interval_hours * 3600
+    while True:
+        try:
+            await run_once(config)
+        except Exception:  # noqa: BLE001 - try again on the next pass
+            logger.exception("Archive compaction failed")
+        await asyncio.sleep(interval)
+
+
+def start(config: BotConfig) -> None:
+    """Start periodic compaction unless ``ARCHIVE_INTERVAL_HOURS`` is 0."""
+
+    global _task
+    if config.archive_interval_hours <= 0 or (_task is not None and not _task.done()):
+        return
+    _task = asyncio.create_task(_run(config))
+
+
+async def stop() -> None:
+    global _task
+    task, _task = _task, None
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,85 @@
+"""Compare the header-keyed and positional worksheet row decoders.
+
+Run from the repository root::
+
+    python benchmarks/decode_rows.py
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import User, user_from_sheet_row, users_from_sheet_values  # noqa: E402
+
+HEADER = [item for item in User.__dataclass_fields__ if item != "_dirty"]
+SIZES = (10_000, 100_000)
+REPEATS = 3
+
+
+def _values(count: int) -> List[List[str]]:
+    start = datetime(2024, 1, 1)
+    rows = [list(HEADER)]
+    for idx in range(count):
+        # Onboarding batches share minute-resolution timestamps.
+        registered = (start + timedelta(minutes=idx // 20)).isoformat()
+        rows.append(
+            [
+                str(100_000 + idx),
+                f"user{idx}",
+                "First",
+                "First Last",
+                "",
+                "City",
+                f"stage_{idx % 5}",
+                registered,
+                registered,
+                "TRUE" if idx % 3 else "FALSE",
+                "FALSE",
+            ]
+        )
+    return rows
+
+
+def _records(values: List[List[str]]) -> List[Dict[str, Any]]:
+    header = values[0]
+    return [dict(zip(header, row)) for row in values[1:]]
+
+
+def _by_records(values: List[List[str]]) -> List[User]:
+    # What get_all_records() + user_from_sheet_row() did: dicts, then keyed lookups.
+    return [user_from_sheet_row(record) for record in _records(values) if record.get("chat_id")]
+
+
+def _positional(values: List[List[str]]) -> List[User]:
+    return [user for _, user in users_from_sheet_values(values, HEADER)]
+
+
+def _best(decode: Callable[[List[List[str]]], List[User]], values: List[List[str]]) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        decode(values)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main() -> None:
+    for count in SIZES:
+        values = _values(count)
+        assert _by_records(values) == _positional(values)
+        records = _best(_by_records, values)
+        positional = _best(_positional, values)
+        print(
+            f"{count:>7} rows: records {records * 1000:8.1f} ms"
+            f"  positional {positional * 1000:8.1f} ms  ({records / positional:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
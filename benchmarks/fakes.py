@@ -0,0 +1,292 @@
+"""In-memory gspread ``Worksheet`` and a local fake Bot API server for benchmarks."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Tuple
+
+import requests
+from aiohttp import web
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+USER_HEADER = [
+    "chat_id",
+    "username",
+    "first_name",
+    "full_name",
+    "phone",
+    "city",
+    "current_stage",
+    "registered_at",
+    "last_step_at",
+    "reminder_1h_sent",
+    "reminder_24h_sent",
+]
+
+QUOTA_WINDOW_SECONDS = 60.0
+
+
+class _Cell:
+    def __init__(self, row: int, col: int, value: str) -> None:
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class _FakeSpreadsheet:
+    """Spreadsheet holding only the Users worksheet (no archive tab)."""
+
+    def __init__(self, worksheet: FakeWorksheet) -> None:
+        self._worksheet = worksheet
+
+    def worksheet(self, name: str) -> Any:
+        raise WorksheetNotFound(name)
+
+    def get_lastUpdateTime(self) -> str:
+        return self._worksheet.modified_time()
+
+
+class FakeWorksheet:
+    """Thread-safe stand-in for the subset of ``gspread.Worksheet`` the bot uses.
+
+    Every call sleeps ``latency`` seconds in the calling (executor) thread like
+    a real HTTP round trip. With ``read_quota``/``write_quota`` set, requests
+    beyond that many per minute fail with a 429 ``APIError``. ``calls`` counts
+    requests by method.
+    """
+
+    def __init__(
+        self,
+        users: int = 0,
+        latency: float = 0.0,
+        read_quota: int = 0,
+        write_quota: int = 0,
+        first_chat_id: int = 1_000_000,
+    ) -> None:
+        self.latency = latency
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self.calls: Counter[str] = Counter()
+        self.rejected: Counter[str] = Counter()
+        self._requests: Dict[str, Deque[float]] = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self.spreadsheet = _FakeSpreadsheet(self)
+        self._version = 0
+        self.rows: List[List[str]] = [list(USER_HEADER)]
+        self._row_by_chat_id: Dict[str, int] = {}
+        started = datetime(2024, 1, 1)
+        for idx in range(users):
+            at = (started + timedelta(minutes=idx)).isoformat()
+            self._add_row(
+                [
+                    str(first_chat_id + idx),
+                    f"user{idx}",
+                    "First",
+                    "First Last",
+                    "",
+                    "City",
+                    f"stage_{idx % 12}",
+                    at,
+                    at,
+                    "TRUE",
+                    "TRUE",
+                ]
+            )
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def modified_time(self) -> str:
+        """Stand-in for the Drive ``modifiedTime``: changes after every write."""
+
+        with self._lock:
+            self.calls["modified_time"] += 1
+            return str(self._version)
+
+    def get_all_values(self) -> List[List[str]]:
+        self._request("read", "get_all_values")
+        with self._lock:
+            return [list(row) for row in self.rows]
+
+    def row_values(self, row: int) -> List[str]:
+        self._request("read", "row_values")
+        with self._lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col: int) -> List[str]:
+        self._request("read", "col_values")
+        with self._lock:
+            return [row[col - 1] if col <= len(row) else "" for row in self.rows]
+
+    def find(self, query: str, in_column: int | None = None) -> _Cell | None:
+        self._request("read", "find")
+        with self._lock:
+            row = self._row_by_chat_id.get(query) if in_column == 1 else None
+        return _Cell(row, 1, query) if row is not None else None
+
+    def acell(self, label: str) -> _Cell:
+        self._request("read", "acell")
+        row, col = a1_to_rowcol(label)
+        with self._lock:
+            values = self.rows[row - 1] if row <= len(self.rows) else []
+        return _Cell(row, col, values[col - 1] if col <= len(values) else "")
+
+    def batch_get(self, ranges: List[str], major_dimension: str | None = None) -> List[List[List[str]]]:
+        """Values of ``A1:K9``-style or whole-column ``A:A`` ranges, trailing blanks trimmed."""
+
+        self._request("read", "batch_get")
+        result = []
+        with self._lock:
+            for a1_range in ranges:
+                start, _, end = a1_range.partition(":")
+                (first_row, first_col), (last_row, last_col) = _range_corner(start, 1), _range_corner(end, len(self.rows))
+                values = [
+                    [row[col - 1] if col <= len(row) else "" for col in range(first_col, last_col + 1)]
+                    for row in self.rows[first_row - 1 : last_row]
+                ]
+                if major_dimension == "COLUMNS":
+                    values = [list(column) for column in zip(*values)]
+                result.append([_trim(line) for line in values])
+        return result
+
+    def append_row(self, values: List[Any], value_input_option: str = "RAW") -> Dict[str, Any]:
+        return self.append_rows([values], value_input_option)
+
+    def append_rows(self, values: List[List[Any]], value_input_option: str = "RAW") -> Dict[str, Any]:
+        self._request("write", "append_rows")
+        with self._lock:
+            first = len(self.rows) + 1
+            for row in values:
+                self._add_row([str(value) for value in row])
+            last = len(self.rows)
+            self._version += 1
+        return {"updates": {"updatedRange": f"Users!A{first}:K{last}"}}
+
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs: Any) -> Dict[str, Any]:
+        self._request("write", "batch_update")
+        with self._lock:
+            for item in data:
+                row, col = a1_to_rowcol(item["range"].split(":")[0])
+                target = self.rows[row - 1]
+                for offset, value in enumerate(item["values"][0]):
+                    while len(target) < col + offset:
+                        target.append("")
+                    target[col - 1 + offset] = str(value)
+            self._version += 1
+        return {}
+
+    def _add_row(self, row: List[str]) -> None:
+        self.rows.append(row)
+        self._row_by_chat_id.setdefault(row[0], len(self.rows))
+
+    def _request(self, kind: str, method: str) -> None:
+        quota = self.quotas[kind]
+        with self._lock:
+            if quota:
+                now = time.monotonic()
+                window = self._requests[kind]
+                while window and now - window[0] >= QUOTA_WINDOW_SECONDS:
+                    window.popleft()
+                if len(window) >= quota:
+                    self.rejected[method] += 1
+                    raise APIError(_quota_response())
+                window.append(now)
+            self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def _range_corner(label: str, default_row: int) -> Tuple[int, int]:
+    """Row and column of an A1 corner; a bare column (``G``) gets ``default_row``."""
+
+    if label.isalpha():
+        return default_row, a1_to_rowcol(f"{label}1")[1]
+    return a1_to_rowcol(label)
+
+
+def _trim(values: List[str]) -> List[str]:
+    end = len(values)
+    while end and values[end - 1] == "":
+        end -= 1
+    return values[:end]
+
+
+def _quota_response() -> requests.Response:
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps(
+        {"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}
+    ).encode("utf-8")
+    return response
+
+
+class FakeBotAPI:
+    """Local HTTP server answering Bot API methods with canned results.
+
+    Point a bot at it with ``TelegramAPIServer.from_base(api.base_url)``.
+    ``latency`` is added to every response; ``calls`` counts requests by method.
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.calls: Counter[str] = Counter()
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        payload = dict(await request.post()) if request.can_read_body else {}
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, payload)})
+
+    def _result(self, method: str, payload: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if not method.startswith("send"):
+            return True
+        chat_id = int(payload.get("chat_id", 0))
+        message: Dict[str, Any] = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method == "sendMessage":
+            message["text"] = payload.get("text", "")
+        elif method in {"sendVideo", "sendDocument"}:
+            file_id = f"file{next(self._file_ids)}"
+            media = {"file_id": file_id, "file_unique_id": file_id}
+            if method == "sendVideo":
+                message["video"] = {**media, "width": 1280, "height": 720, "duration": 60}
+            else:
+                message["document"] = media
+        return message
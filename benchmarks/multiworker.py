@@ -0,0 +1,206 @@
+"""Replay onboarding traffic over HTTP through the multi-process webhook.
+
+Starts ``cluster.WebhookCluster`` with each ``--processes`` count in turn, its
+Sheets writer backed by an in-memory worksheet and its workers talking to a
+local fake Bot API. Every new user posts /start and then taps every button,
+each update as soon as the previous one was acknowledged (so a chat's updates
+are in flight together, as with a fast-acking webhook). The run fails if any
+chat received its stage messages out of order. Run from the repository root::
+
+    python benchmarks/multiworker.py                     # 1, 2 and 4 worker processes
+    python benchmarks/multiworker.py --processes 4 --active 500 --sheets-latency-ms 150
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from fakes import FakeBotAPI, FakeWorksheet
+from onboarding import _configure_env, _fallback_router, _script
+
+WEBHOOK_PATH = "/webhook"
+QUIET_SECONDS = 1.0
+
+
+def _parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4], help="worker processes")
+    parser.add_argument("--users", type=int, default=10_000, help="users already in the sheet")
+    parser.add_argument("--active", type=int, default=200, help="new users replayed through every stage")
+    parser.add_argument("--concurrency", type=int, default=50, help="users onboarding at the same time")
+    parser.add_argument("--sheets-latency-ms", type=float, default=20.0)
+    parser.add_argument("--bot-latency-ms", type=float, default=5.0)
+    parser.add_argument("--read-quota", type=int, default=0, help="fake Sheets reads per minute (0 = unlimited)")
+    parser.add_argument("--write-quota", type=int, default=0, help="fake Sheets writes per minute (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for all replies")
+    parser.add_argument("--verbose", action="store_true", help="log what every process does")
+    return parser.parse_args(argv)
+
+
+# The three hooks below run in the spawned writer and worker processes.
+
+
+def _bench_writer(config: Any) -> None:
+    import sheets_api
+
+    sheets_api._worksheet = FakeWorksheet(  # type: ignore[assignment]
+        int(os.environ["BENCH_SHEET_USERS"]),
+        latency=float(os.environ["BENCH_SHEETS_LATENCY_MS"]) / 1000,
+        read_quota=int(os.environ["BENCH_READ_QUOTA"]),
+        write_quota=int(os.environ["BENCH_WRITE_QUOTA"]),
+    )
+
+
+def _bench_bot(config: Any) -> Any:
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(os.environ["BENCH_BOT_API_URL"]))
+    return Bot(config.telegram_token, session=session, default=DefaultBotProperties(parse_mode="HTML"))
+
+
+def _bench_dispatcher(dp: Any) -> None:
+    try:
+        from handlers import register_all_handlers
+    except ImportError:
+        dp.include_router(_fallback_router())
+    else:
+        register_all_handlers(dp)
+
+
+class _RecordingBotAPI(FakeBotAPI):
+    """Fake Bot API that also keeps each chat's message texts in arrival order."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        super().__init__(latency)
+        self.texts: Dict[int, List[str]] = defaultdict(list)
+        self.last_call_at = time.perf_counter()
+
+    def _result(self, method: str, payload: Dict[str, Any]) -> Any:
+        self.last_call_at = time.perf_counter()
+        if method == "sendMessage":
+            self.texts[int(payload["chat_id"])].append(str(payload.get("text", "")))
+        return super()._result(method, payload)
+
+
+def _out_of_order(texts: Dict[int, List[str]]) -> List[int]:
+    """Chats whose stage messages did not arrive in stage order."""
+
+    from constants import DEFAULT_STAGE_ORDER
+    from stage_render import compile_stages, render
+
+    compile_stages()
+    position = {render(stage).text: idx for idx, stage in enumerate(DEFAULT_STAGE_ORDER)}
+    broken = []
+    for chat_id, sent in texts.items():
+        stages = [position[text] for text in sent if text in position]
+        if stages != sorted(stages):
+            broken.append(chat_id)
+    return broken
+
+
+async def _run(args: argparse.Namespace, processes: int) -> Dict[str, Any]:
+    import aiohttp
+    from aiohttp import web
+
+    from cluster import WebhookCluster
+    from config import load_config
+
+    api = _RecordingBotAPI(latency=args.bot_latency_ms / 1000)
+    await api.start()
+    os.environ["BENCH_BOT_API_URL"] = api.base_url
+    os.environ["BENCH_SHEET_USERS"] = str(args.users)
+    os.environ["BENCH_SHEETS_LATENCY_MS"] = str(args.sheets_latency_ms)
+    os.environ["BENCH_READ_QUOTA"] = str(args.read_quota)
+    os.environ["BENCH_WRITE_QUOTA"] = str(args.write_quota)
+
+    app = web.Application()
+    cluster = WebhookCluster(load_config(), processes, _bench_bot, _bench_dispatcher, _bench_writer)
+    cluster.register(app, WEBHOOK_PATH)
+    runner = web.AppRunner(app, access_log=None)
+    started = time.perf_counter()
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    startup_seconds = time.perf_counter() - started
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}{WEBHOOK_PATH}"  # type: ignore[union-attr]
+
+    update_ids = itertools.count(1)
+    first_chat_id = 1
+    scripts = [_script(chat_id, update_ids) for chat_id in range(first_chat_id, first_chat_id + args.active)]
+    ack_latencies: List[float] = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def replay(http: aiohttp.ClientSession, script: List[Dict[str, Any]]) -> None:
+        async with slots:
+            for payload in script:
+                while True:
+                    posted = time.perf_counter()
+                    async with http.post(url, json=payload) as response:
+                        ack_latencies.append(time.perf_counter() - posted)
+                        if response.status == 200:
+                            break
+                    await asyncio.sleep(0.1)  # 503: redeliver like Telegram
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(replay(http, script) for script in scripts))
+    deadline = started + args.timeout
+    while time.perf_counter() - api.last_call_at < QUIET_SECONDS and time.perf_counter() < deadline:
+        await asyncio.sleep(0.1)
+    elapsed = api.last_call_at - started
+    stats = cluster.stats()
+
+    await runner.cleanup()
+    await api.close()
+
+    updates = sum(len(script) for script in scripts)
+    quantiles = statistics.quantiles(ack_latencies, n=100)
+    return {
+        "processes": processes,
+        "updates": updates,
+        "updates_per_second": round(updates / elapsed, 1),
+        "ack_p50_ms": round(quantiles[49] * 1000, 2),
+        "ack_p99_ms": round(quantiles[98] * 1000, 2),
+        "rejected": stats["rejected"],
+        "startup_seconds": round(startup_seconds, 2),
+        "chats_answered": len(api.texts),
+        "out_of_order": _out_of_order(api.texts),
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    # The fake Bot API has no global quota; per-chat limits still apply.
+    os.environ.setdefault("OUTBOUND_MESSAGES_PER_SECOND", "100000")
+    failed = False
+    for processes in args.processes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            _configure_env(args, data_dir)
+            result = asyncio.run(_run(args, processes))
+        print(
+            f"{result['processes']} processes: {result['updates']} updates, {result['updates_per_second']}/s, "
+            f"ack p50 {result['ack_p50_ms']} ms, p99 {result['ack_p99_ms']} ms, {result['rejected']} rejected, "
+            f"{result['chats_answered']}/{args.active} chats answered, startup {result['startup_seconds']} s, "
+            f"{len(result['out_of_order'])} chats out of order"
+        )
+        failed = failed or bool(result["out_of_order"]) or result["chats_answered"] != args.active
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
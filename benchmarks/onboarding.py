@@ -0,0 +1,300 @@
+"""Replay synthetic onboarding traffic through the real Dispatcher.
+
+Each size runs in a fresh process against an in-memory worksheet pre-filled
+with that many users and a local fake Bot API. ``--active`` new users then
+register and tap every button of all 12 stages. Run from the repository root::
+
+    python benchmarks/onboarding.py                      # 1k/10k/100k vs. saved baseline
+    python benchmarks/onboarding.py --save               # record a new baseline
+    python benchmarks/onboarding.py --sizes 1000 --sheets-latency-ms 150 --write-quota 60
+
+Environment variables such as ``SHEETS_WRITE_BEHIND_MS`` or ``STORAGE_BACKEND``
+are passed through, so configurations can be compared on the same traffic.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "onboarding.json"
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+COMPARED = ("p50_ms", "p95_ms", "p99_ms", "sheets_calls_per_update", "index_load_seconds", "peak_rss_mb")
+
+
+def _parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="users in the sheet")
+    parser.add_argument("--active", type=int, default=200, help="new users replayed through every stage")
+    parser.add_argument("--concurrency", type=int, default=50, help="users onboarding at the same time")
+    parser.add_argument("--sheets-latency-ms", type=float, default=20.0)
+    parser.add_argument("--bot-latency-ms", type=float, default=5.0)
+    parser.add_argument("--read-quota", type=int, default=0, help="fake Sheets reads per minute (0 = unlimited)")
+    parser.add_argument("--write-quota", type=int, default=0, help="fake Sheets writes per minute (0 = unlimited)")
+    parser.add_argument("--repeat-taps", type=int, default=0, help="extra taps on every button (double taps)")
+    parser.add_argument("--save", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    parser.add_argument("--run", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def _configure_env(args: argparse.Namespace, data_dir: str) -> None:
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:benchmark")
+    os.environ.setdefault("GOOGLE_SHEETS_CONFIG", json.dumps({"client_email": "bench@example.com"}))
+    os.environ.setdefault("GOOGLE_SPREADSHEET_ID", "benchmark")
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.pop("SQLITE_PATH", None)
+    # The client-side budgets mirror the fake quota; without one they must not throttle.
+    os.environ.setdefault("SHEETS_READ_PER_MINUTE", str(args.read_quota or 1_000_000))
+    os.environ.setdefault("SHEETS_WRITE_PER_MINUTE", str(args.write_quota or 1_000_000))
+
+
+def _fallback_router() -> Any:
+    """Minimal onboarding flow used when the ``handlers`` package is not available."""
+
+    from aiogram import Bot, Router
+    from aiogram.filters import CommandStart
+    from aiogram.types import CallbackQuery, Message
+
+    import sheets_client
+    from constants import DEFAULT_STAGE_ORDER, FINAL_CONGRATS_TEXT
+    from media_cache import get_media_cache, send_stage_video
+    from stage_render import render, route
+
+    router = Router()
+
+    async def send_stage(bot: Bot, chat_id: int, stage: str) -> None:
+        payload = render(stage)
+        cache = get_media_cache(Path(os.environ["DATA_DIR"]))
+        await send_stage_video(bot, cache, chat_id, stage)
+        await bot.send_message(chat_id, payload.text, reply_markup=payload.reply_markup)
+
+    @router.message(CommandStart())
+    async def on_start(message: Message, bot: Bot) -> None:
+        chat_id = message.chat.id
+        user = await sheets_client.get_user_by_chat_id(chat_id)
+        if user is None:
+            now = datetime.utcnow()
+            user = await sheets_client.create_user(
+                {
+                    "chat_id": chat_id,
+                    "username": message.from_user.username if message.from_user else None,
+                    "first_name": message.from_user.first_name if message.from_user else None,
+                    "current_stage": DEFAULT_STAGE_ORDER[0],
+                    "registered_at": now,
+                    "last_step_at": now,
+                }
+            )
+        await send_stage(bot, chat_id, user.current_stage or DEFAULT_STAGE_ORDER[0])
+
+    @router.callback_query()
+    async def on_button(callback: CallbackQuery, bot: Bot) -> None:
+        target = route(callback.data or "")
+        chat_id = callback.from_user.id
+        if target is not None and target.next_stage is not None:
+            await sheets_client.update_user(
+                chat_id,
+                {"current_stage": target.next_stage, "last_step_at": datetime.utcnow()},
+            )
+            await send_stage(bot, chat_id, target.next_stage)
+        elif target is not None and target.action == "complete":
+            await sheets_client.update_user(chat_id, {"last_step_at": datetime.utcnow()})
+            await bot.send_message(chat_id, FINAL_CONGRATS_TEXT)
+        await callback.answer()
+
+    return router
+
+
+def _script(chat_id: int, update_ids: "itertools.count[int]", repeat_taps: int = 0) -> List[Dict[str, Any]]:
+    from constants import DEFAULT_STAGE_ORDER, STAGE_TEXTS
+
+    user = {"id": chat_id, "is_bot": False, "first_name": "Bench", "username": f"bench{chat_id}"}
+    chat = {"id": chat_id, "type": "private"}
+    updates: List[Dict[str, Any]] = [
+        {
+            "update_id": next(update_ids),
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": user,
+                "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        }
+    ]
+    for stage in DEFAULT_STAGE_ORDER:
+        for button in STAGE_TEXTS[stage]["buttons"]:
+            for _ in range(1 + repeat_taps):
+                update_id = next(update_ids)
+                updates.append(
+                    {
+                        "update_id": update_id,
+                        "callback_query": {
+                            "id": str(update_id),
+                            "from": user,
+                            "chat_instance": str(chat_id),
+                            "data": button["callback_data"],
+                            "message": {"message_id": 2, "date": int(time.time()), "chat": chat, "text": stage},
+                        },
+                    }
+                )
+    return updates
+
+
+async def _run(args: argparse.Namespace, users: int) -> Dict[str, Any]:
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Update
+
+    import callback_dedup
+    import sheets_api
+    import sheets_client
+    from config import get_config
+    from fakes import FakeBotAPI, FakeWorksheet
+    from stage_render import compile_stages
+
+    worksheet = FakeWorksheet(
+        users,
+        latency=args.sheets_latency_ms / 1000,
+        read_quota=args.read_quota,
+        write_quota=args.write_quota,
+    )
+    sheets_api._worksheet = worksheet  # type: ignore[assignment]
+    api = FakeBotAPI(latency=args.bot_latency_ms / 1000)
+    await api.start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api.base_url))
+    bot = Bot("123456:benchmark", session=session, default=DefaultBotProperties(parse_mode="HTML"))
+    dp = Dispatcher()
+    try:
+        from handlers import register_all_handlers
+    except ImportError:
+        dp.include_router(_fallback_router())
+    else:
+        register_all_handlers(dp)
+    deduplicator = callback_dedup.install(dp, bot, get_config().callback_dedup_seconds)
+    compile_stages()
+
+    started = time.perf_counter()
+    await sheets_client.load_user_index()
+    index_load_seconds = time.perf_counter() - started
+    worksheet.calls.clear()
+
+    update_ids = itertools.count(1)
+    scripts = [_script(chat_id, update_ids, args.repeat_taps) for chat_id in range(1, args.active + 1)]
+    latencies: List[float] = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def replay(script: List[Dict[str, Any]]) -> None:
+        async with slots:
+            for payload in script:
+                update = Update.model_validate(payload, context={"bot": bot})
+                update_started = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies.append(time.perf_counter() - update_started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(replay(script) for script in scripts))
+    await sheets_client.stop_write_behind()
+    elapsed = time.perf_counter() - started
+
+    await sheets_client.stop_index_refresh()
+    await bot.session.close()
+    await api.close()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    updates = len(latencies)
+    return {
+        "users": users,
+        "active": args.active,
+        "updates": updates,
+        "updates_per_second": round(updates / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p95_ms": round(quantiles[94] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "sheets_calls_per_update": round(worksheet.total_calls / updates, 3),
+        "sheets_calls": dict(worksheet.calls),
+        "sheets_rejected": sum(worksheet.rejected.values()),
+        "bot_api_calls_per_update": round(sum(api.calls.values()) / updates, 3),
+        "callbacks_skipped": sum(deduplicator.skipped.values()) if deduplicator else 0,
+        "saved": dict(deduplicator.saved) if deduplicator else {},
+        "index_load_seconds": round(index_load_seconds, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _run_in_subprocess(argv: List[str], users: int) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, __file__, *argv, "--run", str(users)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _print_result(result: Dict[str, Any], baseline: Dict[str, Any] | None) -> None:
+    print(
+        f"{result['users']:>7} users: {result['updates']} updates, {result['updates_per_second']}/s, "
+        f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+        f"{result['sheets_calls_per_update']} Sheets calls/update, index {result['index_load_seconds']} s, "
+        f"RSS {result['peak_rss_mb']} MB"
+    )
+    if result["callbacks_skipped"]:
+        print(f"         {result['callbacks_skipped']} repeated taps skipped, saved {result['saved']}")
+    if baseline is None:
+        return
+    deltas = []
+    for key in COMPARED:
+        before, after = baseline.get(key), result[key]
+        if before:
+            deltas.append(f"{key} {(after - before) / before * 100:+.0f}%")
+    print("         vs baseline: " + ", ".join(deltas))
+
+
+def main(argv: List[str] | None = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.run is not None:
+        with tempfile.TemporaryDirectory() as data_dir:
+            _configure_env(args, data_dir)
+            print(json.dumps(asyncio.run(_run(args, args.run))))
+        return
+
+    child_argv = [arg for arg in argv if arg != "--save"]
+    baselines: Dict[str, Any] = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    results = {}
+    for users in args.sizes:
+        result = _run_in_subprocess(child_argv, users)
+        results[str(users)] = result
+        _print_result(result, None if args.save else baselines.get(str(users)))
+
+    if args.save:
+        BASELINE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        baselines.update(results)
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {BASELINE_PATH.relative_to(ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Time UserTable queries against the equivalent Python loops over List[User].
+
+Run from the repository root::
+
+    python benchmarks/user_table_queries.py
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import DEFAULT_STAGE_ORDER  # noqa: E402
+from models import User  # noqa: E402
+from user_table import UserTable  # noqa: E402
+
+USERS = 100_000
+REPEATS = 50
+NOW = datetime(2024, 6, 1)
+HOUR = timedelta(hours=1)
+
+
+def _users(count: int) -> List[User]:
+    return [
+        User(
+            chat_id=100_000 + idx,
+            current_stage=DEFAULT_STAGE_ORDER[idx % len(DEFAULT_STAGE_ORDER)],
+            registered_at=NOW - timedelta(minutes=idx % 5000),
+            last_step_at=NOW - timedelta(minutes=idx % 500),
+            reminder_1h_sent=idx % 2 == 0,
+        )
+        for idx in range(count)
+    ]
+
+
+def _time(query: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        query()
+    return (time.perf_counter() - started) / REPEATS
+
+
+def main() -> None:
+    users = _users(USERS)
+    started = time.perf_counter()
+    table = UserTable.from_users(users)
+    print(f"build {USERS} rows: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    cutoff = NOW - HOUR
+    queries = {
+        "due 1h reminders": (
+            lambda: [u.chat_id for u in users if u.last_step_at <= cutoff and not u.reminder_1h_sent],
+            lambda: table.due_reminders("1h", HOUR, NOW),
+        ),
+        "stage counts": (
+            lambda: Counter(u.current_stage for u in users),
+            table.stage_counts,
+        ),
+        "stage audience": (
+            lambda: [u.chat_id for u in users if u.current_stage in {"stage_1", "stage_2"}],
+            lambda: table.in_stages({"stage_1", "stage_2"}),
+        ),
+    }
+    for name, (loop, vectorized) in queries.items():
+        loop_seconds = _time(loop)
+        table_seconds = _time(vectorized)
+        print(
+            f"{name:>17}: loop {loop_seconds * 1e6:9.0f} us  table {table_seconds * 1e6:7.0f} us"
+            f"  ({loop_seconds / table_seconds:.0f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""Concurrent, resumable broadcast jobs for the Welcome24 bot."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Collection, Dict, FrozenSet, List, Set
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+)
+
+import metrics
+import outbound
+import sheets_client
+from config import BotConfig
+from rate_limit import TokenBucket
+from user_table import UserTable, chat_ids
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_WORKERS = 16
+PROGRESS_INTERVAL_SECONDS = 10.0
+MAX_SEND_ATTEMPTS = 3
+RETRY_BASE_DELAY_SECONDS = 1.0
+
+_jobs: Dict[str, "BroadcastJob"] = {}
+
+
+@dataclass(slots=True)
+class BroadcastProgress:
+    """Live counters for a running broadcast."""
+
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def messages_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def render(self, job_id: str, finished: bool = False) -> str:
+        status = "завершена" if finished else "идёт"
+        return (
+            f"Рассылка {job_id} {status}: {self.done}/{self.total}\n"
+            f"Доставлено: {self.sent}, ошибок: {self.failed}, пропущено при возобновлении: {self.skipped}\n"
+            f"Скорость: {self.messages_per_second:.1f} сообщ./с"
+        )
+
+
+class BroadcastJob:
+    """One broadcast, checkpointed to ``<job_id>.json`` + an append-only ``<job_id>.log``.
+
+    The log records every chat that was handled, so a restarted process skips
+    them and continues with the rest of the audience.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        config: BotConfig,
+        job_id: str,
+        text: str,
+        stages: FrozenSet[str] | None = None,
+    ) -> None:
+        self.bot = bot
+        self.job_id = job_id
+        self.text = text
+        self.stages = stages
+        self.admin_chat_id = config.admin_chat_id
+        self.progress = BroadcastProgress()
+        self._state_dir = config.data_dir / "broadcasts"
+        self._bucket = TokenBucket(
+            "broadcast",
+            config.broadcast_messages_per_second,
+            config.broadcast_messages_per_second,
+        )
+        self._log_file = None
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def meta_path(self) -> Path:
+        return self._state_dir / f"{self.job_id}.json"
+
+    @property
+    def log_path(self) -> Path:
+        return self._state_dir / f"{self.job_id}.log"
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self.run())
+
+    async def cancel(self) -> None:
+        """Stop sending; the checkpoint stays on disk so the job can be resumed."""
+
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def run(self) -> None:
+        outbound.set_priority(outbound.BROADCAST)  # inherited by the worker tasks
+        self._state_dir.mkdir(parents=True, exist_ok=True)
+        self._write_meta(finished=False)
+        handled = self._load_handled()
+        try:
+            audience = await self._audience()
+        except Exception:  # noqa: BLE001 - the job is resumed on the next start
+            logger.exception("Broadcast %s: could not read the audience", self.job_id)
+            await self._notify_admin(f"Рассылка {self.job_id} не запущена: не удалось получить список получателей")
+            return
+
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for chat_id in audience:
+            if chat_id in handled:
+                self.progress.skipped += 1
+            else:
+                queue.put_nowait(chat_id)
+        self.progress.total = queue.qsize()
+        logger.info(
+            "Broadcast %s: %s recipients, %s already handled",
+            self.job_id,
+            self.progress.total,
+            self.progress.skipped,
+        )
+
+        progress_message_id = await self._report(None)
+        reporter = asyncio.create_task(self._report_loop(progress_message_id))
+        self._log_file = self.log_path.open("a", encoding="utf-8")
+        workers = [
+            asyncio.create_task(self._worker(queue))
+            for _ in range(min(BROADCAST_WORKERS, max(queue.qsize(), 1)))
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            reporter.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+            self._sync_log()
+            self._log_file.close()
+            self._log_file = None
+
+        self._write_meta(finished=True)
+        await self._report(progress_message_id, finished=True)
+        logger.info("Broadcast %s finished: %s sent, %s failed", self.job_id, self.progress.sent, self.progress.failed)
+
+    async def _audience(self) -> List[int]:
+        table = await sheets_client.user_table()
+        audience = chat_ids(table.in_stages(self.stages))
+        try:
+            archived = await sheets_client.list_archived_users()
+        except Exception:  # noqa: BLE001 - still reach the active users
+            logger.warning(
+                "Broadcast %s: could not read archived users, sending to active users only",
+                self.job_id,
+                exc_info=True,
+            )
+            return audience
+        # A user restored from the archive may briefly be in both worksheets.
+        active = set(chat_ids(table.chat_id))
+        restored = UserTable.from_users(user for user in archived if user.chat_id not in active)
+        return audience + chat_ids(restored.in_stages(self.stages))
+
+    async def _worker(self, queue: "asyncio.Queue[int]") -> None:
+        while True:
+            chat_id = await queue.get()
+            try:
+                delivered = await self._deliver(chat_id)
+            except Exception:  # noqa: BLE001 - one bad chat must not stop the worker
+                logger.exception("Broadcast %s: failed to send to %s", self.job_id, chat_id)
+                delivered = False
+            try:
+                self._checkpoint(chat_id, delivered)
+                metrics.BROADCAST_MESSAGES.inc("sent" if delivered else "failed")
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, chat_id: int) -> bool:
+        attempts = 0
+        while True:
+            # Per-chat spacing is left to the outbound scheduler.
+            await self._bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id, self.text)
+            except TelegramRetryAfter as exc:
+                logger.warning("Broadcast %s hit flood control, pausing %ss", self.job_id, exc.retry_after)
+                self._bucket.pause(exc.retry_after)
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as exc:
+                logger.info("Broadcast %s: skipping %s (%s)", self.job_id, chat_id, exc)
+                return False
+            except TelegramNetworkError:
+                attempts += 1
+                if attempts >= MAX_SEND_ATTEMPTS:
+                    logger.exception("Broadcast %s: giving up on %s", self.job_id, chat_id)
+                    return False
+                await asyncio.sleep(RETRY_BASE_DELAY_SECONDS * 2 ** (attempts - 1))
+                continue
+            return True
+
+    def _checkpoint(self, chat_id: int, delivered: bool) -> None:
+        if delivered:
+            self.progress.sent += 1
+        else:
+            self.progress.failed += 1
+        assert self._log_file is not None
+        self._log_file.write(f"{chat_id}\t{'ok' if delivered else 'failed'}\n")
+        # Synced per entry: a resumed job must not resend to anyone already handled.
+        self._sync_log()
+
+    def _sync_log(self) -> None:
+        if self._log_file is None:
+            return
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+
+    def _load_handled(self) -> Set[int]:
+        if not self.log_path.exists():
+            return set()
+        handled: Set[int] = set()
+        for line in self.log_path.read_text(encoding="utf-8").splitlines():
+            chat_id, _, _ = line.partition("\t")
+            if chat_id.strip():
+                handled.add(int(chat_id))
+        return handled
+
+    def _write_meta(self, finished: bool) -> None:
+        meta = {
+            "job_id": self.job_id,
+            "text": self.text,
+            "stages": sorted(self.stages) if self.stages is not None else None,
+            "finished": finished,
+        }
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self.meta_path)
+
+    async def _report(self, message_id: int | None, finished: bool = False) -> int | None:
+        if self.admin_chat_id is None:
+            return None
+        text = self.progress.render(self.job_id, finished)
+        try:
+            # The admin is waiting on these; they must not queue behind the broadcast itself.
+            with outbound.priority(outbound.INTERACTIVE):
+                if message_id is None:
+                    message = await self.bot.send_message(self.admin_chat_id, text)
+                    return message.message_id
+                await self.bot.edit_message_text(text, chat_id=self.admin_chat_id, message_id=message_id)
+        except Exception:  # noqa: BLE001 - progress reports are best effort
+            logger.warning("Failed to report broadcast %s progress", self.job_id, exc_info=True)
+        return message_id
+
+    async def _notify_admin(self, text: str) -> None:
+        if self.admin_chat_id is None:
+            return
+        try:
+            with outbound.priority(outbound.INTERACTIVE):
+                await self.bot.send_message(self.admin_chat_id, text)
+        except Exception:  # noqa: BLE001 - best effort, the failure is already logged
+            logger.warning("Failed to notify the admin about broadcast %s", self.job_id, exc_info=True)
+
+    async def _report_loop(self, message_id: int | None) -> None:
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+            message_id = await self._report(message_id)
+
+
+def start_broadcast(
+    bot: Bot,
+    config: BotConfig,
+    text: str,
+    stages: Collection[str] | None = None,
+) -> BroadcastJob:
+    """Create a broadcast for everyone (or only users in ``stages``) and start it."""
+
+    job_id = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    if job_id in _jobs:
+        job_id = f"{job_id}-{len(_jobs)}"
+    job = BroadcastJob(bot, config, job_id, text, frozenset(stages) if stages is not None else None)
+    _jobs[job_id] = job
+    job.start()
+    return job
+
+
+def resume_broadcasts(bot: Bot, config: BotConfig) -> List[BroadcastJob]:
+    """Restart every checkpointed broadcast that did not finish before the last shutdown."""
+
+    state_dir = config.data_dir / "broadcasts"
+    if not state_dir.exists():
+        return []
+
+    resumed: List[BroadcastJob] = []
+    for meta_path in sorted(state_dir.glob("*.json")):
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("finished") or meta["job_id"] in _jobs:
+            continue
+        stages = frozenset(meta["stages"]) if meta.get("stages") is not None else None
+        job = BroadcastJob(bot, config, meta["job_id"], meta["text"], stages)
+        _jobs[job.job_id] = job
+        job.start()
+        resumed.append(job)
+        logger.info("Resuming broadcast %s", job.job_id)
+    return resumed
+
+
+def active_jobs() -> List[BroadcastJob]:
+    return [job for job in _jobs.values() if job.running]
+
+
+async def stop_broadcasts() -> None:
+    """Cancel running jobs on shutdown, leaving their checkpoints for resume."""
+
+    for job in active_jobs():
+        await job.cancel()
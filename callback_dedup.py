@@ -0,0 +1,154 @@
+"""Idempotency window for repeated taps on stage buttons.
+
+Users often tap an inline button two or three times before the first reply
+arrives. Every tap would run the full handler: a ``sheets_client.update_user``
+round trip, the stage resend and, for ``stage_N_request``, a message to the
+listing manager chat. ``CallbackDeduplicator`` lets the first tap of a
+``(chat_id, callback_data)`` pair through and, for ``window`` seconds after it
+was handled, answers repeats straight away with the first tap's answer. Within
+the same window, a tap on another button leading to the stage a tap just moved
+the user to (and that they are still on) is answered the same way.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Tuple
+
+import metrics
+import sheets_client
+from stage_render import CallbackRoute, route
+
+if TYPE_CHECKING:
+    from aiogram import Bot, Dispatcher
+    from aiogram.methods import TelegramMethod
+    from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+TapKey = Tuple[int, str]
+
+_REACHED = "reached:"  # prefix of the keys recording a completed transition
+
+
+@dataclass(slots=True)
+class _Tap:
+    expires_at: float
+    text: str | None = None
+    show_alert: bool | None = None
+
+
+class CallbackDeduplicator:
+    """Outer ``callback_query`` middleware plus a Bot session middleware.
+
+    The session half records how the first tap was answered so repeats get
+    the same ``answerCallbackQuery``. Only buttons known to
+    ``stage_render.route`` are deduplicated; a tap whose handler raised is
+    forgotten so the user can retry it. A tap whose handler is still running
+    is kept apart from the expiring window, so a handler slower than
+    ``window`` cannot let a repeat through. ``skipped`` and ``saved`` count
+    what was skipped since start.
+    """
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self._taps: OrderedDict[TapKey, _Tap] = OrderedDict()
+        self._in_flight: Dict[TapKey, _Tap] = {}
+        self._answering: Dict[str, _Tap] = {}
+        self.skipped: Dict[str, int] = {"repeat": 0, "noop_transition": 0}
+        self.saved: Dict[str, int] = {"sheets_write": 0, "notification": 0}
+
+    def __len__(self) -> int:
+        return len(self._taps) + len(self._in_flight)
+
+    async def __call__(
+        self,
+        handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        target = route(event.data or "")
+        if target is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._expire(now)
+        key = (event.from_user.id, event.data or "")
+        tap = self._in_flight.get(key) or self._taps.get(key)
+        if tap is not None:
+            await self._skip(event, target, tap, "repeat")
+            return None
+        reached = (key[0], _REACHED + target.next_stage) if target.next_stage is not None else None
+        if reached is not None and reached in self._taps:
+            user = await sheets_client.get_user_by_chat_id(key[0])
+            if user is not None and user.current_stage == target.next_stage:
+                await self._skip(event, target, _Tap(now), "noop_transition")
+                return None
+
+        tap = self._in_flight[key] = _Tap(float("inf"))
+        self._answering[event.id] = tap
+        try:
+            result = await handler(event, data)
+        finally:
+            # A tap whose handler raised is forgotten so the user can retry it.
+            self._in_flight.pop(key, None)
+            self._answering.pop(event.id, None)
+        # The window starts once the first tap is done; until then the tap never expires.
+        tap.expires_at = time.monotonic() + self.window
+        self._taps.pop(key, None)
+        self._taps[key] = tap
+        if reached is not None:
+            self._taps.pop(reached, None)
+            self._taps[reached] = _Tap(tap.expires_at)
+        return result
+
+    async def record_answer(
+        self,
+        make_request: Callable[[Bot, TelegramMethod[Any]], Awaitable[Any]],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        """Session middleware: remember the ``answerCallbackQuery`` of a tap being handled."""
+
+        from aiogram.methods import AnswerCallbackQuery
+
+        if isinstance(method, AnswerCallbackQuery):
+            tap = self._answering.get(method.callback_query_id)
+            if tap is not None:
+                tap.text, tap.show_alert = method.text, method.show_alert
+        return await make_request(bot, method)
+
+    async def _skip(self, event: CallbackQuery, target: CallbackRoute, tap: _Tap, reason: str) -> None:
+        self.skipped[reason] += 1
+        self.saved["sheets_write"] += 1
+        metrics.CALLBACKS_SKIPPED.inc(reason)
+        metrics.CALLBACK_CALLS_SAVED.inc("sheets_write")
+        if target.action == "request":
+            self.saved["notification"] += 1
+            metrics.CALLBACK_CALLS_SAVED.inc("notification")
+        logger.debug("Skipped %s tap on %s from %s", reason, event.data, event.from_user.id)
+        try:
+            await event.answer(tap.text, show_alert=tap.show_alert)
+        except Exception:  # noqa: BLE001 - e.g. the query expired; nothing was done either way
+            logger.debug("Could not answer skipped callback %s", event.id, exc_info=True)
+
+    def _expire(self, now: float) -> None:
+        while self._taps:
+            key, tap = next(iter(self._taps.items()))
+            if tap.expires_at > now:
+                break
+            del self._taps[key]
+
+
+def install(dp: Dispatcher, bot: Bot, window: float) -> CallbackDeduplicator | None:
+    """Deduplicate stage button taps of ``dp`` for ``window`` seconds; ``0`` leaves them alone."""
+
+    if window <= 0:
+        return None
+    deduplicator = CallbackDeduplicator(window)
+    dp.callback_query.outer_middleware(deduplicator)
+    bot.session.middleware(deduplicator.record_answer)
+    return deduplicator
@@ -0,0 +1,98 @@
+"""Circuit breaker that stops calling a dependency while it is failing or slow."""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Deque
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Trips when too many of the last ``window`` calls failed or were slow.
+
+    After ``open_seconds`` one probe call is let through (half-open); its
+    success closes the circuit, its failure opens it again. A probe that never
+    reports back (e.g. cancelled) frees the slot after another ``open_seconds``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_call_seconds: float,
+        open_seconds: float,
+        failure_ratio: float = 0.5,
+        window: int = 20,
+        min_calls: int = 5,
+    ) -> None:
+        self.name = name
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self._outcomes: Deque[bool] = deque(maxlen=window)  # True = failed or slow
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started_at: float | None = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            return HALF_OPEN
+        return self._state
+
+    @property
+    def closed(self) -> bool:
+        return self._state == CLOSED
+
+    def allow(self) -> bool:
+        """Return whether a call may go out now; claims the probe slot when half-open."""
+
+        state = self.state
+        if state == CLOSED:
+            return True
+        now = time.monotonic()
+        probe_stuck = self._probe_started_at is not None and now - self._probe_started_at >= self.open_seconds
+        if state == HALF_OPEN and (self._probe_started_at is None or probe_stuck):
+            self._probe_started_at = now
+            return True
+        return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def record(self, seconds: float, failed: bool) -> None:
+        bad = failed or seconds >= self.slow_call_seconds
+        if self._probe_started_at is not None:
+            self._probe_started_at = None
+            if bad:
+                self._trip("probe failed")
+            else:
+                self._state = CLOSED
+                self._outcomes.clear()
+                logger.warning("%s circuit closed", self.name)
+            return
+        if self._state != CLOSED:
+            return
+        self._outcomes.append(bad)
+        if len(self._outcomes) >= self.min_calls and sum(self._outcomes) / len(self._outcomes) >= self.failure_ratio:
+            self._trip(f"{sum(self._outcomes)}/{len(self._outcomes)} recent calls failed or slow")
+
+    def _trip(self, reason: str) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.trips += 1
+        logger.warning("%s circuit opened for %.0fs: %s", self.name, self.open_seconds, reason)
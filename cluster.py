@@ -0,0 +1,695 @@
+"""Multi-process webhook serving: chat-sharded update workers and one Sheets writer.
+
+With ``WEBHOOK_PROCESSES`` above 1 the webhook process only answers Telegram
+and forwards each raw update over a Unix socket to worker process
+``crc32(chat_id) % N``, so a chat's updates are always handled by the same
+process, in order. The workers run the dispatcher. Every ``sheets_client``
+call they make is forwarded to a single writer process that owns the Sheets
+connection, the user index and the write-behind batching, and streams user
+changes back so listeners in the workers (reminders, funnel stats) stay current.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import pickle
+import shutil
+import signal
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, Deque, Dict, List, Set, Tuple
+
+from aiohttp import web
+
+import metrics
+import startup
+
+if TYPE_CHECKING:
+    from multiprocessing.process import BaseProcess
+
+    from aiogram import Bot, Dispatcher
+
+    from config import BotConfig
+    from models import User
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(processName)s %(name)s: %(message)s"
+WRITER_SOCKET = "sheets-writer.sock"
+# Batching window of the writer when SHEETS_WRITE_BEHIND_MS leaves it off.
+WRITER_WRITE_BEHIND_MS = 200
+CONNECT_TIMEOUT_SECONDS = 120.0
+CONNECT_RETRY_SECONDS = 0.1
+SUPERVISE_INTERVAL_SECONDS = 1.0
+STOP_TIMEOUT_SECONDS = 15.0
+
+_LENGTH = struct.Struct(">I")
+_CHAT_ID = struct.Struct(">q")
+_ACK = b"\x01"  # sent by a worker for every update frame once it is queued
+
+BotFactory = Callable[["BotConfig"], "Bot"]
+DispatcherSetup = Callable[["Dispatcher"], None]
+WriterSetup = Callable[["BotConfig"], None]
+
+_shard: Tuple[int, int] | None = None
+
+
+def shard_of(chat_id: int, shards: int) -> int:
+    """Index of the worker that handles ``chat_id``; stable across processes and restarts."""
+
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+def owns_chat(chat_id: int) -> bool:
+    """Whether this process handles ``chat_id``; always true outside a cluster worker."""
+
+    return _shard is None or shard_of(chat_id, _shard[1]) == _shard[0]
+
+
+def default_bot(config: BotConfig) -> Bot:
+    from aiogram import Bot
+
+    return Bot(token=config.telegram_token, parse_mode="HTML")
+
+
+def default_handlers(dp: Dispatcher) -> None:
+    from handlers import register_all_handlers
+
+    register_all_handlers(dp)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def _write_frame(writer: asyncio.StreamWriter, data: bytes) -> None:
+    writer.write(_LENGTH.pack(len(data)) + data)
+
+
+class _WorkerLink:
+    """The listener's connection to one worker.
+
+    Update frames go out in order and the worker answers each with one
+    ``_ACK`` byte once the update is in its queue, so acks are matched to
+    frames by position. A lost connection fails every unacknowledged frame.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self._unacked: Deque[asyncio.Future[None]] = deque()
+        self._ack_reader = asyncio.create_task(self._read_acks(reader))
+
+    def is_closing(self) -> bool:
+        return self.writer.is_closing()
+
+    def close(self) -> None:
+        self.writer.close()
+        self._ack_reader.cancel()
+
+    async def send(self, frame: bytes) -> None:
+        """Write ``frame`` and wait until the worker has queued it."""
+
+        # Waiting for room first keeps a frame that times out from being sent at all.
+        await self.writer.drain()
+        ack = asyncio.get_running_loop().create_future()
+        _write_frame(self.writer, frame)
+        self._unacked.append(ack)
+        await ack
+
+    async def _read_acks(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                await reader.readexactly(len(_ACK))
+                ack = self._unacked.popleft()
+                if not ack.done():
+                    ack.set_result(None)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.writer.close()
+            while self._unacked:
+                ack = self._unacked.popleft()
+                if not ack.done():
+                    ack.set_exception(ConnectionError("Worker connection lost"))
+
+
+class WebhookCluster:
+    """Webhook endpoint that spreads updates over ``processes`` worker processes.
+
+    Requests are answered once the update's worker acknowledges it is
+    queued. A worker that falls behind stops reading its socket; once that
+    backs up, or a worker dies with the update in flight, the request waits
+    briefly and then gets ``503`` so Telegram redelivers later. A body that is
+    not a JSON object is logged, counted as ``invalid`` and answered with
+    ``200``. Crashed workers and a crashed writer are restarted.
+    """
+
+    def __init__(
+        self,
+        config: BotConfig,
+        processes: int,
+        make_bot: BotFactory = default_bot,
+        setup_dispatcher: DispatcherSetup = default_handlers,
+        setup_writer: WriterSetup | None = None,
+    ) -> None:
+        self.config = config
+        self.processes = max(processes, 1)
+        self.make_bot = make_bot
+        self.setup_dispatcher = setup_dispatcher
+        self.setup_writer = setup_writer
+        self._context = multiprocessing.get_context("spawn")
+        self._socket_dir: Path | None = None
+        self._writer: BaseProcess | None = None
+        self._workers: List[BaseProcess | None] = []
+        self._links: List[_WorkerLink | None] = []
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._accepting: Set[int] = set()
+        self._supervisor: asyncio.Task[None] | None = None
+        self.forwarded = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.restarts = 0
+
+    def register(self, app: web.Application, path: str) -> None:
+        app.router.add_post(path, self.handle)
+        app.router.add_get(f"{path.rstrip('/')}/cluster", self.handle_stats)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "processes": self.processes,
+            "connected": sum(1 for link in self._links if link is not None and not link.is_closing()),
+            "forwarded": self.forwarded,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "invalid": self.invalid,
+            "restarts": self.restarts,
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        # Imported here: the Sheets writer process never loads aiogram.
+        from webhook_queue import ENQUEUE_TIMEOUT_SECONDS, update_chat_id
+
+        body = await request.read()
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise ValueError(f"expected a JSON object, got {type(payload).__name__}")
+            chat_id = update_chat_id(payload)
+        except (ValueError, KeyError, TypeError):
+            self.invalid += 1
+            logger.warning("Dropping a webhook request with a malformed body", exc_info=True)
+            return web.Response()
+        update_id = payload.get("update_id")
+        if update_id in self._seen:
+            self.duplicates += 1
+            return web.Response()
+        if update_id in self._accepting:
+            # The first delivery is still waiting on its worker; only its outcome counts.
+            self.duplicates += 1
+            return web.Response(status=503)
+
+        shard = shard_of(chat_id, self.processes)
+        link = self._links[shard] if self._links else None
+        if link is None or link.is_closing():
+            self.rejected += 1
+            logger.warning("Worker %s is unavailable, asking Telegram to retry", shard)
+            return web.Response(status=503)
+        if update_id is not None:
+            self._accepting.add(update_id)
+        try:
+            await asyncio.wait_for(link.send(_CHAT_ID.pack(chat_id) + body), ENQUEUE_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.rejected += 1
+            logger.warning("Worker %s did not accept the update, asking Telegram to retry", shard)
+            return web.Response(status=503)
+        finally:
+            self._accepting.discard(update_id)
+
+        self._remember(update_id)
+        self.forwarded += 1
+        return web.Response()
+
+    def _remember(self, update_id: int | None) -> None:
+        from webhook_queue import DEDUP_WINDOW
+
+        if update_id is None:
+            return
+        self._seen[update_id] = None
+        if len(self._seen) > DEDUP_WINDOW:
+            self._seen.popitem(last=False)
+
+    async def start(self) -> None:
+        """Start the writer, then the workers, and connect to every worker once it is warm."""
+
+        self._socket_dir = Path(tempfile.mkdtemp(prefix="welcome24-"))
+        self._writer = self._spawn_writer()
+        self._workers = [self._spawn_worker(index) for index in range(self.processes)]
+        self._links = [None] * self.processes
+        await asyncio.gather(*(self._connect(index) for index in range(self.processes)))
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info("Webhook cluster started with %s worker processes", self.processes)
+
+    async def stop(self) -> None:
+        """Stop the workers (each drains its queue) and then the writer (which flushes)."""
+
+        task, self._supervisor = self._supervisor, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        for link in self._links:
+            if link is not None:
+                link.close()
+        self._links = []
+        await asyncio.gather(*(_terminate(process) for process in self._workers if process is not None))
+        self._workers = []
+        if self._writer is not None:
+            await _terminate(self._writer)
+            self._writer = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def _socket(self, name: str) -> str:
+        assert self._socket_dir is not None
+        return str(self._socket_dir / name)
+
+    def _spawn_writer(self) -> BaseProcess:
+        process = self._context.Process(
+            target=_writer_main,
+            args=(self._socket(WRITER_SOCKET), self.setup_writer, logging.getLogger().level),
+            name="sheets-writer",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _spawn_worker(self, index: int) -> BaseProcess:
+        process = self._context.Process(
+            target=_worker_main,
+            args=(
+                index,
+                self.processes,
+                self._socket(f"worker-{index}.sock"),
+                self._socket(WRITER_SOCKET),
+                self.make_bot,
+                self.setup_dispatcher,
+                logging.getLogger().level,
+            ),
+            name=f"worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    async def _connect(self, index: int) -> None:
+        """Wait until worker ``index`` serves its socket (after warm-up) and connect to it."""
+
+        process = self._workers[index]
+        assert process is not None
+        deadline = asyncio.get_running_loop().time() + CONNECT_TIMEOUT_SECONDS
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self._socket(f"worker-{index}.sock"))
+            except (FileNotFoundError, ConnectionError):
+                if not process.is_alive():
+                    raise RuntimeError(f"Worker {index} exited with code {process.exitcode} during startup")
+                if asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"Worker {index} did not start within {CONNECT_TIMEOUT_SECONDS:.0f}s")
+                await asyncio.sleep(CONNECT_RETRY_SECONDS)
+            else:
+                self._links[index] = _WorkerLink(reader, writer)
+                return
+
+    async def _supervise(self) -> None:
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL_SECONDS)
+            if self._writer is not None and not self._writer.is_alive():
+                logger.error("Sheets writer exited with code %s, restarting it", self._writer.exitcode)
+                self.restarts += 1
+                self._writer = self._spawn_writer()
+            for index, process in enumerate(self._workers):
+                if process is None or process.is_alive():
+                    continue
+                logger.error("Worker %s exited with code %s, restarting it", index, process.exitcode)
+                self.restarts += 1
+                link, self._links[index] = self._links[index], None
+                if link is not None:
+                    link.close()
+                self._workers[index] = self._spawn_worker(index)
+                try:
+                    await self._connect(index)
+                except RuntimeError:
+                    logger.exception("Failed to restart worker %s", index)
+
+    async def _on_startup(self, app: web.Application) -> None:
+        await self.start()
+        if self.config.webhook_url:
+            bot = self.make_bot(self.config)
+            try:
+                await bot.set_webhook(self.config.webhook_url, drop_pending_updates=True)
+            finally:
+                await bot.session.close()
+        startup.mark_ready()
+
+    async def _on_shutdown(self, app: web.Application) -> None:
+        await self.stop()
+
+
+async def _terminate(process: BaseProcess) -> None:
+    if process.is_alive():
+        process.terminate()
+    await asyncio.to_thread(process.join, STOP_TIMEOUT_SECONDS)
+    if process.is_alive():
+        logger.warning("%s did not stop within %.0fs, killing it", process.name, STOP_TIMEOUT_SECONDS)
+        process.kill()
+        await asyncio.to_thread(process.join)
+
+
+def _run_child(main: Coroutine[Any, Any, None], log_level: int) -> None:
+    # Ctrl-C reaches the whole process group; the parent stops children in order.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=log_level, format=LOG_FORMAT)
+    asyncio.run(main)
+
+
+async def _until_terminated() -> None:
+    stopped = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    await stopped.wait()
+
+
+async def _start_metrics(config: BotConfig, offset: int) -> web.AppRunner | None:
+    """Serve this process's ``/metrics`` on ``METRICS_PORT + offset`` unless it is 0."""
+
+    if not config.metrics_port:
+        return None
+    return await metrics.start_server(config.listen_host, config.metrics_port + offset)
+
+
+class _SheetsWriter:
+    """Runs forwarded ``sheets_client`` calls and pushes user changes to every worker."""
+
+    def __init__(self) -> None:
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._readers: Set[asyncio.Task[Any]] = set()
+        self._calls: Set[asyncio.Task[None]] = set()
+
+    def on_user_changed(self, previous: User | None, current: User) -> None:
+        if not self._clients:
+            return
+        frame = pickle.dumps((None, previous, current))
+        for writer in self._clients:
+            if not writer.is_closing():
+                _write_frame(writer, frame)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        reader_task = asyncio.current_task()
+        assert reader_task is not None
+        self._clients.add(writer)
+        self._readers.add(reader_task)
+        try:
+            while True:
+                try:
+                    call_id, name, args, kwargs = pickle.loads(await _read_frame(reader))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                task = asyncio.create_task(self._call(writer, call_id, name, args, kwargs))
+                self._calls.add(task)
+                task.add_done_callback(self._calls.discard)
+        finally:
+            self._clients.discard(writer)
+            self._readers.discard(reader_task)
+            writer.close()
+
+    async def _call(
+        self,
+        writer: asyncio.StreamWriter,
+        call_id: int,
+        name: str,
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+    ) -> None:
+        import sheets_client
+
+        try:
+            if name not in sheets_client.FORWARDED_CALLS:
+                raise ValueError(f"sheets_client.{name} cannot be called from a worker")
+            reply = pickle.dumps((call_id, True, await getattr(sheets_client, name)(*args, **kwargs)))
+        except Exception as exc:  # noqa: BLE001 - re-raised in the calling worker
+            try:
+                reply = pickle.dumps((call_id, False, exc))
+            except Exception:  # noqa: BLE001 - e.g. an API error holding a response object
+                reply = pickle.dumps((call_id, False, RuntimeError(repr(exc))))
+        if not writer.is_closing():
+            _write_frame(writer, reply)
+
+    async def close(self) -> None:
+        """Finish the calls in flight, then disconnect the workers."""
+
+        if self._calls:
+            await asyncio.gather(*self._calls, return_exceptions=True)
+        for writer in list(self._clients):
+            writer.close()
+        if self._readers:
+            await asyncio.gather(*self._readers, return_exceptions=True)
+
+
+def _writer_main(socket_path: str, setup: WriterSetup | None, log_level: int) -> None:
+    _run_child(_serve_writer(socket_path, setup), log_level)
+
+
+async def _serve_writer(socket_path: str, setup: WriterSetup | None) -> None:
+    import archive
+    import sheets_client
+    from config import get_config
+
+    config = get_config()
+    if setup is not None:
+        setup(config)
+    # The writer batches the updates of every worker, so it always uses a window.
+    sheets_client.use_write_behind(config.sheets_write_behind_ms or WRITER_WRITE_BEHIND_MS)
+    users = await sheets_client.warm_up()
+    sheets_client.start_index_refresh()
+    archive.start(config)
+
+    writer = _SheetsWriter()
+    sheets_client.add_user_listener(writer.on_user_changed)
+    server = await asyncio.start_unix_server(writer.handle, path=socket_path)
+    runner = await _start_metrics(config, 0)
+    logger.info("Sheets writer serving %s users", users)
+
+    await _until_terminated()
+    server.close()
+    await writer.close()
+    await archive.stop()
+    await sheets_client.stop_index_refresh()
+    await sheets_client.stop_write_behind()
+    await sheets_client.close_sheets_client()
+    if runner is not None:
+        await runner.cleanup()
+
+
+class _WriterClient:
+    """A worker's connection to the Sheets writer; passed to ``sheets_client.use_writer``.
+
+    Calls are multiplexed over one socket. A lost connection fails the calls
+    in flight and is re-established by the next call (e.g. after the writer
+    was restarted).
+    """
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self._writer: asyncio.StreamWriter | None = None
+        self._reader_task: asyncio.Task[None] | None = None
+        self._calls: Dict[int, asyncio.Future[Tuple[bool, Any]]] = {}
+        self._call_ids = itertools.count()
+        self._connect_lock = asyncio.Lock()
+
+    async def __call__(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        writer = await self._connection()
+        call_id = next(self._call_ids)
+        future = self._calls[call_id] = asyncio.get_running_loop().create_future()
+        try:
+            _write_frame(writer, pickle.dumps((call_id, name, args, kwargs)))
+            await writer.drain()
+            ok, value = await future
+        finally:
+            self._calls.pop(call_id, None)
+        if not ok:
+            raise value
+        return value
+
+    async def close(self) -> None:
+        task, self._reader_task = self._reader_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _connection(self) -> asyncio.StreamWriter:
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return self._writer
+            deadline = asyncio.get_running_loop().time() + CONNECT_TIMEOUT_SECONDS
+            while True:
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                except (FileNotFoundError, ConnectionError):
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise ConnectionError("Sheets writer is unavailable") from None
+                    await asyncio.sleep(CONNECT_RETRY_SECONDS)
+                else:
+                    break
+            self._reader_task = asyncio.create_task(self._read_replies(reader))
+            return self._writer
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        import sheets_client
+
+        try:
+            while True:
+                call_id, first, second = pickle.loads(await _read_frame(reader))
+                if call_id is None:
+                    # Pushed before the reply of the call that caused it.
+                    sheets_client.notify_user_changed(first, second)
+                    continue
+                future = self._calls.get(call_id)
+                if future is not None and not future.done():
+                    future.set_result((first, second))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning("Lost the connection to the Sheets writer")
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            for future in self._calls.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Sheets writer connection lost"))
+
+
+def _worker_main(
+    index: int,
+    count: int,
+    socket_path: str,
+    writer_socket: str,
+    make_bot: BotFactory,
+    setup_dispatcher: DispatcherSetup,
+    log_level: int,
+) -> None:
+    _run_child(_serve_worker(index, count, socket_path, writer_socket, make_bot, setup_dispatcher), log_level)
+
+
+async def _serve_worker(
+    index: int,
+    count: int,
+    socket_path: str,
+    writer_socket: str,
+    make_bot: BotFactory,
+    setup_dispatcher: DispatcherSetup,
+) -> None:
+    global _shard
+
+    from aiogram import Dispatcher
+    from aiogram.types import Update
+
+    import broadcast
+    import callback_dedup
+    import funnel_stats
+    import outbound
+    import reminder_scheduler
+    import sheets_client
+    from config import get_config
+    from stage_render import compile_stages
+    from webhook_queue import FastAckWebhook
+
+    _shard = (index, count)
+    config = get_config()
+    compile_stages()
+    writer = _WriterClient(writer_socket)
+    sheets_client.use_writer(writer)
+
+    bot = make_bot(config)
+    storage = None
+    if config.fsm_storage == "sqlite":
+        from fsm_storage import SQLiteStorage
+
+        # One file for all workers: routing is sticky, so each worker loads and writes only its own chats.
+        storage = SQLiteStorage(
+            config.data_dir / "fsm.sqlite3", ttl=config.fsm_state_ttl_hours * 3600, owns_chat=owns_chat
+        )
+    dp = Dispatcher(storage=storage)
+    setup_dispatcher(dp)
+    callback_dedup.install(dp, bot, config.callback_dedup_seconds)
+    scheduler = outbound.install(bot, config.outbound_messages_per_second / count, processes=count)
+    metrics.instrument(dp, bot)
+    startup.install(dp)
+    pool = FastAckWebhook(dp, bot, config.webhook_workers, config.webhook_queue_size)
+
+    await startup.warm_up(bot, config)
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    if index == 0:
+        broadcast.resume_broadcasts(bot, config)
+    # Every worker runs a scheduler; each tracks only the chats routed to it.
+    await reminder_scheduler.start(bot)
+    pool.start()
+
+    async def receive(reader: asyncio.StreamReader, link: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    frame = await _read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                (chat_id,) = _CHAT_ID.unpack_from(frame)
+                try:
+                    update = Update.model_validate_json(frame[_CHAT_ID.size :], context={"bot": bot})
+                except ValueError:
+                    logger.exception("Dropping an update that failed validation")
+                else:
+                    # Waits while the pool is full, which backs up the socket to the listener.
+                    await pool.put(chat_id, update)
+                link.write(_ACK)
+                await link.drain()
+        finally:
+            link.close()
+
+    server = await asyncio.start_unix_server(receive, path=socket_path)
+    runner = await _start_metrics(config, 1 + index)
+    startup.mark_ready()
+
+    await _until_terminated()
+    server.close()
+    await pool.stop()
+    await reminder_scheduler.stop()
+    await broadcast.stop_broadcasts()
+    if index == 0:
+        # The writer pushes every user change to every worker, so their stats match; one copy is saved.
+        funnel_stats.stop()
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    await dp.storage.close()
+    await scheduler.close()
+    await bot.session.close()
+    await writer.close()
+    if runner is not None:
+        await runner.cleanup()
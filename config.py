@@ -23,6 +23,27 @@ def _load_json_from_env(env_value: str) -> Dict[str, Any]:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+def _int_from_env(name: str, default: int) -> int:
+    """Read an integer environment variable, falling back to ``default``."""
+
+    raw_value = os.getenv(name)
+    if not raw_value:
+        return default
+    try:
+        return int(raw_value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+def _bool_from_env(name: str, default: bool) -> bool:
+    """Read a boolean environment variable (``1/true/yes`` are truthy)."""
+
+    raw_value = os.getenv(name)
+    if not raw_value:
+        return default
+    return raw_value.strip().lower() in {"1", "true", "yes"}
+
+
 @dataclass(slots=True)
 class BotConfig:
     """Runtime configuration loaded from environment variables."""
@@ -36,6 +57,32 @@ class BotConfig:
     webhook_url: str | None
     listen_host: str
     listen_port: int
+    sheets_write_behind_ms: int
+    sheets_backend: str
+    sheets_read_per_minute: int
+    sheets_write_per_minute: int
+    sheets_call_timeout_seconds: int
+    sheets_slow_call_seconds: int
+    sheets_breaker_open_seconds: int
+    sheets_change_poll_seconds: int
+    data_dir: Path
+    broadcast_messages_per_second: int
+    outbound_messages_per_second: int
+    webhook_fast_ack: bool
+    webhook_workers: int
+    webhook_queue_size: int
+    webhook_processes: int
+    callback_dedup_seconds: int
+    storage_backend: str
+    sqlite_path: Path
+    metrics_port: int
+    archive_worksheet_name: str
+    archive_interval_hours: int
+    archive_completed_days: int
+    archive_inactive_days: int
+    archive_batch_size: int
+    fsm_storage: str
+    fsm_state_ttl_hours: int
 
 
 def load_config() -> BotConfig:
@@ -75,6 +122,56 @@ def load_config() -> BotConfig:
     listen_host = os.getenv("HOST", "0.0.0.0")
     listen_port = int(os.getenv("PORT", "8000"))
 
+    sheets_write_behind_ms = _int_from_env("SHEETS_WRITE_BEHIND_MS", 0)
+    sheets_read_per_minute = _int_from_env("SHEETS_READ_PER_MINUTE", 60)
+    sheets_write_per_minute = _int_from_env("SHEETS_WRITE_PER_MINUTE", 60)
+    sheets_call_timeout_seconds = _int_from_env("SHEETS_CALL_TIMEOUT_SECONDS", 10)
+    sheets_slow_call_seconds = _int_from_env("SHEETS_SLOW_CALL_SECONDS", 3)
+    sheets_breaker_open_seconds = _int_from_env("SHEETS_BREAKER_OPEN_SECONDS", 30)
+    if min(sheets_call_timeout_seconds, sheets_slow_call_seconds, sheets_breaker_open_seconds) <= 0:
+        raise ValueError(
+            "SHEETS_CALL_TIMEOUT_SECONDS, SHEETS_SLOW_CALL_SECONDS and SHEETS_BREAKER_OPEN_SECONDS must be positive"
+        )
+    sheets_change_poll_seconds = _int_from_env("SHEETS_CHANGE_POLL_SECONDS", 15)
+
+    data_dir = Path(os.getenv("DATA_DIR", "data"))
+    broadcast_messages_per_second = _int_from_env("BROADCAST_MESSAGES_PER_SECOND", 25)
+    outbound_messages_per_second = _int_from_env("OUTBOUND_MESSAGES_PER_SECOND", 30)
+
+    webhook_fast_ack = _bool_from_env("WEBHOOK_FAST_ACK", False)
+    webhook_workers = _int_from_env("WEBHOOK_WORKERS", 8)
+    webhook_queue_size = _int_from_env("WEBHOOK_QUEUE_SIZE", 1000)
+    webhook_processes = _int_from_env("WEBHOOK_PROCESSES", 0)
+    if webhook_processes < 0:
+        raise ValueError("WEBHOOK_PROCESSES must not be negative")
+    callback_dedup_seconds = _int_from_env("CALLBACK_DEDUP_SECONDS", 3)
+
+    storage_backend = os.getenv("STORAGE_BACKEND", "sheets").strip().lower()
+    if storage_backend not in {"sheets", "sqlite"}:
+        raise ValueError("STORAGE_BACKEND must be 'sheets' or 'sqlite'")
+    sqlite_path = Path(os.getenv("SQLITE_PATH") or data_dir / "users.sqlite3")
+
+    metrics_port = _int_from_env("METRICS_PORT", 9100)
+
+    archive_worksheet_name = os.getenv("ARCHIVE_WORKSHEET_NAME", "Archive")
+    if archive_worksheet_name == worksheet_name:
+        raise ValueError("ARCHIVE_WORKSHEET_NAME must differ from GOOGLE_WORKSHEET_NAME")
+    archive_interval_hours = _int_from_env("ARCHIVE_INTERVAL_HOURS", 0)
+    archive_completed_days = _int_from_env("ARCHIVE_COMPLETED_DAYS", 14)
+    archive_inactive_days = _int_from_env("ARCHIVE_INACTIVE_DAYS", 90)
+    archive_batch_size = _int_from_env("ARCHIVE_BATCH_SIZE", 500)
+    if archive_batch_size <= 0:
+        raise ValueError("ARCHIVE_BATCH_SIZE must be positive")
+
+    fsm_storage = os.getenv("FSM_STORAGE", "sqlite").strip().lower()
+    if fsm_storage not in {"memory", "sqlite"}:
+        raise ValueError("FSM_STORAGE must be 'memory' or 'sqlite'")
+    fsm_state_ttl_hours = _int_from_env("FSM_STATE_TTL_HOURS", 72)
+
+    sheets_backend = os.getenv("SHEETS_BACKEND", "gspread").strip().lower()
+    if sheets_backend not in {"gspread", "aiohttp"}:
+        raise ValueError("SHEETS_BACKEND must be 'gspread' or 'aiohttp'")
+
     return BotConfig(
         telegram_token=telegram_token,
         google_service_account=service_account_data,
@@ -85,5 +182,42 @@ def load_config() -> BotConfig:
         webhook_url=webhook_url,
         listen_host=listen_host,
         listen_port=listen_port,
+        sheets_write_behind_ms=sheets_write_behind_ms,
+        sheets_backend=sheets_backend,
+        sheets_read_per_minute=sheets_read_per_minute,
+        sheets_write_per_minute=sheets_write_per_minute,
+        sheets_call_timeout_seconds=sheets_call_timeout_seconds,
+        sheets_slow_call_seconds=sheets_slow_call_seconds,
+        sheets_breaker_open_seconds=sheets_breaker_open_seconds,
+        sheets_change_poll_seconds=sheets_change_poll_seconds,
+        data_dir=data_dir,
+        broadcast_messages_per_second=broadcast_messages_per_second,
+        outbound_messages_per_second=outbound_messages_per_second,
+        webhook_fast_ack=webhook_fast_ack,
+        webhook_workers=webhook_workers,
+        webhook_queue_size=webhook_queue_size,
+        webhook_processes=webhook_processes,
+        callback_dedup_seconds=callback_dedup_seconds,
+        storage_backend=storage_backend,
+        sqlite_path=sqlite_path,
+        metrics_port=metrics_port,
+        archive_worksheet_name=archive_worksheet_name,
+        archive_interval_hours=archive_interval_hours,
+        archive_completed_days=archive_completed_days,
+        archive_inactive_days=archive_inactive_days,
+        archive_batch_size=archive_batch_size,
+        fsm_storage=fsm_storage,
+        fsm_state_ttl_hours=fsm_state_ttl_hours,
     )
 
+
+_config: BotConfig | None = None
+
+
+def get_config() -> BotConfig:
+    """Return the process-wide configuration, parsing the environment on first use."""
+
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
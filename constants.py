@@ -155,6 +155,11 @@ BUTTONS: Dict[str, Any] = {
     "share_contact": {"text": "Поделиться контактом", "request_contact": True},
 }
 
+REMINDER_TEXTS: Dict[str, str] = {
+    "1h": "Напоминаем: онбординг ждёт тебя. Продолжим с того места, где ты остановился?",
+    "24h": "Ты не заходил уже сутки. Вернись к онбордингу — осталось совсем немного!",
+}
+
 LISTING_MANAGER_CHAT_ID = -1003260548150
 
 FINAL_CONGRATS_TEXT = (
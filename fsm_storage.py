@@ -0,0 +1,231 @@
+"""Persistent aiogram FSM storage so registrations survive restarts."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Set, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+logger = logging.getLogger(__name__)
+
+COMPACT_INTERVAL_SECONDS = 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    chat_id INTEGER
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at);
+"""
+
+# Files written before ``chat_id`` existed keep NULL there and are loaded by every process.
+_ADD_CHAT_ID = "ALTER TABLE fsm ADD COLUMN chat_id INTEGER;"
+
+
+@dataclass(slots=True)
+class _Record:
+    state: str | None = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+    chat_id: int | None = None
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage served from memory and persisted to a WAL-mode SQLite file.
+
+    Reads never touch the disk. Every change is awaited until it is durable,
+    but concurrent changes share one transaction (group commit), so a burst of
+    registrations costs one fsync rather than one per step. Finished flows
+    (no state, no data) are deleted, and states idle longer than ``ttl``
+    seconds are evicted lazily on read and by the hourly compaction.
+    ``data`` must be JSON-serializable.
+
+    Several processes may share one file as long as no two of them write the
+    same chat; ``owns_chat`` limits the states a process loads to its own chats.
+    """
+
+    def __init__(self, path: Path, ttl: float, owns_chat: Callable[[int], bool] | None = None) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.owns_chat = owns_chat
+        self._key_builder = DefaultKeyBuilder(with_bot_id=True, with_business_connection_id=True, with_destiny=True)
+        self._conn: sqlite3.Connection | None = None
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._commit: asyncio.Future[None] | None = None
+        self._write_lock = asyncio.Lock()
+        self._writers: Set[asyncio.Task[None]] = set()
+        self._compact_task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        self._open()
+        return len(self._records)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._record(self._key(key), key.chat_id)
+        record.state = state.state if isinstance(state, State) else state
+        await self._persist(self._key(key), record)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = self._live(self._key(key))
+        return record.state if record is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        data = dict(data)
+        json.dumps(data)  # reject unserializable data here, not in the shared batch
+        record = self._record(self._key(key), key.chat_id)
+        record.data = data
+        await self._persist(self._key(key), record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._live(self._key(key))
+        return dict(record.data) if record is not None else {}
+
+    async def close(self) -> None:
+        task, self._compact_task = self._compact_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._writers:
+            await asyncio.gather(*self._writers, return_exceptions=True)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def compact(self) -> int:
+        """Drop states idle longer than the TTL and shrink the WAL; return how many were evicted."""
+
+        self._open()
+        cutoff = time.time() - self.ttl
+        expired = [key for key, record in self._records.items() if record.updated_at < cutoff]
+        for key in expired:
+            del self._records[key]
+        async with self._write_lock:
+            await asyncio.to_thread(self._delete_expired, cutoff)
+        if expired:
+            logger.info("Evicted %s stale FSM states", len(expired))
+        return len(expired)
+
+    def _key(self, key: StorageKey) -> str:
+        return self._key_builder.build(key)
+
+    def _open(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(_SCHEMA)
+            if "chat_id" not in {column for _, column, *_ in conn.execute("PRAGMA table_info(fsm)")}:
+                conn.execute(_ADD_CHAT_ID)
+            owns_chat = self.owns_chat or (lambda chat_id: True)
+            conn.create_function("owns_chat", 1, owns_chat, deterministic=True)
+            cutoff = time.time() - self.ttl
+            for key, state, data, updated_at, chat_id in conn.execute(
+                "SELECT key, state, data, updated_at, chat_id FROM fsm"
+                " WHERE updated_at >= ? AND (chat_id IS NULL OR owns_chat(chat_id))",
+                (cutoff,),
+            ):
+                self._records[key] = _Record(state, json.loads(data), updated_at, chat_id)
+            self._conn = conn
+            logger.info("Loaded %s FSM states from %s", len(self._records), self.path)
+        return self._conn
+
+    def _live(self, key: str) -> _Record | None:
+        self._open()
+        record = self._records.get(key)
+        if record is not None and record.updated_at < time.time() - self.ttl:
+            del self._records[key]
+            return None
+        return record
+
+    def _record(self, key: str, chat_id: int) -> _Record:
+        record = self._live(key)
+        if record is None:
+            record = self._records[key] = _Record()
+        record.chat_id = chat_id  # also fills it in for states loaded from an older file
+        return record
+
+    async def _persist(self, key: str, record: _Record) -> None:
+        record.updated_at = time.time()
+        if record.empty:
+            self._records.pop(key, None)
+        self._dirty.add(key)
+        if self._compact_task is None:
+            self._compact_task = asyncio.create_task(self._compact_loop())
+        if self._commit is None:
+            self._commit = asyncio.get_running_loop().create_future()
+            writer = asyncio.create_task(self._write_batch(self._commit))
+            self._writers.add(writer)
+            writer.add_done_callback(self._writers.discard)
+        await asyncio.shield(self._commit)
+
+    async def _write_batch(self, commit: asyncio.Future[None]) -> None:
+        async with self._write_lock:
+            # Changes made from here on wait for the next batch.
+            self._commit = None
+            keys, self._dirty = self._dirty, set()
+            rows: List[Tuple[str, _Record | None]] = []
+            for key in keys:
+                record = self._records.get(key)
+                if record is not None:
+                    record = _Record(record.state, dict(record.data), record.updated_at, record.chat_id)
+                rows.append((key, record))
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as exc:
+                self._dirty |= keys
+                commit.set_exception(exc)
+                # Surfaced to the handlers awaiting it; mark it retrieved here.
+                commit.exception()
+            else:
+                commit.set_result(None)
+
+    def _write(self, rows: List[Tuple[str, _Record | None]]) -> None:
+        conn = self._open()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("DELETE FROM fsm WHERE key = ?", [(key,) for key, record in rows if record is None])
+            conn.executemany(
+                "INSERT OR REPLACE INTO fsm (key, state, data, updated_at, chat_id) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (key, record.state, json.dumps(record.data, ensure_ascii=False), record.updated_at, record.chat_id)
+                    for key, record in rows
+                    if record is not None
+                ],
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _delete_expired(self, cutoff: float) -> None:
+        conn = self._open()
+        conn.execute("DELETE FROM fsm WHERE updated_at < ?", (cutoff,))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def _compact_loop(self) -> None:
+        while True:
+            await asyncio.sleep(COMPACT_INTERVAL_SECONDS)
+            try:
+                await self.compact()
+            except Exception:  # noqa: BLE001 - retry on the next pass
+                logger.exception("FSM storage compaction failed")
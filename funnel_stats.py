@@ -0,0 +1,202 @@
+"""Incrementally maintained onboarding funnel statistics for ``/stats``."""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import statistics
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import sheets_client
+from constants import DEFAULT_STAGE_ORDER
+from models import User
+
+logger = logging.getLogger(__name__)
+
+FINAL_STAGE = DEFAULT_STAGE_ORDER[-1]
+REGISTRATION_DAYS_SHOWN = 7
+
+# Upper bounds (seconds) of the time-in-stage buckets; the last bucket is open-ended.
+HISTOGRAM_BOUNDS: Tuple[int, ...] = (60, 600, 3600, 6 * 3600, 24 * 3600, 3 * 24 * 3600, 7 * 24 * 3600)
+HISTOGRAM_LABELS: Tuple[str, ...] = ("<1м", "<10м", "<1ч", "<6ч", "<1д", "<3д", "<7д", "7д+")
+
+_STAGE_POSITIONS: Dict[str, int] = {stage: idx for idx, stage in enumerate(DEFAULT_STAGE_ORDER)}
+
+
+class FunnelStats:
+    """Per-stage counters, time-in-stage histograms and daily registrations.
+
+    Counters and registrations are rebuilt from the active and archived users
+    on startup and then follow ``sheets_client`` user listeners, so rendering
+    never touches Sheets and archiving a user does not change them.
+    Time-in-stage is measured on forward transitions seen by this process and
+    persisted to ``path`` so it survives restarts. Completion time is
+    ``last_step_at - registered_at`` of users on the final stage.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.stage_counts: Counter[str] = Counter()
+        self.registrations: Counter[date] = Counter()
+        self.histograms: Dict[str, List[int]] = {
+            stage: [0] * len(HISTOGRAM_LABELS) for stage in DEFAULT_STAGE_ORDER
+        }
+        self._completion_seconds: Dict[int, float] = {}
+
+    def rebuild(self, users: Iterable[User]) -> None:
+        self.stage_counts.clear()
+        self.registrations.clear()
+        self._completion_seconds.clear()
+        for user in users:
+            self._add(user)
+
+    def on_user_changed(self, previous: User | None, current: User) -> None:
+        if previous is not None:
+            self._remove(previous)
+            self._record_transition(previous, current)
+        self._add(current)
+
+    def median_completion(self) -> timedelta | None:
+        if not self._completion_seconds:
+            return None
+        return timedelta(seconds=statistics.median(self._completion_seconds.values()))
+
+    def render(self, today: date | None = None) -> str:
+        today = today or datetime.utcnow().date()
+        total = sum(self.stage_counts.values())
+        lines = [f"<b>Воронка онбординга</b> — всего {total}"]
+
+        known = sum(self.stage_counts.get(stage, 0) for stage in DEFAULT_STAGE_ORDER)
+        reached = known
+        for stage in DEFAULT_STAGE_ORDER:
+            share = reached / known * 100 if known else 0.0
+            lines.append(f"{stage}: {self.stage_counts.get(stage, 0)} (дошли {reached}, {share:.0f}%)")
+            reached -= self.stage_counts.get(stage, 0)
+        if total - known:
+            lines.append(f"без этапа: {total - known}")
+
+        median = self.median_completion()
+        lines.append("")
+        lines.append(
+            f"Медиана {DEFAULT_STAGE_ORDER[0]} → {FINAL_STAGE}: "
+            + (_format_duration(median) if median is not None else "нет данных")
+            + f" ({len(self._completion_seconds)} польз.)"
+        )
+
+        lines.append("")
+        lines.append("<b>Время на этапе</b> " + " / ".join(HISTOGRAM_LABELS))
+        for stage, buckets in self.histograms.items():
+            if any(buckets):
+                lines.append(f"{stage}: " + " / ".join(str(count) for count in buckets))
+
+        lines.append("")
+        lines.append("<b>Регистрации</b>")
+        for offset in range(REGISTRATION_DAYS_SHOWN):
+            day = today - timedelta(days=offset)
+            lines.append(f"{day.isoformat()}: {self.registrations.get(day, 0)}")
+        return "\n".join(lines)
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            stored: Dict[str, List[int]] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable funnel stats at %s", self.path)
+            return
+        for stage, buckets in stored.items():
+            if stage in self.histograms and len(buckets) == len(HISTOGRAM_LABELS):
+                self.histograms[stage] = [int(count) for count in buckets]
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.histograms, indent=2), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def _add(self, user: User) -> None:
+        self.stage_counts[user.current_stage or ""] += 1
+        if user.registered_at is not None:
+            self.registrations[user.registered_at.date()] += 1
+        if user.current_stage == FINAL_STAGE and user.registered_at and user.last_step_at:
+            self._completion_seconds[user.chat_id] = (user.last_step_at - user.registered_at).total_seconds()
+
+    def _remove(self, user: User) -> None:
+        key = user.current_stage or ""
+        self.stage_counts[key] -= 1
+        if self.stage_counts[key] <= 0:
+            del self.stage_counts[key]
+        if user.registered_at is not None:
+            day = user.registered_at.date()
+            self.registrations[day] -= 1
+            if self.registrations[day] <= 0:
+                del self.registrations[day]
+        self._completion_seconds.pop(user.chat_id, None)
+
+    def _record_transition(self, previous: User, current: User) -> None:
+        before = _STAGE_POSITIONS.get(previous.current_stage or "")
+        after = _STAGE_POSITIONS.get(current.current_stage or "")
+        if before is None or after is None or after <= before:
+            return
+        if previous.last_step_at is None or current.last_step_at is None:
+            return
+        seconds = (current.last_step_at - previous.last_step_at).total_seconds()
+        if seconds < 0:
+            return
+        self.histograms[DEFAULT_STAGE_ORDER[before]][bisect.bisect_right(HISTOGRAM_BOUNDS, seconds)] += 1
+
+
+def _format_duration(value: timedelta) -> str:
+    hours, remainder = divmod(int(value.total_seconds()), 3600)
+    days, hours = divmod(hours, 24)
+    minutes = remainder // 60
+    if days:
+        return f"{days}д {hours}ч"
+    if hours:
+        return f"{hours}ч {minutes}м"
+    return f"{minutes}м"
+
+
+_stats: FunnelStats | None = None
+
+
+async def start(data_dir: Path) -> FunnelStats:
+    """Build the process-wide stats from one user read and subscribe to changes."""
+
+    global _stats
+    if _stats is None:
+        _stats = FunnelStats(data_dir / "funnel_stats.json")
+        _stats.load()
+        sheets_client.add_user_listener(_stats.on_user_changed)
+    users = await sheets_client.list_users()
+    try:
+        archived = await sheets_client.list_archived_users()
+    except Exception:  # noqa: BLE001 - stats are best effort
+        logger.warning("Could not read archived users, funnel stats cover active users only", exc_info=True)
+        archived = []
+    active = {user.chat_id for user in users}
+    # A user restored from the archive may briefly be in both worksheets.
+    _stats.rebuild([*users, *(user for user in archived if user.chat_id not in active)])
+    logger.info("Funnel stats built for %s users", sum(_stats.stage_counts.values()))
+    return _stats
+
+
+def get_stats() -> FunnelStats | None:
+    return _stats
+
+
+def render_stats() -> str:
+    """Text for the ``/stats`` admin command; served from memory only."""
+
+    if _stats is None:
+        return "Статистика ещё не загружена"
+    return _stats.render()
+
+
+def stop() -> None:
+    if _stats is not None:
+        _stats.save()
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import startup  # noqa: I001 - first, so its clock starts before the heavy imports below
+
 import asyncio
 import logging
 from urllib.parse import urlparse
@@ -10,49 +12,124 @@ from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import load_config
+import callback_dedup
+import metrics
+import outbound
+from config import BotConfig, get_config
+from stage_render import compile_stages
 
 logger = logging.getLogger(__name__)
 
 
-async def _start_polling(dp: Dispatcher, bot: Bot) -> None:
+async def _start_polling(dp: Dispatcher, bot: Bot, config: BotConfig) -> None:
     await bot.delete_webhook(drop_pending_updates=True)
+    runner = None
+    if config.metrics_port:
+        runner = await metrics.start_server(config.listen_host, config.metrics_port, startup.register)
     logger.info("Starting polling mode")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
 
 
-def _run_webhook(dp: Dispatcher, bot: Bot, webhook_url: str, host: str, port: int) -> None:
-    parsed = urlparse(webhook_url)
+def _run_webhook(dp: Dispatcher, bot: Bot, config: BotConfig) -> None:
+    parsed = urlparse(config.webhook_url)
     path = parsed.path or "/webhook"
+    host, port = config.listen_host, config.listen_port
 
     logger.info("Starting webhook mode on %s:%s (path: %s)", host, port, path)
     app = web.Application()
-    SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=path)
+    metrics.register(app)
+    startup.register(app)
+    if config.webhook_fast_ack:
+        from webhook_queue import FastAckWebhook
+
+        FastAckWebhook(dp, bot, config.webhook_workers, config.webhook_queue_size).register(app, path)
+    else:
+        SimpleRequestHandler(dispatcher=dp, bot=bot).register(app, path=path)
     setup_application(app, dp, bot=bot)
     web.run_app(app, host=host, port=port)
 
 
+def _run_cluster(config: BotConfig) -> None:
+    from cluster import WebhookCluster
+
+    path = urlparse(config.webhook_url).path or "/webhook"
+    host, port = config.listen_host, config.listen_port
+
+    logger.info(
+        "Starting webhook mode on %s:%s (path: %s) with %s worker processes",
+        host,
+        port,
+        path,
+        config.webhook_processes,
+    )
+    app = web.Application()
+    metrics.register(app)
+    startup.register(app)
+    WebhookCluster(config, config.webhook_processes).register(app, path)
+    web.run_app(app, host=host, port=port)
+
+
 def main() -> None:
-    config = load_config()
+    config = get_config()
+    compile_stages()
+    if config.webhook_url and config.webhook_processes > 1:
+        # The workers and the Sheets writer build their own bots and clients.
+        _run_cluster(config)
+        return
     bot = Bot(token=config.telegram_token, parse_mode="HTML")
-    dp = Dispatcher()
+    storage = None
+    if config.fsm_storage == "sqlite":
+        from fsm_storage import SQLiteStorage
+
+        storage = SQLiteStorage(config.data_dir / "fsm.sqlite3", ttl=config.fsm_state_ttl_hours * 3600)
+    dp = Dispatcher(storage=storage)
 
     from handlers import register_all_handlers
 
     register_all_handlers(dp)
+    callback_dedup.install(dp, bot, config.callback_dedup_seconds)
+    # Registered before the metrics middleware so Bot API latency excludes queueing.
+    scheduler = outbound.install(bot, config.outbound_messages_per_second)
+    metrics.instrument(dp, bot)
+    startup.install(dp)
+
+    import archive
+    import broadcast
+    import funnel_stats
+    import reminder_scheduler
+    import sheets_client
 
     async def on_startup(bot_instance: Bot) -> None:
-        me = await bot_instance.me()
-        logger.info("Welcome24 bot ready as @%s", me.username)
+        await startup.warm_up(bot_instance, config)
+        sheets_client.start_index_refresh()
+        broadcast.resume_broadcasts(bot_instance, config)
+        archive.start(config)
+        await reminder_scheduler.start(bot_instance)
         if config.webhook_url:
             await bot_instance.set_webhook(config.webhook_url, drop_pending_updates=True)
+        startup.mark_ready()
+
+    async def on_shutdown() -> None:
+        await broadcast.stop_broadcasts()
+        await archive.stop()
+        await reminder_scheduler.stop()
+        funnel_stats.stop()
+        await sheets_client.stop_index_refresh()
+        await sheets_client.stop_write_behind()
+        await sheets_client.close_sheets_client()
+        await scheduler.close()
 
     dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
 
     if config.webhook_url:
-        _run_webhook(dp, bot, config.webhook_url, config.listen_host, config.listen_port)
+        _run_webhook(dp, bot, config)
     else:
-        asyncio.run(_start_polling(dp, bot))
+        asyncio.run(_start_polling(dp, bot, config))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+"""Persistent Telegram file_id cache for stage media."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+
+from constants import FILE_PLACEHOLDER, STAGE_VIDEO_URLS
+
+logger = logging.getLogger(__name__)
+
+
+def _asset_urls() -> Set[str]:
+    urls = {url for url in STAGE_VIDEO_URLS.values() if url}
+    urls.add(FILE_PLACEHOLDER)
+    return urls
+
+
+def _file_id(message: Message, kind: str) -> str | None:
+    # Only a file_id of the kind that was sent can be sent back the same way: a
+    # video Telegram stored as a document would be rejected by sendVideo.
+    media = getattr(message, kind)
+    return media.file_id if media is not None else None
+
+
+class MediaCache:
+    """Maps asset URLs to the ``file_id`` Telegram returned for their first upload.
+
+    Entries are keyed by URL, so replacing an asset URL in ``constants`` simply
+    misses the cache and uploads the new file once. Cluster workers share the
+    file and each writes it through its own temporary file; the last save
+    wins, so an entry another worker just learned may be uploaded once more.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file_ids: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            stored: Dict[str, str] = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable media cache at %s", self.path)
+            return
+        current = _asset_urls()
+        self._file_ids = {url: file_id for url, file_id in stored.items() if url in current}
+        logger.info("Loaded %s cached media file_ids", len(self._file_ids))
+
+    def get(self, url: str) -> str | None:
+        return self._file_ids.get(url)
+
+    def record(self, url: str, message: Message, kind: str = "video") -> None:
+        file_id = _file_id(message, kind)
+        if file_id is None or self._file_ids.get(url) == file_id:
+            return
+        self._file_ids[url] = file_id
+        self._save()
+
+    def forget(self, url: str) -> None:
+        if self._file_ids.pop(url, None) is not None:
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(self._file_ids, indent=2), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    async def send_video(self, bot: Bot, chat_id: int, url: str, **kwargs: Any) -> Message:
+        return await self._send(bot.send_video, "video", chat_id, url, **kwargs)
+
+    async def send_document(self, bot: Bot, chat_id: int, url: str, **kwargs: Any) -> Message:
+        return await self._send(bot.send_document, "document", chat_id, url, **kwargs)
+
+    async def _send(self, method: Any, kind: str, chat_id: int, url: str, **kwargs: Any) -> Message:
+        file_id = self.get(url)
+        if file_id is not None:
+            try:
+                message = await method(chat_id, file_id, **kwargs)
+            except TelegramBadRequest:
+                logger.warning("Cached file_id for %s was rejected, re-uploading", url)
+                self.forget(url)
+            else:
+                self.hits += 1
+                return message
+
+        self.misses += 1
+        message = await method(chat_id, url, **kwargs)
+        self.record(url, message, kind)
+        return message
+
+
+_cache: MediaCache | None = None
+
+
+def get_media_cache(data_dir: Path) -> MediaCache:
+    """Return the process-wide cache stored under ``data_dir``, loading it once."""
+
+    global _cache
+    if _cache is None:
+        _cache = MediaCache(data_dir / "media_cache.json")
+        _cache.load()
+    return _cache
+
+
+async def send_stage_video(bot: Bot, cache: MediaCache, chat_id: int, stage: str, **kwargs: Any) -> Message | None:
+    """Send the stage's video, reusing the cached file_id when there is one."""
+
+    url = STAGE_VIDEO_URLS.get(stage)
+    if not url:
+        return None
+    return await cache.send_video(bot, chat_id, url, **kwargs)
+
+
+async def prewarm(bot: Bot, cache: MediaCache, chat_id: int, stages: Iterable[str] | None = None) -> int:
+    """Upload every uncached stage video and the document placeholder to ``chat_id``.
+
+    Meant for an admin command: the uploads land in the admin's chat and are
+    deleted again once their file_id is recorded. Returns the number uploaded.
+    """
+
+    stage_keys = list(stages) if stages is not None else list(STAGE_VIDEO_URLS)
+    uploads = {
+        url: "video"
+        for url in (STAGE_VIDEO_URLS.get(stage) for stage in stage_keys)
+        if url and cache.get(url) is None
+    }
+    if cache.get(FILE_PLACEHOLDER) is None:
+        uploads[FILE_PLACEHOLDER] = "document"
+
+    for url, kind in uploads.items():
+        send = cache.send_video if kind == "video" else cache.send_document
+        message = await send(bot, chat_id, url, disable_notification=True)
+        try:
+            await bot.delete_message(chat_id, message.message_id)
+        except TelegramBadRequest:
+            pass
+    logger.info("Pre-warmed %s media uploads", len(uploads))
+    return len(uploads)
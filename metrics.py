@@ -0,0 +1,402 @@
+"""In-process metrics rendered in the Prometheus text exposition format."""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Tuple
+
+if TYPE_CHECKING:
+    from aiohttp import web
+    from aiogram import Bot, Dispatcher
+    from aiogram.methods import TelegramMethod
+    from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        for label_values, value in self._values.items():
+            yield self.name + "_total", label_values, value
+
+
+class Gauge:
+    """Gauge set directly or read from ``callback`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        callback: Callable[[], Dict[LabelValues, float]] | None = None,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._callback = callback
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        values = self._callback() if self._callback is not None else self._values
+        for label_values, value in values.items():
+            yield self.name, label_values, value
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``observe`` is one bisect and three additions."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        for label_values, series in self._series.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield self.name + "_bucket", label_values + (_format_value(bound),), cumulative
+            cumulative += series[len(self.buckets)]
+            yield self.name + "_bucket", label_values + ("+Inf",), cumulative
+            yield self.name + "_count", label_values, cumulative
+            yield self.name + "_sum", label_values, series[-1]
+
+
+Metric = Counter | Gauge | Histogram
+_registry: Dict[str, Metric] = {}
+
+
+def _register(metric: Metric) -> Any:
+    if metric.name in _registry:
+        raise ValueError(f"Metric '{metric.name}' is already registered")
+    _registry[metric.name] = metric
+    return metric
+
+
+def counter(name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help_text, labels))
+
+
+def gauge(
+    name: str,
+    help_text: str,
+    labels: Tuple[str, ...] = (),
+    callback: Callable[[], Dict[LabelValues, float]] | None = None,
+) -> Gauge:
+    return _register(Gauge(name, help_text, labels, callback))
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    labels: Tuple[str, ...] = (),
+    buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, help_text, labels, buckets))
+
+
+def _sheets_budget_stat(stat: str) -> Dict[LabelValues, float]:
+    # Read at scrape time; processes that never loaded the Sheets client report nothing.
+    sheets_api = sys.modules.get("sheets_api")
+    if sheets_api is None:
+        return {}
+    return {(kind,): stats[stat] for kind, stats in sheets_api.limiter_stats().items()}
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+
+    lines: List[str] = []
+    for metric in _registry.values():
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        label_names = metric.labels + (("le",) if isinstance(metric, Histogram) else ())
+        for sample_name, label_values, value in metric.samples():
+            if label_values:
+                pairs = ",".join(
+                    f'{name}="{_escape(value_)}"' for name, value_ in zip(label_names, label_values)
+                )
+                lines.append(f"{sample_name}{{{pairs}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+UPDATE_SECONDS = histogram(
+    "welcome24_update_handling_seconds",
+    "Time spent handling one update, by event type and handler",
+    ("event", "handler"),
+)
+SHEETS_CALL_SECONDS = histogram(
+    "welcome24_sheets_call_seconds",
+    "Latency of sheets_client functions and Sheets API primitives",
+    ("layer", "function"),
+)
+SHEETS_ERRORS = counter(
+    "welcome24_sheets_errors",
+    "Failed sheets_client functions and Sheets API primitives",
+    ("layer", "function"),
+)
+SHEETS_BUDGET_WAITING = gauge(
+    "welcome24_sheets_budget_waiting",
+    "Sheets calls waiting for the read or write budget",
+    ("kind",),
+    callback=lambda: _sheets_budget_stat("waiting"),
+)
+SHEETS_BUDGET_AVG_WAIT = gauge(
+    "welcome24_sheets_budget_avg_wait_seconds",
+    "Average time Sheets calls waited for the read or write budget",
+    ("kind",),
+    callback=lambda: _sheets_budget_stat("avg_wait_seconds"),
+)
+SHEETS_BUDGET_MAX_WAIT = gauge(
+    "welcome24_sheets_budget_max_wait_seconds",
+    "Longest time a Sheets call waited for the read or write budget",
+    ("kind",),
+    callback=lambda: _sheets_budget_stat("max_wait_seconds"),
+)
+EXECUTOR_INFLIGHT = gauge(
+    "welcome24_sheets_executor_inflight",
+    "gspread calls submitted to the thread pool and not finished yet",
+)
+TELEGRAM_SECONDS = histogram(
+    "welcome24_telegram_request_seconds",
+    "Latency of Bot API requests, by method",
+    ("method",),
+)
+TELEGRAM_ERRORS = counter(
+    "welcome24_telegram_errors",
+    "Failed Bot API requests, by method",
+    ("method",),
+)
+REMINDERS_SENT = counter("welcome24_reminders_sent", "Reminders delivered, by kind", ("kind",))
+REMINDERS_FAILED = counter("welcome24_reminders_failed", "Reminder sends that failed, by kind", ("kind",))
+STARTUP_SECONDS = gauge(
+    "welcome24_startup_seconds",
+    "Seconds from process start until the bot reported ready",
+)
+STARTUP_COMPONENT_SECONDS = gauge(
+    "welcome24_startup_component_seconds",
+    "Seconds each startup pre-warm step took",
+    ("component",),
+)
+TIME_TO_FIRST_RESPONSE = gauge(
+    "welcome24_time_to_first_response_seconds",
+    "Seconds from process start until the first update was handled",
+)
+BROADCAST_MESSAGES = counter(
+    "welcome24_broadcast_messages",
+    "Broadcast messages handled, by outcome",
+    ("outcome",),
+)
+USERS_ARCHIVED = counter("welcome24_users_archived", "Users moved to the archive worksheet")
+OUTBOUND_WAIT_SECONDS = histogram(
+    "welcome24_outbound_queue_wait_seconds",
+    "Time Bot API sends waited in the outbound scheduler, by priority class",
+    ("class",),
+)
+OUTBOUND_QUEUED = gauge(
+    "welcome24_outbound_queued",
+    "Bot API sends waiting in the outbound scheduler, by priority class",
+    ("class",),
+)
+SHEETS_CIRCUIT_OPEN = gauge(
+    "welcome24_sheets_circuit_open",
+    "1 while the Sheets circuit breaker is open or half-open and reads are served stale",
+)
+SHEETS_JOURNAL_ENTRIES = gauge(
+    "welcome24_sheets_journal_entries",
+    "User writes held in the local journal until Sheets is reachable again",
+)
+CALLBACKS_SKIPPED = counter(
+    "welcome24_callbacks_skipped",
+    "Stage button taps answered without running the handler, by reason",
+    ("reason",),
+)
+CALLBACK_CALLS_SAVED = counter(
+    "welcome24_callback_calls_saved",
+    "Sheets writes and listing-manager notifications avoided by skipping repeated taps",
+    ("kind",),
+)
+
+
+def observe_sheets(layer: str) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """Record latency and failures of an async Sheets function under ``layer``."""
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        name = func.__name__.lstrip("_")
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                SHEETS_ERRORS.inc(layer, name)
+                raise
+            finally:
+                SHEETS_CALL_SECONDS.observe(time.perf_counter() - started, layer, name)
+
+        return wrapper
+
+    return decorator
+
+
+# The middlewares are plain callables so importing this module (and with it
+# ``sheets_client``) does not pull in aiogram.
+
+
+class HandlerMetricsMiddleware:
+    """Inner dispatcher middleware timing each handler by its callback name."""
+
+    def __init__(self, event: str) -> None:
+        self.event = event
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = getattr(callback, "__qualname__", None) or "unknown"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - started, self.event, name)
+
+
+class TelegramMetricsMiddleware:
+    """Bot session middleware timing every Bot API request."""
+
+    async def __call__(
+        self,
+        make_request: Callable[[Bot, TelegramMethod[Any]], Awaitable[Any]],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        name = getattr(method, "__api_method__", type(method).__name__)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            TELEGRAM_ERRORS.inc(name)
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - started, name)
+
+
+def instrument(dp: Dispatcher, bot: Bot) -> None:
+    """Time every handler of ``dp`` and its sub-routers, and every Bot API request.
+
+    Inner middlewares registered on the dispatcher also wrap the handlers of
+    included routers, so one per event type is enough.
+    """
+
+    for event, observer in dp.observers.items():
+        if event in {"update", "error"}:
+            continue
+        observer.middleware(HandlerMetricsMiddleware(event))
+    bot.session.middleware(TelegramMetricsMiddleware())
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    from aiohttp import web
+
+    return web.Response(text=render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+def register(app: web.Application, path: str = "/metrics") -> None:
+    app.router.add_get(path, handle_metrics)
+
+
+async def start_server(
+    host: str,
+    port: int,
+    *registrars: Callable[[web.Application], None],
+) -> web.AppRunner:
+    """Serve ``/metrics`` (plus any ``registrars``' routes) on its own port.
+
+    Polling mode has no web app of its own, so this is its sidecar.
+    """
+
+    from aiohttp import web
+
+    app = web.Application()
+    register(app)
+    for registrar in registrars:
+        registrar(app)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics served on %s:%s/metrics", host, port)
+    return runner
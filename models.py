@@ -2,9 +2,24 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, FrozenSet, List, Sequence, Set, Tuple
+
+# Column order of the Users worksheet; ``User.to_sheet_row`` follows it.
+USER_HEADER: List[str] = [
+    "chat_id",
+    "username",
+    "first_name",
+    "full_name",
+    "phone",
+    "city",
+    "current_stage",
+    "registered_at",
+    "last_step_at",
+    "reminder_1h_sent",
+    "reminder_24h_sent",
+]
 
 
 @dataclass(slots=True)
@@ -22,6 +37,32 @@ class User:
     last_step_at: datetime | None = None
     reminder_1h_sent: bool = False
     reminder_24h_sent: bool = False
+    _dirty: Set[str] = field(default_factory=set, init=False, repr=False, compare=False)
+
+    @property
+    def dirty_fields(self) -> FrozenSet[str]:
+        """Fields changed through ``apply_updates`` since the last ``mark_clean``."""
+
+        return frozenset(self._dirty)
+
+    def apply_updates(self, updates: Dict[str, Any]) -> Set[str]:
+        """Apply known field updates and return the names whose value actually changed."""
+
+        changed: Set[str] = set()
+        for name, raw_value in updates.items():
+            if name not in _MUTABLE_FIELDS:
+                continue
+            value = _coerce_field(name, raw_value)
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.add(name)
+        self._dirty |= changed
+        return changed
+
+    def mark_clean(self) -> None:
+        """Forget tracked changes once they have been persisted."""
+
+        self._dirty.clear()
 
     def to_sheet_row(self) -> List[Any]:
         """Return the user data ordered for Google Sheets append/update operations."""
@@ -84,6 +125,104 @@ def user_from_sheet_row(row: Dict[str, Any]) -> User:
     )
 
 
+def users_from_sheet_values(
+    values: Sequence[Sequence[str]],
+    expected_header: Sequence[str],
+) -> List[Tuple[int, User]]:
+    """Decode a raw ``get_all_values()`` matrix into ``(sheet row, User)`` pairs.
+
+    The header row is mapped to column positions once and checked against
+    ``expected_header``; repeated timestamp and flag strings are parsed once.
+    Rows without a numeric ``chat_id`` are skipped.
+    """
+
+    if not values:
+        return []
+
+    positions: Dict[str, int] = {}
+    for idx, name in enumerate(values[0]):
+        positions.setdefault(str(name).strip(), idx)
+    missing = [name for name in expected_header if name not in positions]
+    if missing:
+        raise ValueError(f"Worksheet header is missing columns: {', '.join(missing)}")
+
+    (
+        chat_id_col,
+        username_col,
+        first_name_col,
+        full_name_col,
+        phone_col,
+        city_col,
+        stage_col,
+        registered_col,
+        last_step_col,
+        reminder_1h_col,
+        reminder_24h_col,
+    ) = (positions[name] for name in _SHEET_FIELDS)
+    width = max(positions[name] for name in _SHEET_FIELDS) + 1
+
+    timestamps: Dict[str, datetime | None] = {"": None}
+    flags: Dict[str, bool] = {"": False, "TRUE": True, "FALSE": False}
+
+    def timestamp(raw: str) -> datetime | None:
+        try:
+            return timestamps[raw]
+        except KeyError:
+            parsed = timestamps[raw] = _parse_datetime(raw)
+            return parsed
+
+    def flag(raw: str) -> bool:
+        try:
+            return flags[raw]
+        except KeyError:
+            parsed = flags[raw] = _parse_bool(raw)
+            return parsed
+
+    decoded: List[Tuple[int, User]] = []
+    for row_number, row in enumerate(values[1:], start=2):
+        if len(row) < width:
+            row = list(row) + [""] * (width - len(row))
+        try:
+            chat_id = int(row[chat_id_col])
+        except ValueError:
+            continue
+        decoded.append(
+            (
+                row_number,
+                User(
+                    chat_id,
+                    row[username_col] or None,
+                    row[first_name_col] or None,
+                    row[full_name_col] or None,
+                    row[phone_col] or None,
+                    row[city_col] or None,
+                    row[stage_col] or None,
+                    timestamp(row[registered_col]),
+                    timestamp(row[last_step_col]),
+                    flag(row[reminder_1h_col]),
+                    flag(row[reminder_24h_col]),
+                ),
+            )
+        )
+    return decoded
+
+
+_SHEET_FIELDS: Tuple[str, ...] = tuple(item.name for item in fields(User) if item.name != "_dirty")
+_MUTABLE_FIELDS: FrozenSet[str] = frozenset(
+    item.name for item in fields(User) if item.name not in {"chat_id", "_dirty"}
+)
+_DATETIME_FIELDS: FrozenSet[str] = frozenset({"registered_at", "last_step_at"})
+_BOOL_FIELDS: FrozenSet[str] = frozenset({"reminder_1h_sent", "reminder_24h_sent"})
+
+
+def _coerce_field(name: str, value: Any) -> Any:
+    if name in _DATETIME_FIELDS:
+        return _parse_datetime(value)
+    if name in _BOOL_FIELDS:
+        return _parse_bool(value)
+    return str(value) if value not in (None, "") else None
+
+
 def _parse_datetime(raw_value: Any) -> datetime | None:
     if not raw_value:
         return None
@@ -0,0 +1,239 @@
+"""Priority scheduler for outgoing Bot API messages.
+
+Every request that targets a chat passes through ``OutboundScheduler`` as a
+bot session middleware. Requests are granted strictly by priority class
+(interactive replies first, then reminders, broadcasts and listing-manager
+notifications) under a global and a per-chat rate budget. A flood-control
+``RetryAfter`` pauses only the class that hit it. The class comes from the
+``priority`` context, so callers only mark non-interactive work.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Deque, Dict, Iterator, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+
+import metrics
+from constants import LISTING_MANAGER_CHAT_ID
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+    from aiogram.methods import TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+REMINDER = "reminder"
+BROADCAST = "broadcast"
+NOTIFICATION = "notification"
+PRIORITY_ORDER: Tuple[str, ...] = (INTERACTIVE, REMINDER, BROADCAST, NOTIFICATION)
+
+# Telegram allows about one message per second in a private chat (with short
+# bursts) and 20 per minute in a group.
+PRIVATE_CHAT_INTERVAL_SECONDS = 1.0
+GROUP_CHAT_INTERVAL_SECONDS = 3.0
+PER_CHAT_BURST = 3
+SCAN_DEPTH = 64
+PRUNE_INTERVAL_SECONDS = 60.0
+MAX_RETRY_AFTER_ATTEMPTS = 3
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """Send every Bot API request made inside the block with priority class ``name``."""
+
+    if name not in PRIORITY_ORDER:
+        raise ValueError(f"Unknown priority class '{name}'")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def set_priority(name: str) -> None:
+    """Use ``name`` for the rest of the current task (e.g. a broadcast worker)."""
+
+    if name not in PRIORITY_ORDER:
+        raise ValueError(f"Unknown priority class '{name}'")
+    _priority.set(name)
+
+
+@dataclass(slots=True)
+class _Waiter:
+    chat_key: int | str
+    interval: float
+    future: asyncio.Future[None]
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class OutboundScheduler:
+    """Grants send slots by priority under global and per-chat budgets.
+
+    Per-chat budgets use the generic cell rate algorithm: one "theoretical
+    arrival time" per chat, so idle chats cost nothing once pruned.
+
+    Budgets are per process. When ``processes`` workers send as the same bot,
+    group chats (the listing manager's above all) are written to by every one
+    of them, so their interval is stretched ``processes`` times to keep the
+    combined rate within Telegram's limit. Private chats keep the full rate:
+    their updates, replies and reminders all come from the one owning worker.
+    """
+
+    def __init__(self, messages_per_second: float, processes: int = 1) -> None:
+        self.rate = max(messages_per_second, 1e-6)
+        self.group_interval = GROUP_CHAT_INTERVAL_SECONDS * max(processes, 1)
+        self.capacity = max(int(messages_per_second), 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._queues: Dict[str, Deque[_Waiter]] = {name: deque() for name in PRIORITY_ORDER}
+        self._paused_until: Dict[str, float] = {name: 0.0 for name in PRIORITY_ORDER}
+        self._chat_tat: Dict[int | str, float] = {}
+        self._pruned_at = time.monotonic()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    async def acquire(self, priority_class: str, chat_id: int | str) -> float:
+        """Wait for a send slot and return the seconds spent queued."""
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        interval = self.group_interval if _is_group(chat_id) else PRIVATE_CHAT_INTERVAL_SECONDS
+        waiter = _Waiter(chat_id, interval, asyncio.get_running_loop().create_future())
+        self._queues[priority_class].append(waiter)
+        metrics.OUTBOUND_QUEUED.inc(priority_class)
+        self._wakeup.set()
+        try:
+            await waiter.future
+        finally:
+            metrics.OUTBOUND_QUEUED.dec(priority_class)
+        waited = time.monotonic() - waiter.enqueued_at
+        metrics.OUTBOUND_WAIT_SECONDS.observe(waited, priority_class)
+        return waited
+
+    def pause(self, priority_class: str, seconds: float) -> None:
+        """Hold back ``priority_class`` only, e.g. after a ``RetryAfter``."""
+
+        until = time.monotonic() + seconds
+        if until > self._paused_until[priority_class]:
+            self._paused_until[priority_class] = until
+            logger.warning("Outbound %s sends paused for %.1fs", priority_class, seconds)
+        self._wakeup.set()
+
+    def queued(self) -> Dict[str, int]:
+        return {name: len(queue) for name, queue in self._queues.items()}
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self._grant_ready()
+            if delay == 0.0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant_ready(self) -> float | None:
+        """Grant the best ready waiter; return 0 if one was granted, else how long to sleep."""
+
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+
+        delay: float | None = None
+        for name in PRIORITY_ORDER:
+            queue = self._queues[name]
+            if not queue:
+                continue
+            paused_for = self._paused_until[name] - now
+            if paused_for > 0:
+                delay = paused_for if delay is None else min(delay, paused_for)
+                continue
+            for position, waiter in enumerate(queue):
+                if position >= SCAN_DEPTH:
+                    break
+                if waiter.future.done():  # cancelled by its caller
+                    del queue[position]
+                    return 0.0
+                tat = max(self._chat_tat.get(waiter.chat_key, now), now)
+                chat_wait = tat - now - waiter.interval * (PER_CHAT_BURST - 1)
+                if chat_wait > 0:
+                    delay = chat_wait if delay is None else min(delay, chat_wait)
+                    continue
+                del queue[position]
+                self._chat_tat[waiter.chat_key] = tat + waiter.interval
+                self._tokens -= 1
+                waiter.future.set_result(None)
+                self._prune(now)
+                return 0.0
+        return delay
+
+    def _prune(self, now: float) -> None:
+        if now - self._pruned_at >= PRUNE_INTERVAL_SECONDS:
+            self._chat_tat = {chat: tat for chat, tat in self._chat_tat.items() if tat > now}
+            self._pruned_at = now
+
+
+def _is_group(chat_id: int | str) -> bool:
+    return isinstance(chat_id, str) or chat_id < 0
+
+
+class OutboundMiddleware:
+    """Bot session middleware routing chat-bound requests through the scheduler."""
+
+    def __init__(self, scheduler: OutboundScheduler) -> None:
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        make_request: Callable[[Bot, TelegramMethod[Any]], Awaitable[Any]],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        priority_class = NOTIFICATION if chat_id == LISTING_MANAGER_CHAT_ID else _priority.get()
+        for attempt in range(MAX_RETRY_AFTER_ATTEMPTS):
+            await self.scheduler.acquire(priority_class, chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                self.scheduler.pause(priority_class, exc.retry_after)
+                if attempt == MAX_RETRY_AFTER_ATTEMPTS - 1:
+                    raise
+
+
+def install(bot: Bot, messages_per_second: float, processes: int = 1) -> OutboundScheduler:
+    """Put every chat-bound request of ``bot`` behind one priority scheduler.
+
+    ``messages_per_second`` is this process's share of the bot's budget and
+    ``processes`` the number of processes sending as the same bot.
+    """
+
+    scheduler = OutboundScheduler(messages_per_second, processes)
+    bot.session.middleware(OutboundMiddleware(scheduler))
+    return scheduler
@@ -0,0 +1,69 @@
+"""Asyncio rate limiting primitives shared by the Welcome24 bot."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """FIFO token bucket that makes callers wait for budget instead of failing."""
+
+    def __init__(self, name: str, rate: float, capacity: int = 1) -> None:
+        self.name = name
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waiting = 0
+        self.acquired = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @classmethod
+    def per_minute(cls, name: str, per_minute: int) -> "TokenBucket":
+        """Bucket for a per-minute quota that allows bursts of ten seconds' worth."""
+
+        return cls(name, max(per_minute, 1) / 60.0, max(per_minute // 6, 1))
+
+    async def acquire(self) -> float:
+        """Wait for one token and return how long the caller waited, in seconds."""
+
+        started_at = time.monotonic()
+        self.waiting += 1
+        try:
+            async with self._lock:  # asyncio.Lock wakes waiters in arrival order
+                while True:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started_at
+        self.acquired += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def pause(self, seconds: float = 0.0) -> None:
+        """Drop the remaining burst and hold every caller back for ``seconds``."""
+
+        self._refill()
+        self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "avg_wait_seconds": self.total_wait_seconds / self.acquired if self.acquired else 0.0,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
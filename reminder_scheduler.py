@@ -0,0 +1,228 @@
+"""Due-time reminder scheduling for the Welcome24 bot."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Tuple
+
+import cluster
+import metrics
+import outbound
+import sheets_client
+from constants import DEFAULT_STAGE_ORDER, REMINDER_TEXTS
+from models import User
+from stage_render import render
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+REMINDER_DELAYS: Dict[str, timedelta] = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+}
+REMINDER_FLAGS: Dict[str, str] = {
+    "1h": "reminder_1h_sent",
+    "24h": "reminder_24h_sent",
+}
+
+RETRY_DELAY = timedelta(minutes=5)
+
+ReminderSender = Callable[[User, str], Awaitable[None]]
+
+_scheduler: ReminderScheduler | None = None
+
+
+def next_reminder(user: User, now: datetime | None = None) -> Tuple[datetime, str] | None:
+    """Return the due time and kind (``"1h"``/``"24h"``) of the user's next reminder.
+
+    A user who is already a day idle at ``now`` (default: the current time)
+    without the 1h reminder gets only the 24h one. Users on the final stage
+    have nothing left to be reminded of.
+    """
+
+    if user.last_step_at is None or user.current_stage == DEFAULT_STAGE_ORDER[-1]:
+        return None
+    if user.reminder_24h_sent:
+        return None
+    day_due = user.last_step_at + REMINDER_DELAYS["24h"]
+    if not user.reminder_1h_sent and (now or datetime.utcnow()) < day_due:
+        return user.last_step_at + REMINDER_DELAYS["1h"], "1h"
+    return day_due, "24h"
+
+
+class ReminderScheduler:
+    """Min-heap of users keyed by their next reminder time.
+
+    Each user has at most one live entry; superseded heap items are skipped
+    lazily when popped. The heap is rebuilt from one bulk read on start and then
+    kept current through ``sheets_client`` user listeners. In a cluster worker
+    only the chats routed to that worker are tracked, so each reminder is sent
+    by exactly one process. A reminder that was sent but whose flag could not
+    be written is remembered in memory, so the retry writes the flag again
+    without sending the message twice.
+    """
+
+    def __init__(self, send_reminder: ReminderSender) -> None:
+        self._send_reminder = send_reminder
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._due: Dict[int, Tuple[datetime, str]] = {}
+        self._unrecorded: Dict[int, Tuple[datetime, str]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self.sent = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    async def start(self) -> None:
+        """Rebuild the heap from the sheet and start the dispatch loop."""
+
+        self.rebuild(await sheets_client.list_users())
+        sheets_client.add_user_listener(self._on_user_changed)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Reminder scheduler started with %s pending reminders", len(self))
+
+    async def stop(self) -> None:
+        sheets_client.remove_user_listener(self._on_user_changed)
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def rebuild(self, users: List[User]) -> None:
+        self._due.clear()
+        for user in users:
+            if not cluster.owns_chat(user.chat_id):
+                continue
+            entry = next_reminder(user)
+            if entry is not None:
+                self._due[user.chat_id] = entry
+        self._heap = [(due_at, chat_id, kind) for chat_id, (due_at, kind) in self._due.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def track(self, user: User) -> None:
+        """Reschedule a single user after their progress or reminder flags changed."""
+
+        if not cluster.owns_chat(user.chat_id):
+            return
+        entry = next_reminder(user)
+        if self._unrecorded.get(user.chat_id, entry) != entry:
+            del self._unrecorded[user.chat_id]  # the user moved on; the old reminder no longer matters
+        if entry is None:
+            self._due.pop(user.chat_id, None)
+            return
+        if self._due.get(user.chat_id) != entry:
+            self._schedule(user.chat_id, *entry)
+
+    def _schedule(self, chat_id: int, due_at: datetime, kind: str) -> None:
+        self._due[chat_id] = (due_at, kind)
+        heapq.heappush(self._heap, (due_at, chat_id, kind))
+        if self._heap[0][1] == chat_id:
+            self._wakeup.set()
+
+    def _on_user_changed(self, previous: User | None, current: User) -> None:
+        self.track(current)
+
+    def _pop_due(self, now: datetime) -> List[Tuple[int, str]]:
+        ready: List[Tuple[int, str]] = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, chat_id, kind = heapq.heappop(self._heap)
+            if self._due.get(chat_id) != (due_at, kind):
+                continue  # superseded by a later update
+            del self._due[chat_id]
+            ready.append((chat_id, kind))
+        return ready
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            for chat_id, kind in self._pop_due(datetime.utcnow()):
+                try:
+                    await self._fire(chat_id, kind)
+                except Exception:  # noqa: BLE001 - e.g. a Sheets outage; try this user again later
+                    logger.exception("Failed to process %s reminder for %s", kind, chat_id)
+                    self._schedule(chat_id, datetime.utcnow() + RETRY_DELAY, kind)
+
+            timeout = None
+            if self._heap:
+                timeout = max((self._heap[0][0] - datetime.utcnow()).total_seconds(), 0.0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, chat_id: int, kind: str) -> None:
+        user = await sheets_client.get_user_by_chat_id(chat_id)
+        if user is None:
+            return
+        entry = next_reminder(user)
+        if entry is None or entry[1] != kind or entry[0] > datetime.utcnow():
+            if entry is not None:
+                self.track(user)
+            return
+
+        if self._unrecorded.get(chat_id) != entry:
+            try:
+                with outbound.priority(outbound.REMINDER):
+                    await self._send_reminder(user, kind)
+            except Exception:  # noqa: BLE001 - one failed send must not stop the loop
+                logger.exception("Failed to send %s reminder to %s", kind, chat_id)
+                metrics.REMINDERS_FAILED.inc(kind)
+                self._schedule(chat_id, datetime.utcnow() + RETRY_DELAY, kind)
+                return
+            self.sent += 1
+            metrics.REMINDERS_SENT.inc(kind)
+            self._unrecorded[chat_id] = entry
+        # The 24h reminder replaces a 1h one that was skipped, which must not follow it.
+        flags = {REMINDER_FLAGS[kind]: True}
+        if kind == "24h":
+            flags[REMINDER_FLAGS["1h"]] = True
+        try:
+            await sheets_client.update_user(chat_id, flags)
+        except Exception:  # noqa: BLE001 - retry only the flag write, never the send
+            logger.exception("Sent %s reminder to %s but could not record it", kind, chat_id)
+            self._schedule(chat_id, datetime.utcnow() + RETRY_DELAY, kind)
+            return
+        self._unrecorded.pop(chat_id, None)
+
+
+async def send_stage_reminder(bot: Bot, user: User, kind: str) -> None:
+    """Nudge ``user`` with the reminder text followed by their current stage."""
+
+    payload = render(user.current_stage or DEFAULT_STAGE_ORDER[0])
+    await bot.send_message(
+        user.chat_id,
+        f"{REMINDER_TEXTS[kind]}\n\n{payload.text}",
+        reply_markup=payload.reply_markup,
+    )
+
+
+async def start(bot: Bot) -> ReminderScheduler:
+    """Start the process-wide scheduler sending reminders through ``bot``."""
+
+    global _scheduler
+    if _scheduler is None:
+
+        async def send(user: User, kind: str) -> None:
+            await send_stage_reminder(bot, user, kind)
+
+        _scheduler = ReminderScheduler(send)
+        await _scheduler.start()
+    return _scheduler
+
+
+async def stop() -> None:
+    global _scheduler
+    scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        await scheduler.stop()
@@ -0,0 +1,69 @@
+"""Locate rows edited directly in the Users worksheet from a narrow read of its key columns."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Sequence, Set, Tuple
+
+BLOCK_ROWS = 200
+
+
+@dataclass(slots=True)
+class KeyDiff:
+    """What the ``chat_id``/``current_stage`` columns say about the cached users.
+
+    ``moved`` maps cached users that now sit on another row to that row,
+    ``removed`` lists cached users no longer in the sheet, and ``blocks`` holds
+    the ``(first, last)`` row ranges to re-read in full because a row in them
+    is new or its stage differs from the cache.
+    """
+
+    moved: Dict[int, int] = field(default_factory=dict)
+    removed: List[int] = field(default_factory=list)
+    blocks: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.moved or self.removed or self.blocks)
+
+
+def diff_keys(
+    chat_ids: Sequence[str],
+    stages: Sequence[str],
+    cached: Mapping[int, Tuple[int, str]],
+    block_rows: int = BLOCK_ROWS,
+) -> KeyDiff:
+    """Compare the key columns (read from row 1, header included) with ``cached``.
+
+    ``cached`` maps chat_id -> ``(sheet row, current_stage)``. Rows without a
+    numeric chat_id are ignored and a repeated chat_id keeps its first row,
+    like the bulk load. Adjacent changed blocks are merged into one range.
+    """
+
+    diff = KeyDiff()
+    seen: Set[int] = set()
+    changed: Set[int] = set()
+    for row_number in range(2, len(chat_ids) + 1):
+        try:
+            chat_id = int(chat_ids[row_number - 1])
+        except ValueError:
+            continue
+        if chat_id in seen:
+            continue
+        seen.add(chat_id)
+        stage = stages[row_number - 1] if row_number <= len(stages) else ""
+        known = cached.get(chat_id)
+        if known is None or known[1] != stage:
+            changed.add((row_number - 1) // block_rows)
+        elif known[0] != row_number:
+            diff.moved[chat_id] = row_number
+    diff.removed = [chat_id for chat_id in cached if chat_id not in seen]
+
+    for block in sorted(changed):
+        first = max(block * block_rows + 1, 2)
+        last = min((block + 1) * block_rows, len(chat_ids))
+        if diff.blocks and diff.blocks[-1][1] == first - 1:
+            diff.blocks[-1] = (diff.blocks[-1][0], last)
+        else:
+            diff.blocks.append((first, last))
+    return diff
@@ -0,0 +1,768 @@
+"""Rate-limited, circuit-broken access to the Users and archive worksheets.
+
+Both user backends (``sheets_backend`` and ``sqlite_backend``) and the
+archive code in ``sheets_client`` read and write the spreadsheet only
+through the functions here. Each call runs under the read or write budget,
+is retried on 429/5xx where that is safe and is reported to the circuit
+breaker. Whether gspread or the aiohttp client does the HTTP work is decided
+by ``SHEETS_BACKEND``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Tuple, TypeVar
+
+import metrics
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from config import BotConfig, get_config
+from models import USER_HEADER, User, users_from_sheet_values
+from rate_limit import TokenBucket
+from sheet_changes import KeyDiff, diff_keys
+
+if TYPE_CHECKING:
+    from gspread import Worksheet
+
+    from sheets_async import AsyncSheetsClient
+
+logger = logging.getLogger(__name__)
+
+_COLUMN_NUMBERS: Dict[str, int] = {name: idx for idx, name in enumerate(USER_HEADER, start=1)}
+
+RETRYABLE_STATUSES = frozenset({429, 500, 503})
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 32.0
+
+T = TypeVar("T")
+
+
+class ConcurrentUpdateError(RuntimeError):
+    """Raised when a compare-and-set update finds the row changed underneath it."""
+
+
+class _RowLayoutLock:
+    """Keeps row numbers stable: many users share it, moving rows excludes them all.
+
+    Shared holders never wait on each other, so nesting shared sections (an
+    update that flushes) is safe. The exclusive side waits for a moment with
+    no shared holders.
+    """
+
+    def __init__(self) -> None:
+        self._users = 0
+        self._moving = False
+        self._changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def shared(self) -> AsyncIterator[None]:
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self._moving)
+            self._users += 1
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._users -= 1
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[None]:
+        async with self._changed:
+            await self._changed.wait_for(lambda: not self._moving and self._users == 0)
+            self._moving = True
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self._moving = False
+                self._changed.notify_all()
+
+
+_worksheet: Worksheet | None = None
+_async_client: AsyncSheetsClient | None = None
+# The archive's worksheet, or its client with the aiohttp backend, once the tab is known to exist.
+_archive_worksheet: Worksheet | AsyncSheetsClient | None = None
+_archive_client: AsyncSheetsClient | None = None
+_archive_missing = False
+
+_LIMITERS: Dict[str, TokenBucket] = {}
+_breaker: CircuitBreaker | None = None
+
+_seen_modified_time: str | None = None
+_modified_time_supported = True
+_sheet_writes = 0
+_writes_at_check = 0
+
+row_layout = _RowLayoutLock()
+
+
+def _config() -> BotConfig:
+    return get_config()
+
+
+def _limiter(kind: str) -> TokenBucket:
+    bucket = _LIMITERS.get(kind)
+    if bucket is None:
+        config = _config()
+        rate = config.sheets_read_per_minute if kind == "read" else config.sheets_write_per_minute
+        bucket = _LIMITERS[kind] = TokenBucket.per_minute(kind, rate)
+    return bucket
+
+
+def circuit() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        config = _config()
+        _breaker = CircuitBreaker("Sheets", config.sheets_slow_call_seconds, config.sheets_breaker_open_seconds)
+    return _breaker
+
+
+def _init_worksheet() -> Worksheet:
+    """Create and cache a gspread worksheet instance."""
+
+    global _worksheet
+    if _worksheet is not None:
+        return _worksheet
+
+    import gspread
+
+    config = _config()
+    client = gspread.service_account_from_dict(config.google_service_account)
+    spreadsheet = client.open_by_key(config.spreadsheet_id)
+    _worksheet = spreadsheet.worksheet(config.worksheet_name)
+    logger.info("Connected to worksheet '%s'", config.worksheet_name)
+    return _worksheet
+
+
+async def _in_executor(func: Callable[..., T], *args: Any) -> T:
+    """Run a blocking gspread call in the default thread pool, tracking in-flight calls."""
+
+    metrics.EXECUTOR_INFLIGHT.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+    finally:
+        metrics.EXECUTOR_INFLIGHT.dec()
+
+
+async def _get_worksheet() -> Worksheet:
+    return await _in_executor(_init_worksheet)
+
+
+async def _get_async_client() -> AsyncSheetsClient:
+    global _async_client
+    if _async_client is None:
+        from sheets_async import AsyncSheetsClient
+
+        config = _config()
+        _async_client = AsyncSheetsClient(
+            config.google_service_account,
+            config.spreadsheet_id,
+            config.worksheet_name,
+        )
+        await _async_client.start()
+        logger.info("Connected to worksheet '%s' (aiohttp backend)", config.worksheet_name)
+    return _async_client
+
+
+async def close() -> None:
+    """Close the aiohttp backend's connection pools, if any were opened."""
+
+    global _async_client, _archive_client, _archive_worksheet
+    for client in (_async_client, _archive_client):
+        if client is not None:
+            await client.close()
+    if _archive_worksheet is _archive_client:
+        _archive_worksheet = None
+    _async_client = _archive_client = None
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    """Return queue depth and wait-time counters of the read and write budgets used so far.
+
+    Exported by ``metrics`` as the ``welcome24_sheets_budget_*`` gauges.
+    """
+
+    return {kind: bucket.stats() for kind, bucket in _LIMITERS.items()}
+
+
+def _error_status(exc: Exception) -> int | None:
+    # Backends are imported lazily; an error can only come from one that is loaded.
+    sheets_async = sys.modules.get("sheets_async")
+    if sheets_async is not None and isinstance(exc, sheets_async.SheetsAPIError):
+        return exc.status
+    gspread_errors = sys.modules.get("gspread.exceptions")
+    if gspread_errors is not None and isinstance(exc, gspread_errors.APIError):
+        return exc.response.status_code
+    return None
+
+
+def is_outage(exc: BaseException) -> bool:
+    """Whether ``exc`` means Sheets is unreachable or failing, as opposed to a bad request."""
+
+    if isinstance(exc, (CircuitOpenError, asyncio.TimeoutError, OSError)):
+        return True
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is not None and isinstance(exc, aiohttp.ClientError):
+        return True
+    status = _error_status(exc)
+    return status is not None and status >= 500
+
+
+def _maybe_applied(exc: BaseException) -> bool:
+    """Whether a failed write may still have reached the sheet (5xx, timeout, dropped connection)."""
+
+    return is_outage(exc) and not isinstance(exc, CircuitOpenError)
+
+
+def _limited(
+    kind: str,
+    idempotent: bool = True,
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Run a Sheets primitive under the ``kind`` budget with jittered 429/5xx retries.
+
+    Each attempt is bounded by ``SHEETS_CALL_TIMEOUT_SECONDS`` and reported to
+    the circuit breaker; while the circuit is open calls fail fast with
+    ``CircuitOpenError`` instead of queueing. Calls that are not ``idempotent``
+    are retried on 429 only, since a 5xx may come after the change was applied.
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            bucket = _limiter(kind)
+            breaker = circuit()
+            timeout = _config().sheets_call_timeout_seconds
+            attempt = 0
+            while True:
+                breaker.check()
+                await bucket.acquire()
+                started = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(func(*args, **kwargs), timeout)
+                except Exception as exc:
+                    breaker.record(time.monotonic() - started, failed=is_outage(exc))
+                    metrics.SHEETS_CIRCUIT_OPEN.set(0.0 if breaker.closed else 1.0)
+                    status = _error_status(exc)
+                    retryable = status in RETRYABLE_STATUSES if idempotent else status == 429
+                    if not retryable or attempt == RETRY_ATTEMPTS - 1:
+                        raise
+                    if status == 429:
+                        bucket.pause()
+                    ceiling = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2**attempt)
+                    delay = random.uniform(ceiling / 2, ceiling)
+                    logger.warning(
+                        "Sheets %s %s failed with %s, retrying in %.1fs",
+                        kind,
+                        func.__name__,
+                        status,
+                        delay,
+                    )
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                else:
+                    breaker.record(time.monotonic() - started, failed=False)
+                    metrics.SHEETS_CIRCUIT_OPEN.set(0.0 if breaker.closed else 1.0)
+                    if kind == "write":
+                        _count_write()
+                    return result
+
+        return wrapper
+
+    return decorator
+
+
+def _count_write() -> None:
+    global _sheet_writes
+    _sheet_writes += 1
+
+
+def _use_async_backend() -> bool:
+    return _config().sheets_backend == "aiohttp"
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def row_values(row_index: int) -> List[str]:
+    if _use_async_backend():
+        return await (await _get_async_client()).row_values(row_index)
+    worksheet = await _get_worksheet()
+    return await _in_executor(worksheet.row_values, row_index)
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _all_values() -> List[List[str]]:
+    if _use_async_backend():
+        return await (await _get_async_client()).get_values()
+    worksheet = await _get_worksheet()
+    return await _in_executor(worksheet.get_all_values)
+
+
+async def all_users() -> List[Tuple[int, User]]:
+    """Read the whole worksheet and decode it into ``(sheet row, User)`` pairs."""
+
+    return users_from_sheet_values(await _all_values(), USER_HEADER)
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _modified_time() -> str:
+    if _use_async_backend():
+        return await (await _get_async_client()).modified_time()
+    worksheet = await _get_worksheet()
+    return await _in_executor(worksheet.spreadsheet.get_lastUpdateTime)
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _key_columns() -> Tuple[List[str], List[str]]:
+    """Read only the ``chat_id`` and ``current_stage`` columns, top to bottom."""
+
+    ranges = [f"{_column(name)}:{_column(name)}" for name in ("chat_id", "current_stage")]
+    if _use_async_backend():
+        columns = await (await _get_async_client()).batch_get(ranges, major_dimension="COLUMNS")
+    else:
+        worksheet = await _get_worksheet()
+        columns = await _in_executor(lambda: worksheet.batch_get(ranges, major_dimension="COLUMNS"))
+    chat_ids, stages = (list(values[0]) if values else [] for values in columns)
+    return chat_ids, stages
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _row_blocks(blocks: List[Tuple[int, int]]) -> List[List[List[str]]]:
+    ranges = [f"A{first}:{_column(USER_HEADER[-1])}{last}" for first, last in blocks]
+    if _use_async_backend():
+        return await (await _get_async_client()).batch_get(ranges)
+    worksheet = await _get_worksheet()
+    return [list(values) for values in await _in_executor(worksheet.batch_get, ranges)]
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def find_row(chat_id: int) -> int | None:
+    if _use_async_backend():
+        return await (await _get_async_client()).find_in_column(str(chat_id))
+    worksheet = await _get_worksheet()
+
+    def _find() -> int | None:
+        # ``Worksheet.find`` downloads the whole tab; read the chat_id column only.
+        key = str(chat_id)
+        for idx, value in enumerate(worksheet.col_values(1), start=1):
+            if value == key:
+                return idx
+        return None
+
+    return await _in_executor(_find)
+
+
+async def sheet_chat_ids(archive: bool = False) -> List[str]:
+    """Read the chat_id column of the Users (or archive) worksheet."""
+
+    if not archive:
+        return await _chat_id_column()
+    worksheet = await _archive(create=False)
+    if worksheet is None:
+        return []
+    return [row[0] if row else "" for row in await _archive_values(worksheet, "A:A")]
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _chat_id_column() -> List[str]:
+    if _use_async_backend():
+        return [row[0] if row else "" for row in await (await _get_async_client()).get_values("A:A")]
+    worksheet = await _get_worksheet()
+    return [str(value) for value in await _in_executor(worksheet.col_values, 1)]
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _cell_value(a1_cell: str) -> str | None:
+    if _use_async_backend():
+        return await (await _get_async_client()).cell_value(a1_cell)
+    worksheet = await _get_worksheet()
+    return await _in_executor(lambda: worksheet.acell(a1_cell).value)
+
+
+@_limited("write", idempotent=False)
+@metrics.observe_sheets("api")
+async def _append_rows(records: List[List[Any]]) -> Dict[str, Any]:
+    if _use_async_backend():
+        return await (await _get_async_client()).append_rows(records)
+    worksheet = await _get_worksheet()
+    return await _in_executor(lambda: worksheet.append_rows(records, value_input_option="USER_ENTERED"))
+
+
+@_limited("write")
+@metrics.observe_sheets("api")
+async def batch_update(data: List[Dict[str, Any]]) -> None:
+    if _use_async_backend():
+        await (await _get_async_client()).batch_update(data)
+        return
+    worksheet = await _get_worksheet()
+    await _in_executor(worksheet.batch_update, data)
+
+
+def _archive_api_client() -> AsyncSheetsClient:
+    global _archive_client
+    if _archive_client is None:
+        from sheets_async import AsyncSheetsClient
+
+        config = _config()
+        _archive_client = AsyncSheetsClient(
+            config.google_service_account,
+            config.spreadsheet_id,
+            config.archive_worksheet_name,
+            pool_size=2,
+        )
+    return _archive_client
+
+
+async def _archive(create: bool) -> Worksheet | AsyncSheetsClient | None:
+    """Return the archive worksheet (its client with ``SHEETS_BACKEND=aiohttp``), adding it only if ``create``.
+
+    Looking the tab up and adding it are Sheets calls of their own, made under
+    the read and write budgets. A missing tab is remembered until this process
+    adds it, so reading an archive that was never created costs no request.
+    """
+
+    global _archive_worksheet, _archive_missing
+    if _archive_worksheet is None and not _archive_missing:
+        _archive_worksheet = await _find_archive()
+        _archive_missing = _archive_worksheet is None
+    if _archive_worksheet is None and create:
+        archive = await _add_archive()
+        _archive_missing = False
+        await _append_to_archive(archive, [USER_HEADER])
+        _archive_worksheet = archive
+        logger.info("Created archive worksheet '%s'", _config().archive_worksheet_name)
+    return _archive_worksheet
+
+
+async def _find_archive() -> Worksheet | AsyncSheetsClient | None:
+    if _use_async_backend():
+        client = _archive_api_client()
+        return client if await _sheet_id(client) is not None else None
+    return await _open_archive_worksheet()
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _sheet_id(client: AsyncSheetsClient) -> int | None:
+    """Numeric id of the client's tab; the client keeps it, so only the first call is a request."""
+
+    return await client.sheet_id()
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _open_archive_worksheet() -> Worksheet | None:
+    import gspread
+
+    name = _config().archive_worksheet_name
+
+    def _open() -> Worksheet | None:
+        try:
+            return _init_worksheet().spreadsheet.worksheet(name)
+        except gspread.exceptions.WorksheetNotFound:
+            return None
+
+    return await _in_executor(_open)
+
+
+@_limited("write", idempotent=False)
+@metrics.observe_sheets("api")
+async def _add_archive() -> Worksheet | AsyncSheetsClient:
+    if _use_async_backend():
+        client = _archive_api_client()
+        await client.add_sheet(len(USER_HEADER))
+        return client
+    name = _config().archive_worksheet_name
+    return await _in_executor(lambda: _init_worksheet().spreadsheet.add_worksheet(name, rows=1, cols=len(USER_HEADER)))
+
+
+async def archive_keys() -> List[List[str]]:
+    """Read the chat_id and username columns of the archive (empty if it does not exist)."""
+
+    worksheet = await _archive(create=False)
+    return await _archive_values(worksheet, "A:B") if worksheet is not None else []
+
+
+async def archive_columns(names: Tuple[str, ...]) -> List[List[str]]:
+    """Read whole ``USER_HEADER`` columns of the archive, header included (empty if it does not exist)."""
+
+    worksheet = await _archive(create=False)
+    if worksheet is None:
+        return []
+    ranges = [f"{_column(name)}:{_column(name)}" for name in names]
+    return [list(values[0]) if values else [] for values in await _archive_columns(worksheet, ranges)]
+
+
+async def archive_row_values(row_index: int) -> List[str]:
+    worksheet = await _archive(create=False)
+    values = await _archive_values(worksheet, f"{row_index}:{row_index}") if worksheet is not None else []
+    return values[0] if values else []
+
+
+async def _archive_append_rows(records: List[List[Any]]) -> Dict[str, Any]:
+    worksheet = await _archive(create=True)
+    assert worksheet is not None
+    return await _append_to_archive(worksheet, records)
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _archive_values(worksheet: Worksheet | AsyncSheetsClient, a1_range: str) -> List[List[str]]:
+    if _use_async_backend():
+        return await worksheet.get_values(a1_range)
+    return await _in_executor(worksheet.get_values, a1_range)
+
+
+@_limited("read")
+@metrics.observe_sheets("api")
+async def _archive_columns(worksheet: Worksheet | AsyncSheetsClient, ranges: List[str]) -> List[List[List[str]]]:
+    if _use_async_backend():
+        return await worksheet.batch_get(ranges, major_dimension="COLUMNS")
+    return await _in_executor(lambda: worksheet.batch_get(ranges, major_dimension="COLUMNS"))
+
+
+@_limited("write", idempotent=False)
+@metrics.observe_sheets("api")
+async def _append_to_archive(worksheet: Worksheet | AsyncSheetsClient, records: List[List[Any]]) -> Dict[str, Any]:
+    if _use_async_backend():
+        return await worksheet.append_rows(records)
+    return await _in_executor(lambda: worksheet.append_rows(records, value_input_option="USER_ENTERED"))
+
+
+async def append_once(records: List[List[Any]], archive: bool = False) -> Dict[str, Any]:
+    """Append rows to the Users (or archive) worksheet without duplicating any.
+
+    If the append fails in a way that may still have reached the sheet, the
+    chat_id column is read back and only the rows that are missing are
+    appended again. The response is ``{}`` when some rows were already there,
+    as their row numbers are then unknown.
+    """
+
+    append = _archive_append_rows if archive else _append_rows
+    try:
+        return await append(records)
+    except Exception as exc:
+        if not _maybe_applied(exc):
+            raise
+        present = set(await sheet_chat_ids(archive))
+        missing = [record for record in records if str(record[0]) not in present]
+        logger.warning("Sheets append failed (%s), %s of %s rows are missing", exc, len(missing), len(records))
+        if not missing:
+            return {}
+        response = await append(missing)
+        return response if len(missing) == len(records) else {}
+
+
+async def _delete_rows(row_indexes: List[int], archive: bool = False) -> None:
+    """Delete rows of the Users (or archive) worksheet in one ``batchUpdate``."""
+
+    if archive:
+        worksheet = await _archive(create=False)
+        if worksheet is None:
+            return
+    else:
+        worksheet = await (_get_async_client() if _use_async_backend() else _get_worksheet())
+    if _use_async_backend():
+        # The delete addresses the tab by id; look it up under the read budget first.
+        await _sheet_id(worksheet)
+    await _delete_worksheet_rows(worksheet, row_indexes)
+
+
+@_limited("write", idempotent=False)
+@metrics.observe_sheets("api")
+async def _delete_worksheet_rows(worksheet: Worksheet | AsyncSheetsClient, row_indexes: List[int]) -> None:
+    if _use_async_backend():
+        await worksheet.delete_rows(row_indexes)
+        return
+
+    from sheets_async import delete_rows_requests
+
+    requests = delete_rows_requests(worksheet.id, row_indexes)
+    await _in_executor(worksheet.spreadsheet.batch_update, {"requests": requests})
+
+
+async def delete_once(rows: List[Tuple[int, int]], archive: bool = False) -> None:
+    """Delete ``(row, chat_id)`` rows of the Users (or archive) worksheet at most once.
+
+    A repeated delete would remove whatever moved up into those rows, so after
+    a failure that may have reached the sheet the chat_id column is read back
+    and the delete is sent again only if every row still holds its user.
+    """
+
+    try:
+        await _delete_rows([row for row, _ in rows], archive)
+    except Exception as exc:
+        if not _maybe_applied(exc):
+            raise
+        column = await sheet_chat_ids(archive)
+        held = [row <= len(column) and column[row - 1] == str(chat_id) for row, chat_id in rows]
+        if not any(held):
+            logger.warning("Sheets row delete failed (%s) but was applied", exc)
+            return
+        if not all(held):
+            raise ConcurrentUpdateError(f"Rows {[row for row, _ in rows]} changed while being deleted") from exc
+        logger.warning("Sheets row delete failed (%s), deleting %s rows again", exc, len(rows))
+        await _delete_rows([row for row, _ in rows], archive)
+
+
+def stable_rows(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Run ``func`` while no rows are being moved to the archive."""
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        async with row_layout.shared():
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+async def connect() -> None:
+    """Open the Users worksheet (token, worksheet handle) ahead of the first call."""
+
+    if _use_async_backend():
+        await _get_async_client()
+    else:
+        await _get_worksheet()
+
+
+async def check_last_step_at(row_index: int, chat_id: int, expected: datetime) -> None:
+    """Raise ``ConcurrentUpdateError`` unless the sheet's ``last_step_at`` of the row is ``expected``."""
+
+    actual = await _cell_value(_a1(row_index, _COLUMN_NUMBERS["last_step_at"]))
+    try:
+        matches = actual is not None and datetime.fromisoformat(actual) == expected
+    except ValueError:
+        matches = False
+    if not matches:
+        raise ConcurrentUpdateError(
+            f"User {chat_id} was modified concurrently: last_step_at is {actual!r}, "
+            f"expected {expected.isoformat()!r}"
+        )
+
+
+async def check_modified() -> Tuple[bool, bool]:
+    """Whether the spreadsheet changed since the last check, and whether the key columns can show where.
+
+    An untouched spreadsheet costs one Drive metadata request. A new modified
+    time with no writes of this process since the last check, while the key
+    columns turn out unchanged, can only be a hand edit elsewhere in a row.
+    """
+
+    global _seen_modified_time, _writes_at_check
+    modified = await _current_modified_time()
+    if modified is not None and modified == _seen_modified_time:
+        return False, False
+    previous, _seen_modified_time = _seen_modified_time, modified
+    wrote, _writes_at_check = _sheet_writes != _writes_at_check, _sheet_writes
+    return True, wrote or previous is None or modified is None
+
+
+async def mark_modified_time() -> None:
+    """Remember the modified time before a full read, so edits made during it are detected."""
+
+    global _seen_modified_time, _writes_at_check
+    if _config().sheets_change_poll_seconds:
+        _writes_at_check = _sheet_writes
+        _seen_modified_time = await _current_modified_time()
+
+
+async def _current_modified_time() -> str | None:
+    """The spreadsheet's Drive modified time, or ``None`` if Drive metadata is not readable."""
+
+    global _modified_time_supported
+    if not _modified_time_supported:
+        return None
+    try:
+        return await _modified_time()
+    except Exception as exc:
+        if is_outage(exc):
+            raise
+        _modified_time_supported = False
+        logger.warning("Cannot read the spreadsheet's modified time (%s); reading key columns on every check", exc)
+        return None
+
+
+async def read_sheet_edits(cached: Dict[int, Tuple[int, str]]) -> Tuple[KeyDiff, List[Tuple[int, User]]]:
+    """Compare the key columns with ``cached`` (chat_id -> row, stage) and re-read the changed row blocks."""
+
+    diff = diff_keys(*await _key_columns(), cached)
+    rows: List[Tuple[int, User]] = []
+    if diff.blocks:
+        for (first, _), values in zip(diff.blocks, await _row_blocks(diff.blocks)):
+            rows.extend(
+                (first + row_number - 2, user)
+                for row_number, user in users_from_sheet_values([USER_HEADER, *values], USER_HEADER)
+            )
+    return diff, rows
+
+
+def cell_updates(row_index: int, user: User, changed: Iterable[str]) -> List[Dict[str, Any]]:
+    """Build per-cell ``batch_update`` entries for the changed fields of a row."""
+
+    values = user.to_sheet_dict()
+    return [
+        {
+            "range": _a1(row_index, _COLUMN_NUMBERS[name]),
+            "values": [[values[name]]],
+        }
+        for name in sorted(changed, key=_COLUMN_NUMBERS.__getitem__)
+    ]
+
+
+def appended_row_index(response: Dict[str, Any] | None) -> int | None:
+    """Extract the row number from an ``append_row`` response (``Users!A5:K5``)."""
+
+    try:
+        updated_range = response["updates"]["updatedRange"]  # type: ignore[index]
+        start_cell = updated_range.split("!")[-1].split(":")[0]
+        row_index = int(start_cell.lstrip("$ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    except (KeyError, TypeError, IndexError, ValueError, AttributeError):
+        return None
+    return row_index
+
+
+def _a1(row: int, col: int) -> str:
+    """A1 label of a cell, e.g. ``_a1(5, 9) == "I5"``."""
+
+    letters = ""
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return f"{letters}{row}"
+
+
+def _column(name: str) -> str:
+    """Column letter of a ``USER_HEADER`` field, e.g. ``"G"`` for ``current_stage``."""
+
+    return _a1(0, _COLUMN_NUMBERS[name])[:-1]
+
+
+def prepare_record(data: Dict[str, Any]) -> List[Any]:
+    """Return a sanitized list that aligns with the user header order."""
+
+    record: List[Any] = []
+    for key in USER_HEADER:
+        value = data.get(key)
+        if isinstance(value, datetime):
+            record.append(value.isoformat())
+        elif isinstance(value, bool):
+            record.append("TRUE" if value else "FALSE")
+        elif value is None:
+            record.append("")
+        else:
+            record.append(str(value))
+    return record
@@ -0,0 +1,299 @@
+"""Pure-asyncio Google Sheets v4 client for the Welcome24 bot."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List
+from urllib.parse import quote
+
+import aiohttp
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+
+logger = logging.getLogger(__name__)
+
+SHEETS_API_URL = "https://sheets.googleapis.com/v4/spreadsheets"
+DEFAULT_TOKEN_URI = "https://oauth2.googleapis.com/token"
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+SHEETS_SCOPE = "https://www.googleapis.com/auth/spreadsheets"
+# Read-only file metadata, for the cheap "was the spreadsheet edited" check.
+DRIVE_METADATA_SCOPE = "https://www.googleapis.com/auth/drive.metadata.readonly"
+TOKEN_LIFETIME_SECONDS = 3600
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+TOKEN_RETRY_SECONDS = 30
+
+
+class SheetsAPIError(RuntimeError):
+    """Raised when the Sheets or OAuth endpoint answers with a non-2xx status."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"Sheets API error {status}: {message}")
+        self.status = status
+
+
+class AsyncSheetsClient:
+    """Values API client over one keep-alive aiohttp session.
+
+    The service-account access token is fetched on ``start`` and refreshed by a
+    background task shortly before it expires, so requests never wait on auth.
+    """
+
+    def __init__(
+        self,
+        service_account_info: Dict[str, Any],
+        spreadsheet_id: str,
+        worksheet_name: str,
+        *,
+        api_url: str = SHEETS_API_URL,
+        drive_url: str = DRIVE_FILES_URL,
+        token_uri: str | None = None,
+        pool_size: int = 10,
+        timeout: float = 30.0,
+    ) -> None:
+        self._service_account_info = service_account_info
+        self._spreadsheet_url = f"{api_url.rstrip('/')}/{spreadsheet_id}"
+        self._drive_file_url = f"{drive_url.rstrip('/')}/{spreadsheet_id}"
+        self._sheet_prefix = "'{}'!".format(worksheet_name.replace("'", "''"))
+        self._token_uri = token_uri or service_account_info.get("token_uri") or DEFAULT_TOKEN_URI
+        self._pool_size = pool_size
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: aiohttp.ClientSession | None = None
+        self._token: str | None = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task[None] | None = None
+        self._worksheet_name = worksheet_name
+        self._sheet_id: int | None = None
+        self._sheet_id_known = False
+
+    async def start(self) -> None:
+        """Open the connection pool, fetch the first token and schedule refreshes."""
+
+        if self._session is not None:
+            return
+        connector = aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+        await self._refresh_token()
+        self._refresh_task = asyncio.create_task(self._refresh_token_loop())
+
+    async def close(self) -> None:
+        """Stop token refreshes and close the connection pool."""
+
+        task, self._refresh_task = self._refresh_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    async def get_values(self, a1_range: str = "") -> List[List[str]]:
+        """Return the formatted cell values for a worksheet range (whole sheet if empty)."""
+
+        payload = await self._request("GET", f"/values/{self._range(a1_range)}")
+        return payload.get("values", [])
+
+    async def batch_get(self, a1_ranges: List[str], major_dimension: str = "ROWS") -> List[List[List[str]]]:
+        """Return the values of several ranges in one request, in ``a1_ranges`` order."""
+
+        params = [("ranges", self._sheet_prefix + a1_range) for a1_range in a1_ranges]
+        params.append(("majorDimension", major_dimension))
+        payload = await self._request("GET", "/values:batchGet", params=params)
+        return [item.get("values", []) for item in payload.get("valueRanges", [])]
+
+    async def modified_time(self) -> str:
+        """Return the spreadsheet file's Drive ``modifiedTime``, which moves on every edit."""
+
+        payload = await self._request(
+            "GET",
+            "",
+            base_url=self._drive_file_url,
+            params={"fields": "modifiedTime", "supportsAllDrives": "true"},
+        )
+        return payload["modifiedTime"]
+
+    async def row_values(self, row_index: int) -> List[str]:
+        values = await self.get_values(f"{row_index}:{row_index}")
+        return values[0] if values else []
+
+    async def cell_value(self, a1_cell: str) -> str | None:
+        values = await self.get_values(a1_cell)
+        return values[0][0] if values and values[0] else None
+
+    async def find_in_column(self, value: str, column: str = "A") -> int | None:
+        """Return the 1-based row of the first cell in ``column`` equal to ``value``."""
+
+        cells = await self.get_values(f"{column}:{column}")
+        for idx, row in enumerate(cells, start=1):
+            if row and row[0] == value:
+                return idx
+        return None
+
+    async def get_all_records(self) -> List[Dict[str, Any]]:
+        """Return data rows as dicts keyed by the header row, like gspread."""
+
+        values = await self.get_values()
+        if not values:
+            return []
+        header, rows = values[0], values[1:]
+        return [dict(zip(header, row + [""] * (len(header) - len(row)))) for row in rows]
+
+    async def append_row(
+        self,
+        values: List[Any],
+        value_input_option: str = "USER_ENTERED",
+    ) -> Dict[str, Any]:
+        return await self.append_rows([values], value_input_option)
+
+    async def append_rows(
+        self,
+        rows: List[List[Any]],
+        value_input_option: str = "USER_ENTERED",
+    ) -> Dict[str, Any]:
+        return await self._request(
+            "POST",
+            f"/values/{self._range('A1')}:append",
+            params={"valueInputOption": value_input_option, "insertDataOption": "INSERT_ROWS"},
+            json={"values": rows},
+        )
+
+    async def batch_update(
+        self,
+        data: List[Dict[str, Any]],
+        value_input_option: str = "RAW",
+    ) -> Dict[str, Any]:
+        body = {
+            "valueInputOption": value_input_option,
+            "data": [{**item, "range": self._sheet_prefix + item["range"]} for item in data],
+        }
+        return await self._request("POST", "/values:batchUpdate", json=body)
+
+    async def sheet_id(self) -> int | None:
+        """Return the worksheet's numeric id, or ``None`` if the tab does not exist.
+
+        Either answer is kept after the first lookup; ``add_sheet`` updates it.
+        """
+
+        if not self._sheet_id_known:
+            payload = await self._request("GET", "", params={"fields": "sheets.properties(sheetId,title)"})
+            for sheet in payload.get("sheets", []):
+                properties = sheet.get("properties", {})
+                if properties.get("title") == self._worksheet_name:
+                    self._sheet_id = int(properties["sheetId"])
+            self._sheet_id_known = True
+        return self._sheet_id
+
+    async def add_sheet(self, column_count: int) -> int:
+        """Create this client's worksheet tab and return its id."""
+
+        payload = await self.batch_update_spreadsheet(
+            [{"addSheet": {"properties": {"title": self._worksheet_name, "gridProperties": {"columnCount": column_count}}}}]
+        )
+        self._sheet_id = int(payload["replies"][0]["addSheet"]["properties"]["sheetId"])
+        self._sheet_id_known = True
+        return self._sheet_id
+
+    async def delete_rows(self, row_indexes: List[int]) -> None:
+        """Delete the given 1-based rows in one request (contiguous rows become one range)."""
+
+        sheet_id = await self.sheet_id()
+        if sheet_id is None:
+            raise SheetsAPIError(404, f"Worksheet '{self._worksheet_name}' not found")
+        await self.batch_update_spreadsheet(delete_rows_requests(sheet_id, row_indexes))
+
+    async def batch_update_spreadsheet(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return await self._request("POST", ":batchUpdate", json={"requests": requests})
+
+    def _range(self, a1_range: str) -> str:
+        sheet_range = self._sheet_prefix + a1_range if a1_range else self._sheet_prefix[:-1]
+        return quote(sheet_range, safe="")
+
+    async def _request(self, method: str, path: str, base_url: str | None = None, **kwargs: Any) -> Dict[str, Any]:
+        if self._session is None:
+            await self.start()
+        assert self._session is not None
+
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {await self._access_token()}"}
+            async with self._session.request(
+                method, (base_url or self._spreadsheet_url) + path, headers=headers, **kwargs
+            ) as response:
+                if response.status == 401 and attempt == 0:
+                    self._token_expires_at = 0.0
+                    continue
+                if response.status >= 400:
+                    raise SheetsAPIError(response.status, await response.text())
+                return await response.json()
+        raise SheetsAPIError(401, "Unauthorized after token refresh")
+
+    async def _access_token(self) -> str:
+        if self._token is None or time.monotonic() >= self._token_expires_at:
+            await self._refresh_token()
+        assert self._token is not None
+        return self._token
+
+    async def _refresh_token(self) -> None:
+        async with self._token_lock:
+            if self._token is not None and time.monotonic() < self._token_expires_at - TOKEN_REFRESH_MARGIN_SECONDS:
+                return
+            assert self._session is not None
+            async with self._session.post(
+                self._token_uri,
+                data={
+                    "grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer",
+                    "assertion": self._signed_assertion(),
+                },
+            ) as response:
+                if response.status >= 400:
+                    raise SheetsAPIError(response.status, await response.text())
+                payload = await response.json()
+            self._token = payload["access_token"]
+            lifetime = int(payload.get("expires_in", TOKEN_LIFETIME_SECONDS))
+            self._token_expires_at = time.monotonic() + lifetime
+            logger.debug("Sheets access token refreshed, valid for %ss", lifetime)
+
+    async def _refresh_token_loop(self) -> None:
+        while True:
+            delay = self._token_expires_at - TOKEN_REFRESH_MARGIN_SECONDS - time.monotonic()
+            await asyncio.sleep(max(delay, 1.0))
+            try:
+                await self._refresh_token()
+            except Exception:  # noqa: BLE001 - keep using the current token until it expires
+                logger.exception("Failed to refresh Sheets access token")
+                await asyncio.sleep(TOKEN_RETRY_SECONDS)
+
+    def _signed_assertion(self) -> str:
+        signer = crypt.RSASigner.from_service_account_info(self._service_account_info)
+        issued_at = int(time.time())
+        claims = {
+            "iss": self._service_account_info["client_email"],
+            "scope": f"{SHEETS_SCOPE} {DRIVE_METADATA_SCOPE}",
+            "aud": self._token_uri,
+            "iat": issued_at,
+            "exp": issued_at + TOKEN_LIFETIME_SECONDS,
+        }
+        return google_jwt.encode(signer, claims).decode("utf-8")
+
+
+def delete_rows_requests(sheet_id: int, row_indexes: List[int]) -> List[Dict[str, Any]]:
+    """``deleteDimension`` requests for 1-based rows, bottom-up so indexes stay valid."""
+
+    spans: List[List[int]] = []
+    for row in sorted(set(row_indexes), reverse=True):
+        if spans and spans[-1][0] == row + 1:
+            spans[-1][0] = row
+        else:
+            spans.append([row, row])
+    return [
+        {
+            "deleteDimension": {
+                "range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": first - 1, "endIndex": last}
+            }
+        }
+        for first, last in spans
+    ]
@@ -0,0 +1,559 @@
+"""User backend that serves the Users worksheet from an in-memory index.
+
+Google Sheets is the primary copy (``STORAGE_BACKEND=sheets``). Reads come
+from ``UserIndex`` after one bulk load; writes go to the sheet right away or
+through the write-behind queue, and to a local journal while Sheets is
+unavailable.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import time
+from dataclasses import replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+
+import metrics
+import sheets_api
+from circuit_breaker import CircuitOpenError
+from models import USER_HEADER, User, user_from_sheet_row
+from sheet_changes import KeyDiff
+from write_journal import WriteJournal
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_REPLAY_INTERVAL_SECONDS = 5.0
+
+UserListener = Callable[[User | None, User], None]
+ArchiveMove = Callable[[], Awaitable[Tuple[List[int], List[Tuple[int, User]]]]]
+
+
+class UserIndex:
+    """Process-wide chat_id -> (row number, User) cache over the Users worksheet.
+
+    The index is filled by one bulk read and then kept current write-through by
+    ``create_user``/``update_user``. A periodic refresh picks up rows edited or
+    moved directly in the spreadsheet. A secondary lower-cased username ->
+    chat_id map follows every change, including users renaming themselves.
+    """
+
+    def __init__(self) -> None:
+        self._rows: Dict[int, Tuple[int, User]] = {}
+        self._touched: Dict[int, float] = {}
+        self._by_username: Dict[str, int] = {}
+        self._sorted_usernames: List[str] | None = None
+        self.loaded_at: float | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, chat_id: int) -> Tuple[int, User] | None:
+        return self._rows.get(chat_id)
+
+    def get_by_username(self, username: str) -> Tuple[int, User] | None:
+        chat_id = self._by_username.get(username.lower())
+        return self._rows.get(chat_id) if chat_id is not None else None
+
+    def usernames_with_prefix(self, prefix: str, limit: int) -> List[str]:
+        """Return up to ``limit`` indexed usernames (lower-cased) starting with ``prefix``."""
+
+        if self._sorted_usernames is None:
+            self._sorted_usernames = sorted(self._by_username)
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._sorted_usernames, prefix)
+        matches: List[str] = []
+        for name in self._sorted_usernames[start:]:
+            if not name.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(name)
+        return matches
+
+    def put(self, row_index: int, user: User) -> None:
+        previous = self._rows.get(user.chat_id)
+        if previous is not None:
+            self._unlink_username(previous[1])
+        self._rows[user.chat_id] = (row_index, user)
+        self._link_username(user)
+        self._touched[user.chat_id] = time.monotonic()
+
+    def discard(self, chat_id: int) -> None:
+        previous = self._rows.pop(chat_id, None)
+        if previous is not None:
+            self._unlink_username(previous[1])
+        self._touched[chat_id] = time.monotonic()
+
+    def merge(
+        self,
+        rows: Dict[int, Tuple[int, User]],
+        removed: Iterable[int],
+        started_at: float,
+        pinned: Iterable[int] = (),
+    ) -> List[Tuple[User | None, User]]:
+        """Apply re-read rows and removed chat_ids, like ``replace`` for part of the sheet.
+
+        Returns ``(previous, current)`` for every user whose cells changed.
+        """
+
+        keep = set(pinned)
+        keep.update(chat_id for chat_id, touched_at in self._touched.items() if touched_at >= started_at)
+        changes: List[Tuple[User | None, User]] = []
+        for chat_id, (row_index, user) in rows.items():
+            if chat_id in keep:
+                continue
+            previous = self._rows.get(chat_id)
+            if previous is not None:
+                self._unlink_username(previous[1])
+            self._rows[chat_id] = (row_index, user)
+            self._link_username(user)
+            if previous is None or previous[1].to_sheet_row() != user.to_sheet_row():
+                changes.append((previous[1] if previous is not None else None, user))
+        for chat_id in removed:
+            if chat_id in keep:
+                continue
+            previous = self._rows.pop(chat_id, None)
+            if previous is not None:
+                self._unlink_username(previous[1])
+        return changes
+
+    def _link_username(self, user: User) -> None:
+        if user.username:
+            self._by_username[user.username.lower()] = user.chat_id
+            self._sorted_usernames = None
+
+    def _unlink_username(self, user: User) -> None:
+        if user.username and self._by_username.get(user.username.lower()) == user.chat_id:
+            del self._by_username[user.username.lower()]
+            self._sorted_usernames = None
+
+    def users(self) -> List[User]:
+        return [user for _, user in sorted(self._rows.values(), key=lambda item: item[0])]
+
+    def items(self) -> List[Tuple[int, Tuple[int, User]]]:
+        return list(self._rows.items())
+
+    def replace(
+        self,
+        rows: Dict[int, Tuple[int, User]],
+        started_at: float,
+        pinned: Iterable[int] = (),
+    ) -> None:
+        """Swap in a fresh snapshot, keeping entries written while it was being read.
+
+        ``pinned`` chat_ids hold unflushed writes and always keep their cached entry.
+        """
+
+        for chat_id in pinned:
+            if chat_id in self._rows:
+                rows[chat_id] = self._rows[chat_id]
+        for chat_id, touched_at in self._touched.items():
+            if touched_at < started_at:
+                continue
+            if chat_id in self._rows:
+                rows[chat_id] = self._rows[chat_id]
+            else:
+                rows.pop(chat_id, None)
+        self._rows = rows
+        self._by_username = {}
+        for _, user in sorted(rows.values(), key=lambda item: item[0]):
+            self._link_username(user)
+        self._sorted_usernames = None
+        self._touched = {
+            chat_id: touched_at
+            for chat_id, touched_at in self._touched.items()
+            if touched_at >= started_at
+        }
+        self.loaded_at = time.monotonic()
+
+
+
+class SheetsIndexBackend:
+    """Users worksheet as the primary copy, served from a ``UserIndex``.
+
+    ``notify(previous, current)`` is called for users changed by edits found
+    in the sheet. While the Sheets circuit is open, or older journaled writes
+    still await replay, writes go to the journal at ``journal_path`` and are
+    replayed to the sheet once it is back.
+    """
+
+    sync_interval: float | None = None
+
+    def __init__(self, journal_path: Path, notify: UserListener, write_behind_ms: Callable[[], int]) -> None:
+        self.journal_path = journal_path
+        self._notify = notify
+        self._write_behind_ms = write_behind_ms
+        self.index = UserIndex()
+        self._index_lock = asyncio.Lock()
+        self._pending_updates: Dict[int, Set[str]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task[None] | None = None
+        self._journal: WriteJournal | None = None
+        self._journal_lock = asyncio.Lock()
+        self._journal_task: asyncio.Task[None] | None = None
+
+    @property
+    def journal(self) -> WriteJournal:
+        if self._journal is None:
+            self._journal = WriteJournal(self.journal_path)
+            metrics.SHEETS_JOURNAL_ENTRIES.set(len(self._journal))
+        return self._journal
+
+    def is_stale(self) -> bool:
+        return not sheets_api.circuit().closed
+
+    def _degraded(self) -> bool:
+        """Whether writes go to the journal: Sheets is unavailable or older writes await replay."""
+
+        return not sheets_api.circuit().closed or len(self.journal) > 0
+
+    async def warm_up(self) -> int:
+        count = await self.load()
+        if len(self.journal):
+            try:
+                async with sheets_api.row_layout.shared():
+                    await self.replay_journal()
+            except Exception:  # noqa: BLE001 - the background loop retries
+                logger.exception("Failed to replay the Sheets write journal")
+        return count
+
+    async def load(self) -> int:
+        async with self._index_lock:
+            started_at = time.monotonic()
+            await sheets_api.mark_modified_time()
+            rows: Dict[int, Tuple[int, User]] = {}
+            for idx, user in await sheets_api.all_users():
+                rows.setdefault(user.chat_id, (idx, user))
+            # Journaled writes are newer than the sheet (e.g. after a restart mid-outage).
+            for user in self._journaled_users().values():
+                rows[user.chat_id] = (rows.get(user.chat_id, (0, user))[0], user)
+            self.index.replace(rows, started_at, pinned=list(self._pending_updates))
+        logger.debug("User index loaded with %s users", len(self.index))
+        return len(self.index)
+
+    async def _ensure_loaded(self) -> None:
+        if not self.index.loaded:
+            await self.load()
+
+    def cached(self, chat_id: int) -> Tuple[int, User] | None:
+        cached = self.index.get(chat_id)
+        return (cached[0], replace(cached[1])) if cached is not None else None
+
+    async def find(self, chat_id: int) -> Tuple[int, User] | None:
+        cached = self.cached(chat_id)
+        if cached is not None:
+            return cached
+        try:
+            row_index = await sheets_api.find_row(chat_id)
+            if row_index is None:
+                return None
+            values = await sheets_api.row_values(row_index)
+        except Exception as exc:
+            if not (sheets_api.is_outage(exc) and self.index.loaded):
+                raise
+            # Serve the stale snapshot: a user missing from it is treated as unknown.
+            logger.warning("Sheets unavailable, user %s is not in the cached index", chat_id)
+            return None
+        user = user_from_sheet_row(dict(zip(USER_HEADER, values)))
+        self.index.put(row_index, user)
+        return row_index, replace(user)
+
+    async def read_row(self, row_index: int) -> User | None:
+        values = await sheets_api.row_values(row_index)
+        if not values or len(values) < len(USER_HEADER):
+            return None
+        return user_from_sheet_row(dict(zip(USER_HEADER, values)))
+
+    async def by_username(self, username: str) -> User | None:
+        await self._ensure_loaded()
+        cached = self.index.get_by_username(username)
+        return replace(cached[1]) if cached is not None else None
+
+    async def usernames_with_prefix(self, prefix: str, limit: int) -> List[str]:
+        await self._ensure_loaded()
+        return self.index.usernames_with_prefix(prefix, limit)
+
+    async def users(self) -> List[User]:
+        await self._ensure_loaded()
+        return self.index.users()
+
+    async def create(self, user: User) -> User | None:
+        response = None
+        if self._degraded():
+            self._journal_write(user, USER_HEADER, create=True)
+        else:
+            try:
+                response = await sheets_api.append_once([user.to_sheet_row()])
+            except Exception as exc:
+                if not sheets_api.is_outage(exc):
+                    raise
+                self._journal_write(user, USER_HEADER, create=True)
+            else:
+                logger.info("Created user %s", user.chat_id)
+        if response is None:
+            # Row 0 marks a user that only exists in the journal so far.
+            self.index.put(0, user)
+            await self.journal.sync()
+        else:
+            row_index = sheets_api.appended_row_index(response)
+            if row_index is None:
+                self.index.discard(user.chat_id)
+            else:
+                self.index.put(row_index, user)
+        return replace(user)
+
+    async def check_last_step_at(self, row_index: int, user: User, expected: datetime) -> None:
+        if row_index == 0 or self._degraded():
+            check_cached_last_step_at(user, expected)
+            return
+        if user.chat_id in self._pending_updates:
+            await self.flush()
+        try:
+            await sheets_api.check_last_step_at(row_index, user.chat_id, expected)
+        except Exception as exc:
+            if not sheets_api.is_outage(exc):
+                raise
+            check_cached_last_step_at(user, expected)
+
+    async def write(self, row_index: int, user: User, changed: Set[str]) -> None:
+        journaled = self._degraded()
+        if journaled:
+            self._journal_write(user, changed)
+        elif self._write_behind_ms() > 0:
+            self._pending_updates.setdefault(user.chat_id, set()).update(changed)
+            self._schedule_flush()
+            logger.debug("Queued update for user %s", user.chat_id)
+        else:
+            try:
+                await sheets_api.batch_update(sheets_api.cell_updates(row_index, user, changed))
+            except Exception as exc:
+                if not sheets_api.is_outage(exc):
+                    raise
+                self._journal_write(user, changed)
+                journaled = True
+            else:
+                logger.info("Updated user %s (%s)", user.chat_id, ", ".join(sorted(changed)))
+        user.mark_clean()
+        self.index.put(row_index, replace(user))
+        if journaled:
+            # The cache is updated first so no other write can interleave with this one.
+            await self.journal.sync()
+
+    async def add_restored(self, user: User) -> int:
+        row_index = sheets_api.appended_row_index(await sheets_api.append_once([user.to_sheet_row()])) or 0
+        if row_index:
+            self.index.put(row_index, user)
+        return row_index
+
+    async def apply_sheet_edits(self, can_locate: bool) -> Tuple[KeyDiff, int]:
+        async with self._index_lock:
+            started_at = time.monotonic()
+            cached = {chat_id: (row, user.current_stage or "") for chat_id, (row, user) in self.index.items()}
+            diff, rows = await sheets_api.read_sheet_edits(cached)
+            changes: List[Tuple[User | None, User]] = []
+            if not diff.empty:
+                updated: Dict[int, Tuple[int, User]] = {}
+                for chat_id, row in diff.moved.items():
+                    cached_entry = self.index.get(chat_id)
+                    if cached_entry is not None:
+                        updated[chat_id] = (row, cached_entry[1])
+                updated.update({user.chat_id: (row, user) for row, user in rows})
+                changes = self.index.merge(
+                    updated,
+                    diff.removed,
+                    started_at,
+                    pinned=[*self._pending_updates, *self._journaled_users()],
+                )
+        for previous, current in changes:
+            self._notify(previous, current)
+        return diff, len(changes)
+
+    async def archive(self, move: ArchiveMove) -> List[int]:
+        if len(self.journal):
+            logger.info("Skipping archive run until journaled writes are replayed")
+            return []
+        async with self._flush_lock, self._index_lock:
+            await self._flush_pending()
+            moved, remaining = await move()
+            if moved:
+                self.index.replace({user.chat_id: (row, user) for row, user in remaining}, time.monotonic())
+        return moved
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            return await self._flush_pending()
+
+    async def _flush_pending(self) -> int:
+        """Body of ``flush``; the caller holds ``_flush_lock``."""
+
+        if not self._pending_updates:
+            return 0
+
+        batch = dict(self._pending_updates)
+        self._pending_updates.clear()
+        data: List[Dict[str, Any]] = []
+        for chat_id, changed in batch.items():
+            cached = self.index.get(chat_id)
+            if cached is None:
+                logger.warning("User %s left the index before flush, dropping update", chat_id)
+                continue
+            row_index, user = cached
+            data.extend(sheets_api.cell_updates(row_index, user, changed))
+
+        if not data:
+            return 0
+
+        if self._degraded():
+            self._journal_batch(batch)
+            await self.journal.sync()
+            return len(batch)
+        try:
+            await sheets_api.batch_update(data)
+        except Exception as exc:
+            if sheets_api.is_outage(exc):
+                self._journal_batch(batch)
+                await self.journal.sync()
+                return len(batch)
+            for chat_id, changed in batch.items():
+                self._pending_updates.setdefault(chat_id, set()).update(changed)
+            raise
+        logger.info("Flushed queued updates for %s users (%s cells)", len(batch), len(data))
+        return len(batch)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        self._flush_task = asyncio.create_task(self._flush_after_delay(self._write_behind_ms() / 1000))
+
+    async def _flush_after_delay(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            async with sheets_api.row_layout.shared():
+                await self.flush()
+        except Exception:  # noqa: BLE001 - updates stay queued for the next attempt
+            logger.exception("Failed to flush queued user updates")
+        if self._pending_updates:
+            asyncio.get_running_loop().call_soon(self._schedule_flush)
+
+    async def stop_write_behind(self) -> None:
+        task, self._flush_task = self._flush_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def start(self) -> None:
+        if self._journal_task is None or self._journal_task.done():
+            self._journal_task = asyncio.create_task(self._journal_loop())
+
+    async def stop(self) -> None:
+        task, self._journal_task = self._journal_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _journal_loop(self) -> None:
+        while True:
+            await asyncio.sleep(JOURNAL_REPLAY_INTERVAL_SECONDS)
+            if not len(self.journal):
+                continue
+            try:
+                async with sheets_api.row_layout.shared():
+                    await self.replay_journal()
+            except CircuitOpenError:
+                continue
+            except Exception:  # noqa: BLE001 - entries stay journaled for the next pass
+                logger.exception("Failed to replay the Sheets write journal")
+
+    async def replay_journal(self) -> int:
+        """Write journaled user changes to the sheet and return the number of users written.
+
+        Entries are merged per user into one append or one set of cell updates,
+        placed by a fresh read of the sheet, so replaying twice is harmless.
+        Writes journaled while the replay runs wait for the next one. The
+        caller holds ``sheets_api.row_layout`` shared.
+        """
+
+        journal = self.journal
+        async with self._journal_lock:
+            entries = journal.entries()
+            if not entries:
+                return 0
+
+            merged: Dict[int, Tuple[User, Set[str]]] = {}
+            for entry in entries:
+                user = user_from_sheet_row(dict(zip(USER_HEADER, entry["record"])))
+                fields = set(USER_HEADER if entry["create"] else entry["fields"])
+                if user.chat_id in merged:
+                    fields |= merged[user.chat_id][1]
+                merged[user.chat_id] = (user, fields)
+
+            rows: Dict[int, int] = {}
+            for row, user in await sheets_api.all_users():
+                rows.setdefault(user.chat_id, row)
+            missing = [user for chat_id, (user, _) in merged.items() if chat_id not in rows]
+            data: List[Dict[str, Any]] = []
+            for chat_id, (user, fields) in merged.items():
+                if chat_id in rows:
+                    data.extend(sheets_api.cell_updates(rows[chat_id], user, fields))
+            if missing:
+                response = await sheets_api.append_once([user.to_sheet_row() for user in missing])
+                first_row = sheets_api.appended_row_index(response)
+                for offset, user in enumerate(missing):
+                    rows[user.chat_id] = first_row + offset if first_row is not None else 0
+            if data:
+                await sheets_api.batch_update(data)
+            await journal.consume(len(entries))
+            metrics.SHEETS_JOURNAL_ENTRIES.set(len(journal))
+
+        for chat_id in merged:
+            cached = self.index.get(chat_id)
+            if not rows[chat_id]:
+                self.index.discard(chat_id)
+            elif cached is not None and cached[0] != rows[chat_id]:
+                self.index.put(rows[chat_id], cached[1])
+        logger.warning("Replayed %s journaled writes for %s users to Sheets", len(entries), len(merged))
+        return len(merged)
+
+    def _journal_batch(self, batch: Dict[int, Set[str]]) -> None:
+        for chat_id, changed in batch.items():
+            cached = self.index.get(chat_id)
+            if cached is not None:
+                self._journal_write(cached[1], changed)
+
+    def _journal_write(self, user: User, fields: Iterable[str], create: bool = False) -> None:
+        journal = self.journal
+        journal.append(user.to_sheet_row(), sorted(fields), create)
+        metrics.SHEETS_JOURNAL_ENTRIES.set(len(journal))
+        logger.warning("Sheets unavailable, journaled %s for user %s", "create" if create else "update", user.chat_id)
+
+    def _journaled_users(self) -> Dict[int, User]:
+        """Latest journaled state of each user with unreplayed writes."""
+
+        users: Dict[int, User] = {}
+        for entry in self.journal.entries():
+            user = user_from_sheet_row(dict(zip(USER_HEADER, entry["record"])))
+            users[user.chat_id] = user
+        return users
+
+
+def check_cached_last_step_at(user: User, expected: datetime) -> None:
+    """Compare-and-set check against a cached or local copy of ``user``."""
+
+    if user.last_step_at != expected:
+        raise sheets_api.ConcurrentUpdateError(
+            f"User {user.chat_id} was modified concurrently: last_step_at is "
+            f"{user.last_step_at!r}, expected {expected!r}"
+        )
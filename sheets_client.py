@@ -1,158 +1,420 @@
-"""Google Sheets client helpers for the Welcome24 bot."""
+"""Google Sheets client helpers for the Welcome24 bot.
+
+The public functions here are what the bot uses for users. They delegate to
+one ``UserBackend`` picked at startup from ``STORAGE_BACKEND``: the Users
+worksheet served from an in-memory index (``sheets_backend``) or a local
+SQLite database replicated to the sheet (``sqlite_backend``). The archive
+worksheet, per-chat locking, change listeners and cluster forwarding are
+shared by both and live here.
+"""
 
 from __future__ import annotations
 
 import asyncio
+import bisect
+import functools
+import itertools
 import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
 from datetime import datetime
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Protocol, Set, Tuple, TypeVar
 
-import gspread
-from gspread import Worksheet
-from gspread.utils import rowcol_to_a1
+import metrics
+import sheets_api
+from circuit_breaker import CircuitOpenError
+from config import BotConfig, get_config
+from models import USER_HEADER, User, user_from_sheet_row
+from sheet_changes import KeyDiff
+from sheets_backend import ArchiveMove, SheetsIndexBackend, UserListener
+from sqlite_backend import SQLiteBackend
+from user_store import SQLiteUserStore
 
-from config import BotConfig, load_config
-from models import User, user_from_sheet_row
+if TYPE_CHECKING:
+    from user_table import UserTable
 
 logger = logging.getLogger(__name__)
 
-CONFIG: BotConfig = load_config()
-USER_HEADER: List[str] = [
-    "chat_id",
-    "username",
-    "first_name",
-    "full_name",
-    "phone",
-    "city",
-    "current_stage",
-    "registered_at",
-    "last_step_at",
-    "reminder_1h_sent",
-    "reminder_24h_sent",
-]
-
 DEFAULT_USER_VALUES: Dict[str, Any] = {
-    "current_stage": CONFIG.start_stage,
     "reminder_1h_sent": False,
     "reminder_24h_sent": False,
 }
 
-_worksheet: Worksheet | None = None
+INDEX_REFRESH_INTERVAL_SECONDS = 300.0
+# With change detection on, a full reload is only a safety net for edits it cannot see.
+FULL_REFRESH_INTERVAL_SECONDS = 3600.0
 
+T = TypeVar("T")
+WriterCall = Callable[..., Awaitable[Any]]
 
-def _init_worksheet() -> Worksheet:
-    """Create and cache a gspread worksheet instance."""
 
-    global _worksheet
-    if _worksheet is not None:
-        return _worksheet
+class UserBackend(Protocol):
+    """Primary copy of the active users, behind the public functions of this module.
 
-    client = gspread.service_account_from_dict(CONFIG.google_service_account)
-    spreadsheet = client.open_by_key(CONFIG.spreadsheet_id)
-    _worksheet = spreadsheet.worksheet(CONFIG.worksheet_name)
-    logger.info("Connected to worksheet '%s'", CONFIG.worksheet_name)
-    return _worksheet
+    Records are ``(row, user)`` pairs; row 0 means the backend does not know
+    (or need) the user's row in the Users worksheet. Backends report users
+    changed by edits in the sheet through the listener they were built with.
+    """
 
+    sync_interval: float | None
+    """Seconds between ``flush`` calls from the refresh loop, or ``None`` when writes go out on their own."""
 
-async def _get_worksheet() -> Worksheet:
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _init_worksheet)
+    def is_stale(self) -> bool: ...
 
+    async def warm_up(self) -> int: ...
 
-async def read_user(row_index: int) -> User | None:
-    """Read a user by row index (1-based, including header)."""
+    async def load(self) -> int: ...
 
-    worksheet = await _get_worksheet()
+    def cached(self, chat_id: int) -> Tuple[int, User] | None: ...
 
-    def _read() -> User | None:
-        values = worksheet.row_values(row_index)
-        if not values or len(values) < len(USER_HEADER):
-            return None
-        row_dict = dict(zip(USER_HEADER, values))
-        return user_from_sheet_row(row_dict)
+    async def find(self, chat_id: int) -> Tuple[int, User] | None: ...
 
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _read)
+    async def read_row(self, row_index: int) -> User | None: ...
 
+    async def by_username(self, username: str) -> User | None: ...
 
-async def create_user(data: Dict[str, Any]) -> User:
-    """Create a new user entry in Google Sheets."""
+    async def usernames_with_prefix(self, prefix: str, limit: int) -> List[str]: ...
 
-    worksheet = await _get_worksheet()
-    payload = {**DEFAULT_USER_VALUES, **data}
-    record = _prepare_record(payload)
+    async def users(self) -> List[User]: ...
 
-    def _append() -> None:
-        worksheet.append_row(record, value_input_option="USER_ENTERED")
+    async def create(self, user: User) -> User | None: ...
 
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, _append)
-    logger.info("Created user %s", data.get("chat_id"))
-    return user_from_sheet_row(dict(zip(USER_HEADER, record)))
+    async def check_last_step_at(self, row_index: int, user: User, expected: datetime) -> None: ...
 
+    async def write(self, row_index: int, user: User, changed: Set[str]) -> None: ...
 
-async def update_user(chat_id: int, updates: Dict[str, Any]) -> User | None:
-    """Update an existing user entry."""
+    async def add_restored(self, user: User) -> int: ...
 
-    record = await _find_user_record(chat_id)
-    if record is None:
-        logger.warning("User %s not found for update", chat_id)
-        return None
+    async def apply_sheet_edits(self, can_locate: bool) -> Tuple[KeyDiff, int]: ...
+
+    async def archive(self, move: ArchiveMove) -> List[int]: ...
+
+    async def flush(self) -> int: ...
+
+    async def stop_write_behind(self) -> None: ...
+
+    def start(self) -> None: ...
+
+    async def stop(self) -> None: ...
+
+
+class ArchiveIndex:
+    """chat_id -> row and username -> chat_id over the archive worksheet.
+
+    Only the two key columns are kept, so a lookup for a chat_id that was
+    never archived costs no API call and memory stays far below a full cache.
+    """
+
+    def __init__(self, values: List[List[str]]) -> None:
+        self._rows: Dict[int, int] = {}
+        self._by_username: Dict[str, int] = {}
+        for row_index, row in enumerate(values[1:], start=2):
+            try:
+                chat_id = int(row[0])
+            except (IndexError, ValueError):
+                continue
+            self.add(row_index, chat_id, row[1] if len(row) > 1 else "")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get(self, chat_id: int) -> int | None:
+        return self._rows.get(chat_id)
+
+    def get_by_username(self, username: str) -> int | None:
+        return self._by_username.get(username.lower())
+
+    def add(self, row_index: int, chat_id: int, username: str | None) -> None:
+        self._rows.setdefault(chat_id, row_index)
+        if username:
+            self._by_username.setdefault(username.lower(), chat_id)
+
+    def remove(self, chat_id: int) -> None:
+        """Forget ``chat_id`` after its row was deleted, shifting the rows below it up."""
+
+        row_index = self._rows.pop(chat_id, None)
+        if row_index is None:
+            return
+        self._by_username = {name: other for name, other in self._by_username.items() if other != chat_id}
+        for other, other_row in self._rows.items():
+            if other_row > row_index:
+                self._rows[other] = other_row - 1
+
+
+
+class _ChatLocks:
+    """One ``asyncio.Lock`` per chat, dropped once nobody holds or waits for it."""
+
+    def __init__(self) -> None:
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, chat_id: int) -> AsyncIterator[None]:
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._users[chat_id] = self._users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[chat_id] -= 1
+            if not self._users[chat_id]:
+                del self._users[chat_id], self._locks[chat_id]
+
+
+_user_backend: UserBackend | None = None
+_user_listeners: List[UserListener] = []
+_table: UserTable | None = None
+_refresh_task: asyncio.Task[None] | None = None
+
+_chat_locks = _ChatLocks()
+_archive_index: ArchiveIndex | None = None
+_archive_lock = asyncio.Lock()
+
+_writer: WriterCall | None = None
+_write_behind_ms: int | None = None
+FORWARDED_CALLS: Set[str] = set()
+
+_stable_rows = sheets_api.stable_rows
+
+
+def _config() -> BotConfig:
+    return get_config()
+
+
+def _backend() -> UserBackend:
+    """The user backend chosen by ``STORAGE_BACKEND``, created on first use."""
+
+    global _user_backend
+    if _user_backend is None:
+        config = _config()
+        if config.storage_backend == "sqlite":
+            _user_backend = SQLiteBackend(SQLiteUserStore(config.sqlite_path), _notify_listeners)
+        else:
+            _user_backend = SheetsIndexBackend(
+                config.data_dir / "sheets_journal.jsonl",
+                _notify_listeners,
+                _write_behind_window_ms,
+            )
+    return _user_backend
+
+
+async def close_sheets_client() -> None:
+    """Close the aiohttp session of ``SHEETS_BACKEND=aiohttp``, if one was opened."""
+
+    await sheets_api.close()
+
+
+def use_writer(call: WriterCall | None) -> None:
+    """Send the user reads and writes of this process to another one (the cluster's Sheets writer).
+
+    ``call(name, *args, **kwargs)`` runs the function ``name`` of this module
+    in the writer process; ``None`` goes back to calling Sheets directly.
+    """
+
+    global _writer
+    _writer = call
+
+
+def use_write_behind(ms: int | None) -> None:
+    """Batch user updates for ``ms`` milliseconds in this process, instead of ``SHEETS_WRITE_BEHIND_MS``.
+
+    ``None`` goes back to the configured value.
+    """
+
+    global _write_behind_ms
+    _write_behind_ms = ms
+
+
+def _write_behind_window_ms() -> int:
+    return _config().sheets_write_behind_ms if _write_behind_ms is None else _write_behind_ms
+
+
+def _forwarded(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Run ``func`` in the Sheets writer process when one is in use."""
+
+    FORWARDED_CALLS.add(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if _writer is not None:
+            return await _writer(func.__name__, *args, **kwargs)
+        return await func(*args, **kwargs)
 
-    row_index, row_dict = record
-    row_dict.update({key: value for key, value in updates.items() if key in USER_HEADER})
-    sanitized_row = _prepare_record(row_dict)
-    worksheet = await _get_worksheet()
+    return wrapper
 
-    def _update() -> None:
-        start = rowcol_to_a1(row_index, 1)
-        end = rowcol_to_a1(row_index, len(USER_HEADER))
-        worksheet.update(f"{start}:{end}", [sanitized_row])
 
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, _update)
-    logger.info("Updated user %s", chat_id)
-    return user_from_sheet_row(dict(zip(USER_HEADER, sanitized_row)))
+@_forwarded
+async def is_stale() -> bool:
+    """Whether reads are served from the last snapshot because the Sheets circuit is open.
 
+    Always ``False`` with the SQLite store, which is the primary copy. In a
+    cluster worker this asks the Sheets writer.
+    """
 
+    return _backend().is_stale()
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+async def read_user(row_index: int) -> User | None:
+    """Read a user by row index (1-based, including header)."""
+
+    return await _backend().read_row(row_index)
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+@_stable_rows
+async def create_user(data: Dict[str, Any]) -> User:
+    """Create a new user entry in Google Sheets."""
+
+    payload = {"current_stage": _config().start_stage, **DEFAULT_USER_VALUES, **data}
+    user = user_from_sheet_row(dict(zip(USER_HEADER, sheets_api.prepare_record(payload))))
+    created = await _backend().create(user)
+    if created is None:
+        logger.warning("User %s already exists, updating instead", user.chat_id)
+        updated = await update_user(user.chat_id, payload)
+        assert updated is not None
+        return updated
+    _notify_listeners(None, user)
+    return created
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+@_stable_rows
+async def update_user(
+    chat_id: int,
+    updates: Dict[str, Any],
+    expected_last_step_at: datetime | None = None,
+) -> User | None:
+    """Update an existing user entry, writing only the cells that changed.
+
+    When ``expected_last_step_at`` is given the sheet's ``last_step_at`` is
+    checked first and ``ConcurrentUpdateError`` is raised if it no longer matches.
+    Archived users are moved back to the Users worksheet first. While Sheets is
+    unavailable the write goes to the local journal and the check is made
+    against the cached user. Updates of one chat run one at a time, from the
+    check to the write.
+    """
+
+    backend = _backend()
+    async with _chat_locks.hold(chat_id):
+        record = await _find_user_record(chat_id, restore=True)
+        if record is None:
+            logger.warning("User %s not found for update", chat_id)
+            return None
+
+        row_index, user = record
+        if expected_last_step_at is not None:
+            await backend.check_last_step_at(row_index, user, expected_last_step_at)
+
+        previous = replace(user)
+        changed = user.apply_updates(updates)
+        if not changed:
+            return user
+
+        await backend.write(row_index, user, changed)
+        _notify_listeners(previous, user)
+        return user
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+@_stable_rows
 async def get_user_by_chat_id(chat_id: int) -> User | None:
-    """Fetch a user by Telegram chat_id."""
+    """Fetch a user by Telegram chat_id, falling back to the archive on a miss."""
 
     record = await _find_user_record(chat_id)
     if record is None:
-        return None
-    _, row_dict = record
-    return user_from_sheet_row(row_dict)
+        return await _archived_user(chat_id)
+    _, user = record
+    return user
 
 
+@metrics.observe_sheets("client")
+@_forwarded
 async def get_user_by_username(username: str) -> User | None:
-    """Find a user by @username."""
+    """Find a user by @username, falling back to the archive on a miss."""
 
     normalized = username.lstrip("@").lower()
-    users = await list_users()
-    for user in users:
-        if user.username and user.username.lower() == normalized:
-            return user
-    return None
+    user = await _backend().by_username(normalized)
+    if user is not None:
+        return user
+
+    chat_id = (await _load_archive_index()).get_by_username(normalized)
+    return await _archived_user(chat_id) if chat_id is not None else None
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+async def search_usernames(prefix: str, limit: int = 10) -> List[str]:
+    """Return up to ``limit`` lower-cased usernames starting with ``prefix`` for autocompletion."""
 
+    return await _backend().usernames_with_prefix(prefix.lstrip("@").lower(), limit)
 
+
+@metrics.observe_sheets("client")
+@_forwarded
+async def sync_username(chat_id: int, username: str | None) -> User | None:
+    """Record a user's current Telegram username if it differs from the stored one.
+
+    Costs no API call when the username is unchanged.
+    """
+
+    user = await get_user_by_chat_id(chat_id)
+    if user is None or (user.username or None) == (username or None):
+        return user
+    return await update_user(chat_id, {"username": username})
+
+
+@metrics.observe_sheets("client")
+@_forwarded
 async def list_users() -> List[User]:
-    """Load all users from Google Sheets."""
+    """Return all active users, loading the index from Google Sheets on first use.
+
+    The index is kept current by writes through this module and the
+    background refresh, so later calls do not read the sheet. Archived users
+    are not included.
+    """
+
+    return await _backend().users()
 
-    worksheet = await _get_worksheet()
 
-    def _read() -> List[User]:
-        records = worksheet.get_all_records()
-        return [
-            user_from_sheet_row(record)
-            for record in records
-            if record.get("chat_id")
-        ]
+@metrics.observe_sheets("client")
+@_forwarded
+async def list_archived_users() -> List[User]:
+    """Return the archived users with only their stage and timestamps filled in.
 
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _read)
+    One narrow read of the archive worksheet, for statistics that should not
+    change when users are archived.
+    """
 
+    names = ("chat_id", "current_stage", "registered_at", "last_step_at")
+    columns = await sheets_api.archive_columns(names)
+    if not columns:
+        return []
+    rows = itertools.zip_longest(*columns, fillvalue="")
+    next(rows, None)  # header
+    return [user_from_sheet_row(dict(zip(names, values))) for values in rows if str(values[0]).strip().isdigit()]
 
+
+async def user_table() -> UserTable:
+    """Columnar snapshot of all users, rebuilt only after users changed."""
+
+    from user_table import UserTable
+
+    global _table
+    if _table is None:
+        users = await list_users()
+        _table = UserTable.from_users(users)
+    return _table
+
+
+@metrics.observe_sheets("client")
+@_forwarded
 async def reset_user_progress(chat_id: int) -> User | None:
     """Reset a user's onboarding progress to stage_0."""
 
@@ -167,33 +429,304 @@ async def reset_user_progress(chat_id: int) -> User | None:
     )
 
 
-async def _find_user_record(chat_id: int) -> Tuple[int, Dict[str, Any]] | None:
-    worksheet = await _get_worksheet()
+def add_user_listener(listener: UserListener) -> None:
+    """Call ``listener(previous, current)`` after every user created or updated here."""
 
-    def _lookup() -> Tuple[int, Dict[str, Any]] | None:
-        records = worksheet.get_all_records()
-        for idx, record in enumerate(records, start=2):  # data starts on row 2
-            if str(record.get("chat_id")) == str(chat_id):
-                return idx, record
-        return None
+    _user_listeners.append(listener)
+
+
+def remove_user_listener(listener: UserListener) -> None:
+    """Stop calling a listener added with ``add_user_listener``."""
 
-    loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _lookup)
+    if listener in _user_listeners:
+        _user_listeners.remove(listener)
 
 
-def _prepare_record(data: Dict[str, Any]) -> List[Any]:
-    """Return a sanitized list that aligns with the user header order."""
+def notify_user_changed(previous: User | None, current: User) -> None:
+    """Tell the local listeners about a change made in the Sheets writer process."""
 
-    record: List[Any] = []
-    for key in USER_HEADER:
-        value = data.get(key)
-        if isinstance(value, datetime):
-            record.append(value.isoformat())
-        elif isinstance(value, bool):
-            record.append("TRUE" if value else "FALSE")
-        elif value is None:
-            record.append("")
+    _notify_listeners(previous, current)
+
+
+def _notify_listeners(previous: User | None, current: User) -> None:
+    _invalidate_table()
+    for listener in _user_listeners:
+        try:
+            listener(previous, current)
+        except Exception:  # noqa: BLE001 - a broken listener must not fail the write
+            logger.exception("User listener %r failed", listener)
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+async def load_user_index() -> int:
+    """Rebuild the chat_id index from one bulk read and return the number of users.
+
+    With the SQLite store this reconciles the local database with the sheet.
+    """
+
+    count = await _backend().load()
+    _invalidate_table()
+    return count
+
+
+async def warm_up() -> int:
+    """Open the Sheets connection (token, worksheet handle) and load the user cache.
+
+    Called on startup so the first user does not pay for auth and lookups.
+    Returns the number of users loaded. In a cluster worker the writer has
+    already warmed up, so this only counts its users.
+    """
+
+    if _writer is not None:
+        return len(await list_users())
+    await sheets_api.connect()
+    await _load_archive_index()
+    count = await _backend().warm_up()
+    _invalidate_table()
+    return count
+
+
+def start_index_refresh(interval: float = INDEX_REFRESH_INTERVAL_SECONDS) -> None:
+    """Start the background task that keeps the user cache in step with the sheet.
+
+    With ``SHEETS_CHANGE_POLL_SECONDS`` set it applies hand edits found by
+    ``detect_sheet_edits`` and reloads everything only hourly; otherwise it
+    reloads the whole sheet every ``interval`` seconds. Backends that
+    replicate to the sheet are flushed from the same loop.
+    """
+
+    global _refresh_task
+    if _refresh_task is not None and not _refresh_task.done():
+        return
+    backend = _backend()
+    _refresh_task = asyncio.create_task(_refresh_loop(backend, interval))
+    backend.start()
+
+
+async def stop_index_refresh() -> None:
+    """Cancel the background index refresh, if running, and write out what the backend still holds."""
+
+    global _refresh_task
+    task, _refresh_task = _refresh_task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await _backend().stop()
+
+
+async def _refresh_loop(backend: UserBackend, interval: float) -> None:
+    poll = _config().sheets_change_poll_seconds
+    reload_interval = FULL_REFRESH_INTERVAL_SECONDS if poll else interval
+    period = min(value for value in (poll, interval, backend.sync_interval) if value)
+    last_reload = last_poll = time.monotonic()
+    while True:
+        await asyncio.sleep(period)
+        try:
+            if time.monotonic() - last_reload >= reload_interval:
+                await load_user_index()
+                last_reload = last_poll = time.monotonic()
+            elif poll and time.monotonic() - last_poll >= poll:
+                await detect_sheet_edits()
+                last_poll = time.monotonic()
+            if backend.sync_interval:
+                await flush()
+        except CircuitOpenError:
+            logger.debug("Sheets circuit is open, keeping the stale user index")
+        except Exception:  # noqa: BLE001 - keep serving from the last snapshot
+            logger.exception("Failed to refresh the user index")
+
+
+@metrics.observe_sheets("client")
+@_stable_rows
+async def detect_sheet_edits() -> int:
+    """Apply edits made directly in the spreadsheet since the last check; return the users changed.
+
+    An untouched spreadsheet costs one Drive metadata request. Otherwise the
+    ``chat_id`` and ``current_stage`` columns are read and only the row blocks
+    they show as new or restaged are re-read in full, in one more request.
+    Edits to other columns are found with a full reload when this process
+    wrote nothing since the last check, and by the hourly reload otherwise
+    (those return 0).
+    """
+
+    changed, can_locate = await sheets_api.check_modified()
+    if not changed:
+        return 0
+    diff, count = await _backend().apply_sheet_edits(can_locate)
+    if diff.empty and not can_locate:
+        logger.info("Spreadsheet edited outside the key columns, reloading it")
+        await load_user_index()
+        return 0
+    if not diff.empty:
+        _invalidate_table()
+        logger.info(
+            "Applied sheet edits: %s users changed, %s moved, %s removed (%s rows re-read)",
+            count,
+            len(diff.moved),
+            len(diff.removed),
+            sum(last - first + 1 for first, last in diff.blocks),
+        )
+    return count
+
+
+@_stable_rows
+async def replay_journal() -> int:
+    """Write journaled user changes to the sheet and return the number of users written.
+
+    Entries are merged per user into one append or one set of cell updates,
+    placed by a fresh read of the sheet, so replaying twice is harmless.
+    Only the Sheets backend journals; with the SQLite store this returns 0.
+    """
+
+    backend = _backend()
+    if not isinstance(backend, SheetsIndexBackend):
+        return 0
+    return await backend.replay_journal()
+
+
+@metrics.observe_sheets("client")
+@_forwarded
+@_stable_rows
+async def flush() -> int:
+    """Write all queued updates in one ``batch_update`` call and return the user count.
+
+    Admin commands that must read their own writes should await this first.
+    With the SQLite store it pushes every unsynced local change to the sheet.
+    """
+
+    return await _backend().flush()
+
+
+async def stop_write_behind() -> None:
+    """Cancel the pending flush timer and write out everything that is queued."""
+
+    await _backend().stop_write_behind()
+    await flush()
+
+
+async def archive_users(select: Callable[[List[User]], Iterable[int]], limit: int) -> List[int]:
+    """Move up to ``limit`` users chosen by ``select`` to the archive worksheet.
+
+    ``select`` gets every active user and returns the chat_ids to archive.
+    Rows are appended to the archive before they are deleted from the Users
+    worksheet (in one request), so a failure in between leaves a duplicate
+    rather than losing a user. Writers that address rows by number wait while
+    rows move. Returns the chat_ids that were archived; nothing is archived
+    while journaled writes await replay.
+    """
+
+    async with sheets_api.row_layout.exclusive():
+        moved = await _backend().archive(functools.partial(_move_to_archive, select, limit))
+        if moved:
+            _invalidate_table()
+    return moved
+
+
+async def _move_to_archive(
+    select: Callable[[List[User]], Iterable[int]],
+    limit: int,
+) -> Tuple[List[int], List[Tuple[int, User]]]:
+    """Archive the selected rows; return their chat_ids and the renumbered remaining rows."""
+
+    global _archive_index
+    rows = await sheets_api.all_users()
+    chosen = set(select([user for _, user in rows]))
+    moving = [(row, user) for row, user in rows if user.chat_id in chosen][:limit]
+    if not moving:
+        return [], rows
+
+    async with _archive_lock:
+        archive = await _load_archive_index()
+        response = await sheets_api.append_once([user.to_sheet_row() for _, user in moving], archive=True)
+        await sheets_api.delete_once([(row, user.chat_id) for row, user in moving])
+        first_row = sheets_api.appended_row_index(response)
+        if first_row is None:
+            _archive_index = None
         else:
-            record.append(str(value))
-    return record
+            for offset, (_, user) in enumerate(moving):
+                archive.add(first_row + offset, user.chat_id, user.username)
+
+    deleted = [row for row, _ in moving]
+    moved_ids = {user.chat_id for _, user in moving}
+    remaining = [
+        (row - bisect.bisect_left(deleted, row), user) for row, user in rows if user.chat_id not in moved_ids
+    ]
+    logger.info("Archived %s users", len(moving))
+    return [user.chat_id for _, user in moving], remaining
+
+
+async def _load_archive_index() -> ArchiveIndex:
+    global _archive_index
+    if _archive_index is None:
+        _archive_index = ArchiveIndex(await sheets_api.archive_keys())
+        logger.debug("Archive index loaded with %s users", len(_archive_index))
+    return _archive_index
+
+
+async def _archived_user(chat_id: int) -> User | None:
+    global _archive_index
+    try:
+        row_index = (await _load_archive_index()).get(chat_id)
+        if row_index is None:
+            return None
+        values = await sheets_api.archive_row_values(row_index)
+    except Exception as exc:
+        if not sheets_api.is_outage(exc):
+            raise
+        logger.warning("Sheets unavailable, cannot look up user %s in the archive", chat_id)
+        return None
+    user = user_from_sheet_row(dict(zip(USER_HEADER, values)))
+    if user.chat_id != chat_id:
+        logger.warning("Archive row %s no longer holds user %s, reloading archive index", row_index, chat_id)
+        _archive_index = None
+        return None
+    return user
+
+
+async def _restore_archived(chat_id: int) -> Tuple[int, User] | None:
+    """Move an archived user back to the Users worksheet and return its new row."""
+
+    backend = _backend()
+    async with _archive_lock:
+        # Another caller may have restored the user while this one waited.
+        cached = backend.cached(chat_id)
+        if cached is not None:
+            return cached
+
+        user = await _archived_user(chat_id)
+        if user is None:
+            return None
+        archive_row = (await _load_archive_index()).get(chat_id)
+        assert archive_row is not None
+
+        row_index = await backend.add_restored(user)
+        await sheets_api.delete_once([(archive_row, chat_id)], archive=True)
+        (await _load_archive_index()).remove(chat_id)
 
+    if not row_index and backend.cached(chat_id) is None:
+        # The append response had no row number; look the row up instead.
+        return await _find_user_record(chat_id)
+    _invalidate_table()
+    logger.info("Restored user %s from the archive", chat_id)
+    return row_index, replace(user)
+
+
+def _invalidate_table() -> None:
+    global _table
+    _table = None
+
+
+async def _find_user_record(chat_id: int, restore: bool = False) -> Tuple[int, User] | None:
+    """Return the row number and a private copy of the user.
+
+    With ``restore`` an archived user is moved back to the Users worksheet.
+    """
+
+    record = await _backend().find(chat_id)
+    if record is None and restore:
+        return await _restore_archived(chat_id)
+    return record
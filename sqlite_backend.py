@@ -0,0 +1,178 @@
+"""User backend with a local SQLite database as the primary copy.
+
+Selected with ``STORAGE_BACKEND=sqlite``. Reads and writes only touch the
+database; new users and changed cells are replicated to the Users
+worksheet in the background, and edits made in the sheet are applied back.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Dict, List, Set, Tuple
+
+import sheets_api
+from models import User
+from sheet_changes import KeyDiff
+from sheets_backend import ArchiveMove, UserListener, check_cached_last_step_at
+from user_store import SQLiteUserStore
+
+logger = logging.getLogger(__name__)
+
+REPLICATE_INTERVAL_SECONDS = 2.0
+
+
+class SQLiteBackend:
+    """``SQLiteUserStore`` as the primary copy, replicated to the Users worksheet.
+
+    ``notify(previous, current)`` is called for users changed by edits found
+    in the sheet. Row numbers are not used for reads or writes here, so
+    records are returned with row 0.
+    """
+
+    sync_interval: float | None = REPLICATE_INTERVAL_SECONDS
+
+    def __init__(self, store: SQLiteUserStore, notify: UserListener) -> None:
+        self.store = store
+        self._notify = notify
+        self._replicate_lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return False
+
+    async def warm_up(self) -> int:
+        return await self.load()
+
+    async def load(self) -> int:
+        """Reconcile the database with the sheet and return the number of users."""
+
+        async with self._replicate_lock:
+            await sheets_api.mark_modified_time()
+            changes = self.store.reconcile(await sheets_api.all_users())
+        for previous, current in changes:
+            self._notify(previous, current)
+        if changes:
+            logger.info("Applied %s sheet edits to the local store", len(changes))
+        return len(self.store)
+
+    def cached(self, chat_id: int) -> Tuple[int, User] | None:
+        user = self.store.get(chat_id)
+        return (0, user) if user is not None else None
+
+    async def find(self, chat_id: int) -> Tuple[int, User] | None:
+        return self.cached(chat_id)
+
+    async def read_row(self, row_index: int) -> User | None:
+        return self.store.get_by_row(row_index) if row_index > 0 else None
+
+    async def by_username(self, username: str) -> User | None:
+        return self.store.get_by_username(username)
+
+    async def usernames_with_prefix(self, prefix: str, limit: int) -> List[str]:
+        return self.store.usernames_with_prefix(prefix, limit)
+
+    async def users(self) -> List[User]:
+        return self.store.all()
+
+    async def create(self, user: User) -> User | None:
+        if self.store.get(user.chat_id) is not None:
+            return None
+        self.store.insert(user)
+        logger.info("Created user %s", user.chat_id)
+        return replace(user)
+
+    async def check_last_step_at(self, row_index: int, user: User, expected: datetime) -> None:
+        check_cached_last_step_at(user, expected)
+
+    async def write(self, row_index: int, user: User, changed: Set[str]) -> None:
+        self.store.update(user, changed)
+        user.mark_clean()
+
+    async def add_restored(self, user: User) -> int:
+        self.store.insert(user)
+        return 0
+
+    async def apply_sheet_edits(self, can_locate: bool) -> Tuple[KeyDiff, int]:
+        changes: List[Tuple[User | None, User]] = []
+        async with self._replicate_lock:
+            diff, rows = await sheets_api.read_sheet_edits(self.store.sheet_keys())
+            if not diff.empty or can_locate:
+                changes = self.store.apply_sheet_rows(rows, diff.moved, diff.removed)
+        for previous, current in changes:
+            self._notify(previous, current)
+        return diff, len(changes)
+
+    async def archive(self, move: ArchiveMove) -> List[int]:
+        async with self._replicate_lock:
+            await self._replicate_pending()
+            moved, remaining = await move()
+            if moved:
+                self.store.delete(moved)
+                self.store.reconcile(remaining)
+        return moved
+
+    async def flush(self) -> int:
+        """Append new users and push changed cells to the sheet; return the users synced."""
+
+        async with self._replicate_lock:
+            return await self._replicate_pending()
+
+    async def _replicate_pending(self) -> int:
+        """Body of ``flush``; the caller holds ``_replicate_lock``."""
+
+        store = self.store
+        unplaced = store.unplaced()
+        appending = store.appending()
+        if appending:
+            # An earlier append may have landed without its response (crash, timeout).
+            _place_by_chat_id(store, appending, await sheets_api.sheet_chat_ids())
+            unplaced = store.unplaced()
+        if unplaced:
+            store.mark_appending(user.chat_id for user in unplaced)
+            response = await sheets_api.append_once([user.to_sheet_row() for user in unplaced])
+            first_row = sheets_api.appended_row_index(response)
+            if first_row is None:
+                logger.warning("Could not read appended row numbers, locating them by chat_id")
+                _place_by_chat_id(store, [user.chat_id for user in unplaced], await sheets_api.sheet_chat_ids())
+            else:
+                for offset, user in enumerate(unplaced):
+                    store.set_sheet_row(user.chat_id, first_row + offset)
+
+        data: List[Dict[str, Any]] = []
+        synced: List[Tuple[int, Dict[str, int]]] = []
+        for user, sheet_row, fields in store.pending_changes():
+            if sheet_row is None or sheet_row <= 0:
+                continue
+            data.extend(sheets_api.cell_updates(sheet_row, user, fields))
+            synced.append((user.chat_id, fields))
+        if data:
+            await sheets_api.batch_update(data)
+        for chat_id, fields in synced:
+            store.mark_synced(chat_id, fields)
+
+        if unplaced or synced:
+            logger.debug("Replicated %s new and %s changed users", len(unplaced), len(synced))
+        return len(unplaced) + len(synced)
+
+    async def stop_write_behind(self) -> None:
+        """Nothing is queued in memory; ``flush`` pushes the pending changes."""
+
+    def start(self) -> None:
+        """Replication runs from the ``sheets_client`` refresh loop every ``sync_interval``."""
+
+    async def stop(self) -> None:
+        await self.flush()
+
+
+def _place_by_chat_id(store: SQLiteUserStore, chat_ids: List[int], column: List[str]) -> None:
+    """Record the rows of ``chat_ids`` found in the sheet's chat_id ``column``."""
+
+    rows: Dict[str, int] = {}
+    for idx, value in enumerate(column, start=1):
+        rows.setdefault(value, idx)
+    for chat_id in chat_ids:
+        row_index = rows.get(str(chat_id))
+        if row_index is not None:
+            store.set_sheet_row(chat_id, row_index)
@@ -0,0 +1,126 @@
+"""Precompiled stage payloads and callback routing built from ``constants``."""
+
+from __future__ import annotations
+
+import html
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from constants import DEFAULT_STAGE_ORDER, STAGE_TEXTS, STAGE_VIDEO_URLS
+
+STAGE_ACTIONS: Tuple[str, ...] = ("video_done", "doc_done", "request", "complete")
+MAX_CALLBACK_DATA_BYTES = 64
+
+
+@dataclass(frozen=True, slots=True)
+class StagePayload:
+    """Ready-to-send stage message: HTML text, keyboard and video URL."""
+
+    stage: str
+    text: str
+    reply_markup: InlineKeyboardMarkup
+    video_url: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class CallbackRoute:
+    """Where a stage button leads.
+
+    ``next_stage`` is set on the button that moves the user on: ``complete``, or
+    the only button of a stage without one (``stage_0_video_done``). It stays
+    ``None`` for in-stage actions and for the final button, which finishes
+    onboarding.
+    """
+
+    stage: str
+    action: str
+    next_stage: str | None
+
+
+_payloads: Mapping[str, StagePayload] = MappingProxyType({})
+_routes: Mapping[str, CallbackRoute] = MappingProxyType({})
+
+
+def compile_stages() -> None:
+    """Build and validate every stage payload and callback route.
+
+    Called once on startup; raises ``ValueError`` if ``STAGE_TEXTS`` contains a
+    button that cannot be routed, so a broken keyboard fails the deploy instead
+    of a user's tap.
+    """
+
+    global _payloads, _routes
+    payloads: Dict[str, StagePayload] = {}
+    routes: Dict[str, CallbackRoute] = {}
+
+    for position, stage in enumerate(DEFAULT_STAGE_ORDER):
+        spec = STAGE_TEXTS[stage]
+        next_stage = DEFAULT_STAGE_ORDER[position + 1] if position + 1 < len(DEFAULT_STAGE_ORDER) else None
+        buttons = spec.get("buttons", [])
+        if not buttons:
+            raise ValueError(f"{stage} has no buttons")
+        actions = [_action(stage, button["callback_data"]) for button in buttons]
+        advancing = "complete" if "complete" in actions else actions[-1]
+
+        rows = []
+        for button, action in zip(buttons, actions):
+            callback_data = button["callback_data"]
+            if callback_data in routes:
+                raise ValueError(f"Duplicate callback_data '{callback_data}' in {stage}")
+            routes[callback_data] = CallbackRoute(
+                stage=stage,
+                action=action,
+                next_stage=next_stage if action == advancing else None,
+            )
+            rows.append([InlineKeyboardButton(text=button["text"], callback_data=callback_data)])
+
+        payloads[stage] = StagePayload(
+            stage=stage,
+            text=_render_text(spec),
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=rows),
+            video_url=STAGE_VIDEO_URLS.get(stage),
+        )
+
+    _payloads = MappingProxyType(payloads)
+    _routes = MappingProxyType(routes)
+
+
+def render(stage: str) -> StagePayload:
+    """Return the precompiled payload for ``stage``."""
+
+    if not _payloads:
+        compile_stages()
+    return _payloads[stage]
+
+
+def route(callback_data: str) -> CallbackRoute | None:
+    """Resolve a stage button's ``callback_data`` with a single dict lookup."""
+
+    if not _routes:
+        compile_stages()
+    return _routes.get(callback_data)
+
+
+def callback_routes() -> Mapping[str, CallbackRoute]:
+    if not _routes:
+        compile_stages()
+    return _routes
+
+
+def _action(stage: str, callback_data: str) -> str:
+    if len(callback_data.encode("utf-8")) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data '{callback_data}' exceeds {MAX_CALLBACK_DATA_BYTES} bytes")
+    prefix = f"{stage}_"
+    action = callback_data[len(prefix):] if callback_data.startswith(prefix) else ""
+    if action not in STAGE_ACTIONS:
+        raise ValueError(f"Button '{callback_data}' in {stage} does not match '{stage}_<action>'")
+    return action
+
+
+def _render_text(spec: Mapping[str, Any]) -> str:
+    title = html.escape(spec["title"], quote=False)
+    body = html.escape(spec["text"], quote=False)
+    return f"<b>{title}</b>\n\n{body}"
@@ -0,0 +1,122 @@
+"""Startup pipeline: concurrent pre-warming, readiness and time-to-first-response."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict
+
+import metrics
+
+if TYPE_CHECKING:
+    from aiohttp import web
+    from aiogram import Bot, Dispatcher
+    from aiogram.types import TelegramObject
+
+    from config import BotConfig
+
+logger = logging.getLogger(__name__)
+
+# ``main`` imports this module before anything heavy, so this is close to process start.
+PROCESS_STARTED_AT = time.monotonic()
+
+_ready = False
+_first_response_at: float | None = None
+_warm_seconds: Dict[str, float] = {}
+
+
+def elapsed() -> float:
+    return time.monotonic() - PROCESS_STARTED_AT
+
+
+async def warm_up(bot: Bot, config: BotConfig) -> None:
+    """Pre-warm the Sheets connection and user cache, media cache and bot identity concurrently."""
+
+    import funnel_stats
+    import sheets_client
+    from media_cache import get_media_cache
+
+    async def sheets() -> None:
+        users_loaded = await sheets_client.warm_up()
+        logger.info("User index warmed with %s users", users_loaded)
+        await funnel_stats.start(config.data_dir)
+
+    async def identity() -> None:
+        me = await bot.me()
+        logger.info("Welcome24 bot is @%s", me.username)
+
+    async def media() -> None:
+        await asyncio.to_thread(get_media_cache, config.data_dir)
+
+    await asyncio.gather(
+        _timed("sheets", sheets()),
+        _timed("bot", identity()),
+        _timed("media_cache", media()),
+    )
+
+
+async def _timed(component: str, step: Awaitable[None]) -> None:
+    started = time.monotonic()
+    await step
+    seconds = _warm_seconds[component] = time.monotonic() - started
+    metrics.STARTUP_COMPONENT_SECONDS.set(seconds, component)
+    logger.info("Warmed %s in %.2fs", component, seconds)
+
+
+def mark_ready() -> None:
+    global _ready
+    _ready = True
+    metrics.STARTUP_SECONDS.set(elapsed())
+    logger.info("Ready %.2fs after start", elapsed())
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+class FirstResponseMiddleware:
+    """Outer update middleware recording when the first update was handled."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        global _first_response_at
+        try:
+            return await handler(event, data)
+        finally:
+            if _first_response_at is None:
+                _first_response_at = elapsed()
+                metrics.TIME_TO_FIRST_RESPONSE.set(_first_response_at)
+                logger.info("First update handled %.2fs after start", _first_response_at)
+
+
+def install(dp: Dispatcher) -> None:
+    dp.update.outer_middleware(FirstResponseMiddleware())
+
+
+async def handle_ready(request: web.Request) -> web.Response:
+    from aiohttp import web
+
+    import sheets_client
+
+    try:
+        sheets_stale = await sheets_client.is_stale()
+    except Exception:  # noqa: BLE001 - e.g. the cluster's Sheets writer is restarting
+        logger.debug("Could not tell whether Sheets reads are stale", exc_info=True)
+        sheets_stale = True
+    body = {
+        "ready": _ready,
+        "uptime_seconds": round(elapsed(), 3),
+        "warm_seconds": {name: round(seconds, 3) for name, seconds in _warm_seconds.items()},
+        "first_response_seconds": round(_first_response_at, 3) if _first_response_at is not None else None,
+        "sheets_stale": sheets_stale,
+    }
+    return web.json_response(body, status=200 if _ready else 503)
+
+
+def register(app: web.Application, path: str = "/ready") -> None:
+    app.router.add_get(path, handle_ready)
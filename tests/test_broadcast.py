@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+import broadcast  # noqa: E402
+import outbound  # noqa: E402
+
+
+class _Bot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, outbound._priority.get()))
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.sent.append((chat_id, outbound._priority.get()))
+
+
+def _job(tmp_path, bot):
+    config = SimpleNamespace(admin_chat_id=1, data_dir=tmp_path, broadcast_messages_per_second=1000)
+    return broadcast.BroadcastJob(bot, config, "job", "hello")
+
+
+def test_progress_reports_are_interactive_while_messages_are_broadcast(tmp_path, monkeypatch):
+    async def audience():
+        return [10, 11]
+
+    bot = _Bot()
+    job = _job(tmp_path, bot)
+    monkeypatch.setattr(job, "_audience", audience)
+    asyncio.run(job.run())
+
+    assert bot.sent[0] == (1, outbound.INTERACTIVE)
+    assert sorted(bot.sent[1:3]) == [(10, outbound.BROADCAST), (11, outbound.BROADCAST)]
+    assert bot.sent[-1] == (1, outbound.INTERACTIVE)
+
+
+def test_failed_audience_read_is_reported_and_resumable(tmp_path, monkeypatch):
+    async def audience():
+        raise ConnectionError("sheets down")
+
+    bot = _Bot()
+    job = _job(tmp_path, bot)
+    monkeypatch.setattr(job, "_audience", audience)
+    asyncio.run(job.run())
+
+    assert bot.sent == [(1, outbound.INTERACTIVE)]
+    assert '"finished": false' in job.meta_path.read_text(encoding="utf-8")
@@ -0,0 +1,36 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+import callback_dedup  # noqa: E402
+from stage_render import callback_routes  # noqa: E402
+
+
+def _tap(callback_data: str, query_id: str) -> SimpleNamespace:
+    async def answer(text=None, show_alert=None):
+        return None
+
+    return SimpleNamespace(id=query_id, data=callback_data, from_user=SimpleNamespace(id=42), answer=answer)
+
+
+def test_repeat_tap_is_skipped_while_a_slow_handler_runs():
+    callback_data = next(iter(callback_routes()))
+    deduplicator = callback_dedup.CallbackDeduplicator(window=0.05)
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.id)
+        await asyncio.sleep(0.2)
+
+    async def scenario():
+        first = asyncio.create_task(deduplicator(handler, _tap(callback_data, "1"), {}))
+        await asyncio.sleep(0.1)  # past the window, first handler still running
+        await deduplicator(handler, _tap(callback_data, "2"), {})
+        await first
+
+    asyncio.run(scenario())
+    assert calls == ["1"]
+    assert deduplicator.skipped["repeat"] == 1
@@ -0,0 +1,52 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker("test", slow_call_seconds=1.0, open_seconds=30.0, window=4, min_calls=4)
+
+
+def _advance(monkeypatch, seconds: float) -> None:
+    now = circuit_breaker.time.monotonic() + seconds
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now)
+
+
+def test_trips_when_half_of_the_window_failed_or_was_slow():
+    breaker = _breaker()
+    for seconds, failed in ((0.1, False), (0.1, True), (0.1, False)):
+        breaker.record(seconds, failed)
+    assert breaker.closed
+    breaker.record(2.0, False)  # slow counts as bad
+    assert breaker.state == circuit_breaker.OPEN and breaker.trips == 1
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_single_probe_after_the_open_period_closes_on_success(monkeypatch):
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record(0.1, True)
+    _advance(monkeypatch, 30.0)
+
+    assert breaker.state == circuit_breaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record(0.1, False)
+    assert breaker.closed and breaker.allow()
+
+
+def test_failed_probe_opens_again_and_a_lost_probe_frees_its_slot(monkeypatch):
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record(0.1, True)
+    _advance(monkeypatch, 30.0)
+    breaker.check()
+    breaker.record(0.1, True)
+    assert breaker.state == circuit_breaker.OPEN and breaker.trips == 2
+
+    _advance(monkeypatch, 30.0)
+    assert breaker.allow()
+    _advance(monkeypatch, 30.0)  # the probe never reported back
+    assert breaker.allow()
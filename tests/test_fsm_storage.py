@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+
+from fsm_storage import SQLiteStorage  # noqa: E402
+
+
+def _key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+def test_each_process_loads_only_its_own_chats(tmp_path):
+    path = tmp_path / "fsm.sqlite3"
+
+    async def write():
+        storage = SQLiteStorage(path, ttl=3600)
+        for chat_id in (1, 2, 3, 4):
+            await storage.set_state(_key(chat_id), f"state_{chat_id}")
+        await storage.close()
+
+    async def read():
+        storage = SQLiteStorage(path, ttl=3600, owns_chat=lambda chat_id: chat_id % 2 == 0)
+        states = [await storage.get_state(_key(chat_id)) for chat_id in (1, 2, 3, 4)]
+        return len(storage), states
+
+    asyncio.run(write())
+    assert asyncio.run(read()) == (2, [None, "state_2", None, "state_4"])
+
+
+def test_states_from_a_file_without_chat_ids_are_loaded_everywhere(tmp_path):
+    path = tmp_path / "fsm.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO fsm VALUES ('fsm:1:3:3:default', 'old', '{}', strftime('%s', 'now'))")
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        storage = SQLiteStorage(path, ttl=3600, owns_chat=lambda chat_id: False)
+        state = await storage.get_state(_key(3))
+        await storage.set_state(_key(3), "new")
+        await storage.close()
+        return state
+
+    assert asyncio.run(scenario()) == "old"
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT state, chat_id FROM fsm").fetchall() == [("new", 3)]
+
+
+def test_states_and_data_survive_a_restart_and_finished_flows_are_deleted(tmp_path):
+    path = tmp_path / "fsm.sqlite3"
+
+    async def first_run():
+        storage = SQLiteStorage(path, ttl=3600)
+        await storage.set_state(_key(1), "Registration:phone")
+        await storage.set_data(_key(1), {"name": "Алиса"})
+        await storage.set_state(_key(2), "Registration:city")
+        await storage.set_state(_key(2), None)
+        await storage.close()
+
+    async def second_run():
+        storage = SQLiteStorage(path, ttl=3600)
+        result = (await storage.get_state(_key(1)), await storage.get_data(_key(1)), len(storage))
+        await storage.close()
+        return result
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == ("Registration:phone", {"name": "Алиса"}, 1)
+
+
+def test_concurrent_changes_share_one_commit(tmp_path, monkeypatch):
+    storage = SQLiteStorage(tmp_path / "fsm.sqlite3", ttl=3600)
+    batches = []
+    write = storage._write
+    monkeypatch.setattr(storage, "_write", lambda rows: batches.append(len(rows)) or write(rows))
+
+    async def scenario():
+        await asyncio.gather(*(storage.set_state(_key(chat_id), "waiting") for chat_id in range(10)))
+        await storage.close()
+
+    asyncio.run(scenario())
+    assert batches == [10]
+
+
+def test_idle_states_expire_and_unserializable_data_is_rejected(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(tmp_path / "fsm.sqlite3", ttl=3600)
+        await storage.set_state(_key(1), "waiting")
+        storage._records[storage._key(_key(1))].updated_at -= 7200
+        state = await storage.get_state(_key(1))
+        with pytest.raises(TypeError):
+            await storage.set_data(_key(2), {"when": object()})
+        await storage.close()
+        return state
+
+    assert asyncio.run(scenario()) is None
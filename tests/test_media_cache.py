@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+import media_cache  # noqa: E402
+
+
+class _Bot:
+    def __init__(self, reply):
+        self.reply = reply
+        self.videos = []
+
+    async def send_video(self, chat_id, video, **kwargs):
+        self.videos.append(video)
+        return self.reply
+
+
+def _reply(**media):
+    return SimpleNamespace(**{"video": None, "document": None, "animation": None, **media})
+
+
+def test_video_file_id_is_cached_and_reused(tmp_path):
+    cache = media_cache.MediaCache(tmp_path / "media_cache.json")
+    bot = _Bot(_reply(video=SimpleNamespace(file_id="vid")))
+
+    async def scenario():
+        await cache.send_video(bot, 1, "https://example.com/a.mp4")
+        await cache.send_video(bot, 1, "https://example.com/a.mp4")
+
+    asyncio.run(scenario())
+    assert bot.videos == ["https://example.com/a.mp4", "vid"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_video_stored_as_a_document_is_not_cached(tmp_path):
+    cache = media_cache.MediaCache(tmp_path / "media_cache.json")
+    bot = _Bot(_reply(document=SimpleNamespace(file_id="doc")))
+
+    async def scenario():
+        await cache.send_video(bot, 1, "https://example.com/a.mov")
+
+    asyncio.run(scenario())
+    assert cache.get("https://example.com/a.mov") is None
+    assert not cache.path.exists()
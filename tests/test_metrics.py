@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_registry", {})
+    return metrics._registry
+
+
+def test_render_counters_gauges_and_escaped_labels(registry):
+    updates = metrics.counter("test_updates", "Updates", ("event",))
+    updates.inc('say "hi"')
+    updates.inc('say "hi"', amount=2)
+    queued = metrics.gauge("test_queued", "Queued")
+    queued.set(1.5)
+    metrics.gauge("test_live", "Live", ("kind",), callback=lambda: {("read",): 3})
+
+    assert metrics.render().splitlines() == [
+        "# HELP test_updates Updates",
+        "# TYPE test_updates counter",
+        'test_updates_total{event="say \\"hi\\""} 3',
+        "# HELP test_queued Queued",
+        "# TYPE test_queued gauge",
+        "test_queued 1.5",
+        "# HELP test_live Live",
+        "# TYPE test_live gauge",
+        'test_live{kind="read"} 3',
+    ]
+    with pytest.raises(ValueError):
+        metrics.counter("test_updates", "Again")
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    seconds = metrics.histogram("test_seconds", "Latency", ("layer",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        seconds.observe(value, "api")
+
+    samples = [line for line in metrics.render().splitlines() if not line.startswith("#")]
+    assert samples == [
+        'test_seconds_bucket{layer="api",le="0.1"} 2',
+        'test_seconds_bucket{layer="api",le="1"} 3',
+        'test_seconds_bucket{layer="api",le="+Inf"} 4',
+        'test_seconds_count{layer="api"} 4',
+        'test_seconds_sum{layer="api"} 3.65',
+    ]
+
+
+def test_observe_sheets_times_calls_and_counts_failures(monkeypatch):
+    seconds = metrics.Histogram("test_sheets_seconds", "Latency", ("layer", "function"))
+    errors = metrics.Counter("test_sheets_errors", "Errors", ("layer", "function"))
+    monkeypatch.setattr(metrics, "SHEETS_CALL_SECONDS", seconds)
+    monkeypatch.setattr(metrics, "SHEETS_ERRORS", errors)
+
+    @metrics.observe_sheets("api")
+    async def _read_rows(fail):
+        if fail:
+            raise ConnectionError
+        return "rows"
+
+    async def scenario():
+        assert await _read_rows(False) == "rows"
+        with pytest.raises(ConnectionError):
+            await _read_rows(True)
+
+    asyncio.run(scenario())
+    assert dict(errors._values) == {("api", "read_rows"): 1}
+    assert ("test_sheets_seconds_count", ("api", "read_rows"), 2) in list(seconds.samples())
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+import pytest
+
+from models import USER_HEADER, User, user_from_sheet_row, users_from_sheet_values
+
+ROW = ["7", "alice", "Alice", "Alice A", "+7000", "Moscow", "stage_1", "2026-01-01T10:00:00", "", "TRUE", "no"]
+
+
+def test_bulk_decoder_matches_the_per_row_decoder():
+    [(row_number, user)] = users_from_sheet_values([USER_HEADER, ROW], USER_HEADER)
+    assert row_number == 2
+    assert user == user_from_sheet_row(dict(zip(USER_HEADER, ROW)))
+    assert (user.registered_at, user.last_step_at) == (datetime(2026, 1, 1, 10, 0), None)
+    assert (user.reminder_1h_sent, user.reminder_24h_sent) == (True, False)
+
+
+def test_columns_are_found_by_header_and_short_rows_are_padded():
+    header = ["username", "chat_id", "extra"] + USER_HEADER[2:]
+    values = [header, ["bob", "8"], ["", "not a number"], ["carol", "9", "x", "", "", "", "", "stage_2"]]
+    decoded = users_from_sheet_values(values, USER_HEADER)
+    assert [(row, user.chat_id, user.username, user.current_stage) for row, user in decoded] == [
+        (2, 8, "bob", None),
+        (4, 9, "carol", "stage_2"),
+    ]
+
+
+def test_missing_columns_are_reported():
+    with pytest.raises(ValueError, match="current_stage"):
+        users_from_sheet_values([[name for name in USER_HEADER if name != "current_stage"]], USER_HEADER)
+    assert users_from_sheet_values([], USER_HEADER) == []
+
+
+def test_apply_updates_tracks_only_changed_fields():
+    user = User(chat_id=7, current_stage="stage_1")
+    assert user.apply_updates({"current_stage": "stage_1", "reminder_1h_sent": "TRUE", "chat_id": 8}) == {
+        "reminder_1h_sent"
+    }
+    assert user.dirty_fields == {"reminder_1h_sent"} and user.chat_id == 7
+    user.mark_clean()
+    assert user.dirty_fields == frozenset()
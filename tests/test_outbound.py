@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+
+import outbound  # noqa: E402
+
+
+def _grants(scheduler, requests):
+    """Queue ``(priority class, chat_id)`` requests together and return the order they were granted in."""
+
+    order = []
+
+    async def send(priority_class, chat_id):
+        await scheduler.acquire(priority_class, chat_id)
+        order.append((priority_class, chat_id))
+
+    async def scenario():
+        await asyncio.gather(*(send(*request) for request in requests))
+        await scheduler.close()
+
+    asyncio.run(scenario())
+    return order
+
+
+def test_higher_classes_are_granted_first_once_the_budget_is_spent():
+    scheduler = outbound.OutboundScheduler(10)
+    scheduler._tokens = 0.0
+    order = _grants(scheduler, [(outbound.BROADCAST, 1), (outbound.REMINDER, 2), (outbound.INTERACTIVE, 3)])
+    assert order == [(outbound.INTERACTIVE, 3), (outbound.REMINDER, 2), (outbound.BROADCAST, 1)]
+
+
+def test_a_busy_chat_does_not_hold_back_other_chats(monkeypatch):
+    monkeypatch.setattr(outbound, "PRIVATE_CHAT_INTERVAL_SECONDS", 0.2)
+    scheduler = outbound.OutboundScheduler(100)
+    burst = [(outbound.INTERACTIVE, 1)] * (outbound.PER_CHAT_BURST + 1)
+    order = _grants(scheduler, burst + [(outbound.INTERACTIVE, 2)])
+    assert order[-1] == (outbound.INTERACTIVE, 1)
+
+
+def test_pause_holds_back_only_its_class():
+    scheduler = outbound.OutboundScheduler(100)
+    scheduler.pause(outbound.BROADCAST, 0.2)
+    started = time.monotonic()
+    order = _grants(scheduler, [(outbound.BROADCAST, 1), (outbound.INTERACTIVE, 2)])
+    assert order == [(outbound.INTERACTIVE, 2), (outbound.BROADCAST, 1)]
+    assert time.monotonic() - started >= 0.2
+
+
+def test_retry_after_pauses_the_class_and_retries(monkeypatch):
+    scheduler = outbound.OutboundScheduler(100)
+    middleware = outbound.OutboundMiddleware(scheduler)
+    method = SendMessage(chat_id=1, text="hi")
+    paused = []
+    monkeypatch.setattr(scheduler, "pause", lambda priority_class, seconds: paused.append((priority_class, seconds)))
+    calls = []
+
+    async def make_request(bot, sent):
+        calls.append(sent)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(sent, "Flood control exceeded", retry_after=0)
+        return "ok"
+
+    async def scenario():
+        with outbound.priority(outbound.REMINDER):
+            result = await middleware(make_request, None, method)
+        await scheduler.close()
+        return result
+
+    assert asyncio.run(scenario()) == "ok"
+    assert paused == [(outbound.REMINDER, 0)]
+    assert calls == [method, method]
+
+
+def test_group_interval_is_shared_between_processes():
+    assert outbound.OutboundScheduler(30).group_interval == outbound.GROUP_CHAT_INTERVAL_SECONDS
+    # Four workers writing to the same group each send at most once every 12s: 20 per minute together.
+    assert outbound.OutboundScheduler(30 / 4, processes=4).group_interval == 12.0
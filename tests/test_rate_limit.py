@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import metrics
+import sheets_api
+from rate_limit import TokenBucket
+
+
+def test_burst_is_served_at_once_and_the_rest_at_the_rate():
+    bucket = TokenBucket("test", rate=50.0, capacity=3)
+
+    async def scenario():
+        return [await bucket.acquire() for _ in range(5)]
+
+    started = time.monotonic()
+    waits = asyncio.run(scenario())
+    assert max(waits[:3]) < 0.01
+    assert 0.03 <= time.monotonic() - started < 0.5
+    assert bucket.stats()["acquired"] == 5
+    assert bucket.stats()["max_wait_seconds"] >= 0.015
+
+
+def test_per_minute_bucket_allows_ten_seconds_of_burst():
+    bucket = TokenBucket.per_minute("test", 60)
+    assert (bucket.rate, bucket.capacity) == (1.0, 10)
+
+
+def test_pause_drops_the_burst_and_holds_callers_back():
+    bucket = TokenBucket("test", rate=20.0, capacity=5)
+
+    async def scenario():
+        await bucket.acquire()
+        bucket.pause(0.1)
+        return await bucket.acquire()
+
+    assert asyncio.run(scenario()) >= 0.1
+
+
+def test_sheets_budgets_are_exported_as_gauges(monkeypatch):
+    monkeypatch.setattr(sheets_api, "_LIMITERS", {"read": TokenBucket("read", rate=1.0, capacity=1)})
+    asyncio.run(sheets_api._LIMITERS["read"].acquire())
+
+    text = metrics.render()
+    assert 'welcome24_sheets_budget_waiting{kind="read"} 0' in text
+    assert 'welcome24_sheets_budget_max_wait_seconds{kind="read"}' in text
+    assert 'kind="write"' not in text.split("welcome24_sheets_budget_waiting", 1)[1].split("# HELP", 1)[0]
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+import reminder_scheduler  # noqa: E402
+import sheets_client  # noqa: E402
+from constants import DEFAULT_STAGE_ORDER  # noqa: E402
+from models import User  # noqa: E402
+
+STEP = datetime(2026, 1, 1, 12, 0)
+
+
+def _user(**fields) -> User:
+    return User(chat_id=7, current_stage=DEFAULT_STAGE_ORDER[1], last_step_at=STEP, **fields)
+
+
+def test_next_reminder_sends_1h_then_24h():
+    assert reminder_scheduler.next_reminder(_user(), STEP) == (STEP + timedelta(hours=1), "1h")
+    assert reminder_scheduler.next_reminder(_user(reminder_1h_sent=True), STEP) == (STEP + timedelta(hours=24), "24h")
+    assert reminder_scheduler.next_reminder(_user(reminder_1h_sent=True, reminder_24h_sent=True), STEP) is None
+
+
+def test_next_reminder_skips_to_24h_for_a_user_a_day_idle():
+    now = STEP + timedelta(hours=30)
+    assert reminder_scheduler.next_reminder(_user(), now) == (STEP + timedelta(hours=24), "24h")
+
+
+def test_next_reminder_ignores_users_on_the_final_stage():
+    user = _user()
+    user.current_stage = DEFAULT_STAGE_ORDER[-1]
+    assert reminder_scheduler.next_reminder(user, STEP) is None
+
+
+def test_overdue_24h_reminder_is_sent_once_and_marks_both_flags(monkeypatch):
+    user = User(chat_id=7, current_stage=DEFAULT_STAGE_ORDER[1], last_step_at=datetime.utcnow() - timedelta(days=2))
+    writes = []
+    sent = []
+
+    async def get_user_by_chat_id(chat_id):
+        return user
+
+    async def update_user(chat_id, updates):
+        writes.append(updates)
+        user.apply_updates(updates)
+        return user
+
+    async def send(target, kind):
+        sent.append(kind)
+
+    monkeypatch.setattr(sheets_client, "get_user_by_chat_id", get_user_by_chat_id)
+    monkeypatch.setattr(sheets_client, "update_user", update_user)
+    scheduler = reminder_scheduler.ReminderScheduler(send)
+    scheduler.rebuild([user])
+
+    async def scenario():
+        for chat_id, kind in scheduler._pop_due(datetime.utcnow()):
+            await scheduler._fire(chat_id, kind)
+
+    asyncio.run(scenario())
+    assert sent == ["24h"]
+    assert writes == [{"reminder_24h_sent": True, "reminder_1h_sent": True}]
+    assert len(scheduler) == 0
+
+
+def test_stop_removes_the_user_listener(monkeypatch):
+    async def list_users():
+        return []
+
+    async def send(user, kind):
+        pass
+
+    monkeypatch.setattr(sheets_client, "list_users", list_users)
+    monkeypatch.setattr(sheets_client, "_user_listeners", [])
+    scheduler = reminder_scheduler.ReminderScheduler(send)
+
+    async def scenario():
+        await scheduler.start()
+        assert len(sheets_client._user_listeners) == 1
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+    assert sheets_client._user_listeners == []
@@ -0,0 +1,37 @@
+from sheet_changes import diff_keys
+
+HEADER = ("chat_id", "current_stage")
+
+
+def _columns(*rows):
+    chat_ids = [HEADER[0]] + [row[0] for row in rows]
+    stages = [HEADER[1]] + [row[1] for row in rows]
+    return chat_ids, stages
+
+
+def test_unchanged_sheet_has_an_empty_diff():
+    chat_ids, stages = _columns(("1", "stage_0"), ("2", "stage_1"))
+    assert diff_keys(chat_ids, stages, {1: (2, "stage_0"), 2: (3, "stage_1")}).empty
+
+
+def test_moved_removed_and_edited_rows():
+    chat_ids, stages = _columns(("2", "stage_1"), ("3", "stage_2"))
+    diff = diff_keys(chat_ids, stages, {1: (2, "stage_0"), 2: (3, "stage_1"), 3: (4, "stage_0")})
+    assert diff.moved == {2: 2}
+    assert diff.removed == [1]
+    assert diff.blocks == [(2, 3)]
+
+
+def test_changed_blocks_are_merged_when_adjacent():
+    rows = [(str(chat_id), "stage_0") for chat_id in range(1, 10)]
+    chat_ids, stages = _columns(*rows)
+    cached = {chat_id: (chat_id + 1, "stage_0") for chat_id in range(1, 10)}
+    for chat_id in (2, 4, 9):
+        cached[chat_id] = (chat_id + 1, "stage_1")
+
+    assert diff_keys(chat_ids, stages, cached, block_rows=3).blocks == [(2, 6), (10, 10)]
+
+
+def test_blank_and_repeated_chat_ids_are_ignored():
+    chat_ids, stages = _columns(("", ""), ("5", "stage_0"), ("5", "stage_3"))
+    assert diff_keys(chat_ids, stages, {5: (3, "stage_0")}).empty
@@ -0,0 +1,171 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from urllib.parse import unquote
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("google.auth")
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+import sheets_api  # noqa: E402
+from models import USER_HEADER  # noqa: E402
+from sheets_async import AsyncSheetsClient  # noqa: E402
+
+SPREADSHEET_ID = "sheet"
+
+
+class FakeSheets:
+    """Just enough of the Sheets v4 API for ``AsyncSheetsClient``, one list of rows per tab."""
+
+    def __init__(self) -> None:
+        self.tabs = {"Users": [list(USER_HEADER), ["7", "alice"]]}
+        self.requests = []
+        self.throttle = {}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        path = unquote(request.path).removeprefix(f"/v4/spreadsheets/{SPREADSHEET_ID}")
+        body = await request.json() if request.can_read_body else None
+        key = f"{request.method} {path}"
+        self.requests.append(key)
+        if self.throttle.get(key, 0):
+            self.throttle[key] -= 1
+            return web.json_response({"error": "rate limited"}, status=429)
+
+        if path == "" and request.method == "GET":
+            sheets = [{"properties": {"sheetId": idx, "title": title}} for idx, title in enumerate(self.tabs)]
+            return web.json_response({"sheets": sheets})
+        if path == ":batchUpdate":
+            return web.json_response({"replies": [self._apply(item) for item in body["requests"]]})
+        if path == "/values:batchUpdate":
+            for item in body["data"]:
+                title, cell = item["range"].strip("'").split("'!")
+                row = self.tabs[title][int(cell[1:]) - 1]
+                column = ord(cell[0]) - ord("A")
+                row.extend([""] * (column + 1 - len(row)))
+                row[column] = item["values"][0][0]
+            return web.json_response({})
+        title, a1_range = path.removeprefix("/values/").split("!")
+        rows = self.tabs[title.strip("'")]
+        if a1_range.endswith(":append"):
+            rows.extend(body["values"])
+            first = len(rows) - len(body["values"]) + 1
+            return web.json_response({"updates": {"updatedRange": f"{title}!A{first}:K{len(rows)}"}})
+        first, last = a1_range.split(":")
+        if first.isdigit():
+            return web.json_response({"values": rows[int(first) - 1 : int(last)]})
+        columns = slice(ord(first) - ord("A"), ord(last) - ord("A") + 1)
+        return web.json_response({"values": [row[columns] for row in rows]})
+
+    def _apply(self, item):
+        if "addSheet" in item:
+            title = item["addSheet"]["properties"]["title"]
+            self.tabs[title] = []
+            return {"addSheet": {"properties": {"sheetId": len(self.tabs) - 1, "title": title}}}
+        span = item["deleteDimension"]["range"]
+        title = list(self.tabs)[span["sheetId"]]
+        del self.tabs[title][span["startIndex"] : span["endIndex"]]
+        return {}
+
+
+def _client(server: TestServer, worksheet_name: str) -> AsyncSheetsClient:
+    client = AsyncSheetsClient(
+        {},
+        SPREADSHEET_ID,
+        worksheet_name,
+        api_url=str(server.make_url("/v4/spreadsheets")),
+        token_uri=str(server.make_url("/token")),
+    )
+    client._token = "token"
+    client._token_expires_at = time.monotonic() + 3600
+    return client
+
+
+def _run(monkeypatch, scenario):
+    sheets = FakeSheets()
+    config = SimpleNamespace(
+        sheets_backend="aiohttp",
+        sheets_read_per_minute=6000,
+        sheets_write_per_minute=6000,
+        sheets_call_timeout_seconds=5,
+        sheets_slow_call_seconds=5,
+        sheets_breaker_open_seconds=30,
+        archive_worksheet_name="Archive",
+    )
+    monkeypatch.setattr(sheets_api, "_config", lambda: config)
+    monkeypatch.setattr(sheets_api, "_LIMITERS", {})
+    monkeypatch.setattr(sheets_api, "_breaker", None)
+    monkeypatch.setattr(sheets_api, "_archive_worksheet", None)
+    monkeypatch.setattr(sheets_api, "_archive_missing", False)
+    monkeypatch.setattr(sheets_api, "RETRY_BASE_DELAY_SECONDS", 0.01)
+
+    async def main():
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", sheets.handle)
+        server = TestServer(app)
+        await server.start_server()
+        monkeypatch.setattr(sheets_api, "_async_client", _client(server, "Users"))
+        monkeypatch.setattr(sheets_api, "_archive_client", _client(server, "Archive"))
+        try:
+            await scenario(sheets)
+        finally:
+            await sheets_api.close()
+            await server.close()
+
+    asyncio.run(main())
+    return sheets
+
+
+def test_values_append_batch_update_and_delete_rows(monkeypatch):
+    async def scenario(sheets):
+        assert await sheets_api.row_values(2) == ["7", "alice"]
+
+        response = await sheets_api.append_once([["8", "bob"]])
+        assert sheets_api.appended_row_index(response) == 3
+
+        await sheets_api.batch_update([{"range": "G3", "values": [["stage_2"]]}])
+        assert sheets.tabs["Users"][2][USER_HEADER.index("current_stage")] == "stage_2"  # column G
+
+        await sheets_api.delete_once([(2, 7)])
+        assert [row[0] for row in sheets.tabs["Users"]] == ["chat_id", "8"]
+
+    sheets = _run(monkeypatch, scenario)
+    # The tab id for the delete is looked up once, as a separate read.
+    assert sheets.requests.count("GET ") == 1
+
+
+def test_rate_limited_read_is_retried(monkeypatch):
+    async def scenario(sheets):
+        sheets.throttle["GET /values/'Users'!2:2"] = 2
+        assert await sheets_api.row_values(2) == ["7", "alice"]
+
+    sheets = _run(monkeypatch, scenario)
+    assert sheets.requests == ["GET /values/'Users'!2:2"] * 3
+
+
+def test_missing_archive_is_looked_up_once_and_created_on_first_append(monkeypatch):
+    async def scenario(sheets):
+        assert await sheets_api.archive_keys() == []
+        assert await sheets_api.archive_row_values(2) == []
+        assert sheets.requests == ["GET "]
+
+        await sheets_api.append_once([["7", "alice"]], archive=True)
+        assert sheets.tabs["Archive"] == [list(USER_HEADER), ["7", "alice"]]
+        # Adding the tab, its header and the rows are three writes against the budget.
+        assert sheets_api.limiter_stats()["write"]["acquired"] == 3
+        assert await sheets_api.archive_keys() == [["chat_id", "username"], ["7", "alice"]]
+
+    _run(monkeypatch, scenario)
+
+
+def test_archive_lookup_is_under_the_read_budget(monkeypatch):
+    async def scenario(sheets):
+        sheets.throttle["GET "] = 1
+        assert await sheets_api.archive_keys() == []
+        assert sheets_api.limiter_stats()["read"]["acquired"] == 2
+
+    sheets = _run(monkeypatch, scenario)
+    assert sheets.requests == ["GET ", "GET "]
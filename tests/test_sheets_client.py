@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+
+import sheets_api
+import sheets_backend
+import sheets_client
+from models import User
+
+
+def test_concurrent_compare_and_set_updates_of_one_chat_let_exactly_one_through(monkeypatch, tmp_path: Path):
+    started = datetime(2026, 1, 1, 12, 0)
+    sheet = {"last_step_at": started}
+    backend = sheets_backend.SheetsIndexBackend(tmp_path / "journal.jsonl", lambda previous, current: None, lambda: 0)
+    backend.index.put(2, User(chat_id=7, current_stage="stage_1", last_step_at=started))
+
+    async def check_last_step_at(row_index, chat_id, expected):
+        await asyncio.sleep(0.01)
+        if sheet["last_step_at"] != expected:
+            raise sheets_api.ConcurrentUpdateError(f"User {chat_id} was modified concurrently")
+
+    async def batch_update(data):
+        await asyncio.sleep(0.01)
+        sheet["last_step_at"] = None
+
+    monkeypatch.setattr(sheets_client, "_user_backend", backend)
+    monkeypatch.setattr(backend, "_degraded", lambda: False)
+    monkeypatch.setattr(sheets_api, "check_last_step_at", check_last_step_at)
+    monkeypatch.setattr(sheets_api, "batch_update", batch_update)
+
+    async def scenario():
+        return await asyncio.gather(
+            sheets_client.update_user(7, {"current_stage": "stage_2"}, expected_last_step_at=started),
+            sheets_client.update_user(7, {"current_stage": "stage_3"}, expected_last_step_at=started),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    errors = [result for result in results if isinstance(result, sheets_api.ConcurrentUpdateError)]
+    assert len(errors) == 1
+    assert [result.current_stage for result in results if isinstance(result, User)] == ["stage_2"]
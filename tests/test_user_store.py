@@ -0,0 +1,84 @@
+import sqlite3
+from pathlib import Path
+
+from models import User
+from user_store import SQLiteUserStore
+
+
+def _store(tmp_path: Path) -> SQLiteUserStore:
+    return SQLiteUserStore(tmp_path / "users.sqlite3")
+
+
+def test_unplaced_and_all_keep_insertion_order_not_chat_id_order(tmp_path):
+    store = _store(tmp_path)
+    for chat_id in (30, 10, 20):
+        store.insert(User(chat_id=chat_id, current_stage="stage_0"))
+
+    assert [user.chat_id for user in store.unplaced()] == [30, 10, 20]
+
+    store.set_sheet_row(20, 2)
+    assert [user.chat_id for user in store.all()] == [20, 30, 10]
+
+
+def test_update_records_pending_fields_until_synced(tmp_path):
+    store = _store(tmp_path)
+    user = User(chat_id=1, current_stage="stage_0")
+    store.insert(user)
+    store.set_sheet_row(1, 2)
+
+    user.apply_updates({"current_stage": "stage_1"})
+    store.update(user, {"current_stage"})
+    [(pending_user, sheet_row, fields)] = store.pending_changes()
+    assert (pending_user.current_stage, sheet_row, set(fields)) == ("stage_1", 2, {"current_stage"})
+
+    user.apply_updates({"current_stage": "stage_2"})
+    store.update(user, {"current_stage"})
+    store.mark_synced(1, fields)  # superseded by the second update
+    assert store.pending_changes()[0][2] != fields
+
+    store.mark_synced(1, store.pending_changes()[0][2])
+    assert store.pending_changes() == []
+
+
+def test_reconcile_keeps_unsynced_local_fields_and_detaches_missing_users(tmp_path):
+    store = _store(tmp_path)
+    for chat_id in (1, 2):
+        store.insert(User(chat_id=chat_id, current_stage="stage_0"))
+        store.set_sheet_row(chat_id, chat_id + 1)
+    local = store.get(1)
+    local.apply_updates({"current_stage": "stage_2"})
+    store.update(local, {"current_stage"})
+    gone = store.get(2)
+    gone.apply_updates({"username": "gone"})
+    store.update(gone, {"username"})
+
+    remote = User(chat_id=1, username="edited", current_stage="stage_1")
+    changes = store.reconcile([(2, remote)])
+
+    current = store.get(1)
+    assert (current.username, current.current_stage) == ("edited", "stage_2")
+    assert [(previous.chat_id, now.username) for previous, now in changes] == [(1, "edited")]
+    # User 2 left the sheet: it stays local, but its cells are no longer pending.
+    assert store.get(2) is not None
+    assert [user.chat_id for user, _, _ in store.pending_changes()] == [1]
+    assert store.sheet_keys() == {1: (2, "stage_2")}
+
+
+def test_opening_an_old_store_numbers_users_in_sheet_order(tmp_path):
+    path = tmp_path / "users.sqlite3"
+    store = SQLiteUserStore(path)
+    for chat_id, row in ((5, 3), (9, 2)):
+        store.insert(User(chat_id=chat_id, current_stage="stage_0"))
+        store.set_sheet_row(chat_id, row)
+    store.close()
+    conn = sqlite3.connect(path)
+    conn.execute("DROP INDEX users_position")
+    conn.execute("ALTER TABLE users DROP COLUMN position")
+    conn.commit()
+    conn.close()
+
+    reopened = SQLiteUserStore(path)
+    reopened.insert(User(chat_id=1, current_stage="stage_0"))
+    assert [user.chat_id for user in reopened.unplaced()] == [1]
+    positions = dict(reopened.conn.execute("SELECT chat_id, position FROM users"))
+    assert positions == {9: 1, 5: 2, 1: 3}
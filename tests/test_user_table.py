@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from constants import DEFAULT_STAGE_ORDER  # noqa: E402
+from models import User  # noqa: E402
+from user_table import UserTable, chat_ids  # noqa: E402
+
+NOW = datetime(2026, 1, 2, 12, 0)
+FIRST, SECOND, FINAL = DEFAULT_STAGE_ORDER[0], DEFAULT_STAGE_ORDER[1], DEFAULT_STAGE_ORDER[-1]
+
+
+def _table() -> UserTable:
+    return UserTable.from_users(
+        [
+            User(chat_id=1, current_stage=FIRST, registered_at=NOW - timedelta(days=1), last_step_at=NOW),
+            User(chat_id=2, current_stage=SECOND, last_step_at=NOW - timedelta(hours=2)),
+            User(chat_id=3, current_stage=SECOND, last_step_at=NOW - timedelta(hours=30), reminder_1h_sent=True),
+            User(chat_id=4, current_stage=FINAL, last_step_at=NOW - timedelta(days=40)),
+            User(chat_id=5, current_stage="retired_stage"),
+        ]
+    )
+
+
+def test_stage_queries():
+    table = _table()
+    assert chat_ids(table.in_stages([SECOND, "retired_stage"])) == [2, 3]
+    assert chat_ids(table.in_stages()) == [1, 2, 3, 4, 5]
+    counts = table.stage_counts()
+    assert (counts[FIRST], counts[SECOND], counts[FINAL]) == (1, 2, 1)
+    assert sum(counts.values()) == 4  # the retired stage is left out
+
+
+def test_due_reminders_skip_the_final_stage_and_users_without_a_step():
+    table = _table()
+    assert chat_ids(table.due_reminders("1h", timedelta(hours=1), NOW)) == [2]
+    assert chat_ids(table.due_reminders("24h", timedelta(hours=24), NOW)) == [3]
+    with pytest.raises(ValueError):
+        table.due_reminders("2h", timedelta(hours=2), NOW)
+
+
+def test_archivable_and_registration_window():
+    table = _table()
+    assert chat_ids(table.archivable(NOW - timedelta(days=30), NOW - timedelta(days=60))) == [4]
+    assert chat_ids(table.registered_between(NOW - timedelta(days=2), NOW)) == [1]
@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from aiogram.methods import SendMessage  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import webhook_queue  # noqa: E402
+
+
+class _Dispatcher:
+    def __init__(self, result):
+        self.result = result
+        self.fed = []
+
+    async def feed_update(self, bot, update):
+        self.fed.append(update.update_id)
+        return self.result
+
+
+class _Bot:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, method):
+        self.calls.append(method)
+
+
+def _drain(dispatcher, bot, updates):
+    async def scenario():
+        hook = webhook_queue.FastAckWebhook(dispatcher, bot, workers=1)
+        hook.start()
+        for update_id in updates:
+            await hook.put(1, Update(update_id=update_id))
+        await hook.stop()
+        return hook
+
+    return asyncio.run(scenario())
+
+
+def test_method_returned_by_a_handler_is_sent_through_the_bot():
+    reply = SendMessage(chat_id=1, text="hi")
+    bot = _Bot()
+    hook = _drain(_Dispatcher(reply), bot, [1])
+    assert bot.calls == [reply]
+    assert hook.processed == 1
+
+
+def test_other_handler_results_are_not_sent():
+    bot = _Bot()
+    dispatcher = _Dispatcher(None)
+    hook = _drain(dispatcher, bot, [1, 2])
+    assert dispatcher.fed == [1, 2]
+    assert bot.calls == []
+    assert hook.processed == 2
@@ -0,0 +1,48 @@
+import asyncio
+
+from write_journal import WriteJournal
+
+
+def test_appends_survive_a_restart_and_consume_drops_the_front(tmp_path):
+    path = tmp_path / "journal.jsonl"
+
+    async def write():
+        journal = WriteJournal(path)
+        journal.append(["1", "alice"], ["username"], create=True)
+        journal.append(["2", "bob"], ["username"])
+        await journal.sync()
+
+    asyncio.run(write())
+    journal = WriteJournal(path)
+    assert journal.chat_ids() == {1, 2}
+    assert journal.entries()[0] == {"record": ["1", "alice"], "fields": ["username"], "create": True}
+
+    async def replay():
+        journal.append(["3", "carol"], ["username"])
+        await journal.consume(2)
+        await journal.sync()
+
+    asyncio.run(replay())
+    assert WriteJournal(path).chat_ids() == {3}
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"record": ["1"], "fields": [], "create": false}\n{"record": ["2"', encoding="utf-8")
+    assert WriteJournal(path).chat_ids() == {1}
+
+
+def test_appends_made_together_share_one_write(tmp_path, monkeypatch):
+    journal = WriteJournal(tmp_path / "journal.jsonl")
+    batches = []
+    write = journal._append_lines
+    monkeypatch.setattr(journal, "_append_lines", lambda lines: batches.append(len(lines)) or write(lines))
+
+    async def scenario():
+        for chat_id in range(5):
+            journal.append([str(chat_id)], [])
+        await journal.sync()
+
+    asyncio.run(scenario())
+    assert batches == [5]
+    assert len(WriteJournal(journal.path)) == 5
@@ -0,0 +1,339 @@
+"""Local SQLite (WAL) user store mirrored to Google Sheets."""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from models import USER_HEADER, User, user_from_sheet_row
+
+logger = logging.getLogger(__name__)
+
+# Same columns and order as the worksheet, so rows convert either way unchanged.
+USER_COLUMNS: Tuple[str, ...] = tuple(USER_HEADER)
+
+_COLUMN_TYPES = ",\n".join(
+    f"    {name} {'INTEGER PRIMARY KEY' if name == 'chat_id' else 'TEXT'}" for name in USER_COLUMNS
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+{_COLUMN_TYPES},
+    sheet_row INTEGER,
+    position INTEGER
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS users_sheet_row ON users (sheet_row);
+CREATE TABLE IF NOT EXISTS pending (
+    chat_id INTEGER NOT NULL,
+    field TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, field)
+) WITHOUT ROWID;
+"""
+
+# Stores created before ``position`` existed get it numbered in sheet order.
+_ADD_POSITION = """
+ALTER TABLE users ADD COLUMN position INTEGER;
+UPDATE users SET position = ordered.position
+FROM (
+    SELECT chat_id, ROW_NUMBER() OVER (ORDER BY COALESCE(sheet_row, 0) <= 0, sheet_row, chat_id) AS position
+    FROM users
+) AS ordered
+WHERE users.chat_id = ordered.chat_id;
+"""
+
+_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+
+# ``sheet_row`` of a user whose append was sent but not confirmed, and of one
+# whose row disappeared from the worksheet.
+_APPENDING = 0
+_DETACHED = -1
+
+PendingChange = Tuple[User, int | None, Dict[str, int]]
+
+
+class SQLiteUserStore:
+    """Primary user store in a WAL-mode SQLite file.
+
+    Every local write also records the changed ``(chat_id, field)`` pairs in the
+    ``pending`` table; the Sheets replicator drains it in batches. ``sheet_row``
+    is ``NULL`` until the user has been appended to the worksheet and ``0``
+    while that append is unconfirmed, so a lost response is resolved by chat_id
+    rather than by appending again. A user whose row disappears from the sheet
+    is detached (``-1``): kept locally but no longer mirrored or re-appended,
+    and its unsynced cells are dropped because there is no row left to write
+    them to. ``position`` numbers users in the order they were added, since
+    ``chat_id`` (the rowid) says nothing about that.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._seq = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            if "position" not in {column for _, column, *_ in conn.execute("PRAGMA table_info(users)")}:
+                conn.executescript(f"BEGIN; {_ADD_POSITION} COMMIT;")
+            conn.execute("CREATE INDEX IF NOT EXISTS users_position ON users (position)")
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM pending").fetchone()[0]
+            self._conn = conn
+            logger.info("Opened local user store %s", self.path)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def get(self, chat_id: int) -> User | None:
+        return self._one(f"{_SELECT} WHERE chat_id = ?", (chat_id,))
+
+    def get_by_username(self, username: str) -> User | None:
+        return self._one(f"{_SELECT} WHERE username = ? COLLATE NOCASE", (username,))
+
+    def usernames_with_prefix(self, prefix: str, limit: int) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT lower(username) FROM users"
+            " WHERE username >= ? COLLATE NOCASE AND username < ? COLLATE NOCASE"
+            " ORDER BY username COLLATE NOCASE LIMIT ?",
+            (prefix, prefix + "\U0010ffff", limit),
+        )
+        return [name for (name,) in rows]
+
+    def get_by_row(self, row_index: int) -> User | None:
+        return self._one(f"{_SELECT} WHERE sheet_row = ?", (row_index,))
+
+    def all(self) -> List[User]:
+        rows = self.conn.execute(f"{_SELECT} ORDER BY COALESCE(sheet_row, 0) <= 0, sheet_row, position")
+        return [_to_user(row) for row in rows]
+
+    def insert(self, user: User) -> None:
+        values = _sheet_values(user)
+        placeholders = ", ".join("?" for _ in USER_COLUMNS)
+        self.conn.execute(
+            f"INSERT INTO users ({', '.join(USER_COLUMNS)}, position)"
+            f" VALUES ({placeholders}, (SELECT COALESCE(MAX(position), 0) + 1 FROM users))",
+            values,
+        )
+
+    def update(self, user: User, changed: Iterable[str]) -> None:
+        fields = [name for name in USER_COLUMNS if name in set(changed)]
+        if not fields:
+            return
+        row = dict(zip(USER_COLUMNS, _sheet_values(user)))
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE users SET {', '.join(f'{name} = ?' for name in fields)} WHERE chat_id = ?",
+                [row[name] for name in fields] + [user.chat_id],
+            )
+            for name in fields:
+                self._seq += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO pending (chat_id, field, seq) VALUES (?, ?, ?)",
+                    (user.chat_id, name, self._seq),
+                )
+
+    def unplaced(self) -> List[User]:
+        """Users that have not been appended to the worksheet yet, or not confirmedly."""
+
+        rows = self.conn.execute(f"{_SELECT} WHERE sheet_row IS NULL OR sheet_row = ? ORDER BY position", (_APPENDING,))
+        return [_to_user(row) for row in rows]
+
+    def appending(self) -> List[int]:
+        """Chat_ids whose append was sent but never confirmed (e.g. the process died)."""
+
+        rows = self.conn.execute("SELECT chat_id FROM users WHERE sheet_row = ?", (_APPENDING,))
+        return [chat_id for (chat_id,) in rows]
+
+    def mark_appending(self, chat_ids: Iterable[int]) -> None:
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE users SET sheet_row = ? WHERE chat_id = ?",
+                [(_APPENDING, chat_id) for chat_id in chat_ids],
+            )
+
+    def pending_changes(self) -> List[PendingChange]:
+        """Return ``(user, sheet_row, {field: seq})`` for every user with unsynced cells."""
+
+        grouped: Dict[int, Dict[str, int]] = {}
+        for chat_id, name, seq in self.conn.execute("SELECT chat_id, field, seq FROM pending"):
+            grouped.setdefault(chat_id, {})[name] = seq
+
+        changes: List[PendingChange] = []
+        for chat_id, fields in grouped.items():
+            row = self.conn.execute(
+                f"SELECT {', '.join(USER_COLUMNS)}, sheet_row FROM users WHERE chat_id = ?",
+                (chat_id,),
+            ).fetchone()
+            if row is None:
+                continue
+            changes.append((_to_user(row[:-1]), row[-1], fields))
+        return changes
+
+    def mark_synced(self, chat_id: int, fields: Dict[str, int]) -> None:
+        """Drop pending entries that were not changed again since they were read."""
+
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM pending WHERE chat_id = ? AND field = ? AND seq = ?",
+                [(chat_id, name, seq) for name, seq in fields.items()],
+            )
+
+    def delete(self, chat_ids: Iterable[int]) -> None:
+        """Forget users (and their unsynced cells) that moved to the archive worksheet."""
+
+        params = [(chat_id,) for chat_id in chat_ids]
+        with self._transaction() as conn:
+            conn.executemany("DELETE FROM pending WHERE chat_id = ?", params)
+            conn.executemany("DELETE FROM users WHERE chat_id = ?", params)
+
+    def set_sheet_row(self, chat_id: int, row_index: int) -> None:
+        self.conn.execute("UPDATE users SET sheet_row = ? WHERE chat_id = ?", (row_index, chat_id))
+
+    def sheet_keys(self) -> Dict[int, Tuple[int, str]]:
+        """Map chat_id -> ``(sheet row, current_stage)`` for users placed in the worksheet."""
+
+        return {
+            chat_id: (sheet_row, stage or "")
+            for chat_id, sheet_row, stage in self.conn.execute(
+                "SELECT chat_id, sheet_row, current_stage FROM users WHERE sheet_row > 0"
+            )
+        }
+
+    def reconcile(self, rows: List[Tuple[int, User]]) -> List[Tuple[User | None, User]]:
+        """Apply decoded ``(sheet row, User)`` worksheet rows to the local store.
+
+        Cells edited in the sheet win unless the same field still has an
+        unsynced local change. Rows for unknown chat_ids are inserted, and
+        placed users missing from the sheet are detached. Returns
+        ``(previous, current)`` for every user that changed locally.
+        """
+
+        pending = self._pending_fields()
+        present = {remote.chat_id for _, remote in rows}
+        changes: List[Tuple[User | None, User]] = []
+        with self._transaction() as conn:
+            placed = [chat_id for (chat_id,) in conn.execute("SELECT chat_id FROM users WHERE sheet_row > 0")]
+            self._detach(conn, [chat_id for chat_id in placed if chat_id not in present])
+            for row_index, remote in rows:
+                change = self._apply_remote(conn, row_index, remote, pending)
+                if change is not None:
+                    changes.append(change)
+        return changes
+
+    def apply_sheet_rows(
+        self,
+        rows: List[Tuple[int, User]],
+        moved: Dict[int, int],
+        removed: Iterable[int],
+    ) -> List[Tuple[User | None, User]]:
+        """Apply part of the sheet with the rules of ``reconcile``.
+
+        ``rows`` are re-read worksheet rows, ``moved`` maps chat_id -> new row
+        for users whose cells did not change, and ``removed`` users are
+        detached.
+        """
+
+        pending = self._pending_fields()
+        changes: List[Tuple[User | None, User]] = []
+        with self._transaction() as conn:
+            self._detach(conn, list(removed))
+            conn.executemany(
+                "UPDATE users SET sheet_row = ? WHERE chat_id = ?",
+                [(row_index, chat_id) for chat_id, row_index in moved.items()],
+            )
+            for row_index, remote in rows:
+                change = self._apply_remote(conn, row_index, remote, pending)
+                if change is not None:
+                    changes.append(change)
+        return changes
+
+    def _detach(self, conn: sqlite3.Connection, chat_ids: List[int]) -> None:
+        if not chat_ids:
+            return
+        # Most likely deleted by hand; appending them again would undo that.
+        logger.warning("%s users disappeared from the sheet and will not be re-appended: %s", len(chat_ids), chat_ids)
+        conn.executemany(
+            "UPDATE users SET sheet_row = ? WHERE chat_id = ?",
+            [(_DETACHED, chat_id) for chat_id in chat_ids],
+        )
+        conn.executemany("DELETE FROM pending WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+
+    def _pending_fields(self) -> Dict[int, Set[str]]:
+        pending: Dict[int, Set[str]] = {}
+        for chat_id, name in self.conn.execute("SELECT chat_id, field FROM pending"):
+            pending.setdefault(chat_id, set()).add(name)
+        return pending
+
+    def _apply_remote(
+        self,
+        conn: sqlite3.Connection,
+        row_index: int,
+        remote: User,
+        pending: Dict[int, Set[str]],
+    ) -> Tuple[User | None, User] | None:
+        local = self.get(remote.chat_id)
+        if local is None:
+            self.insert(remote)
+            conn.execute("UPDATE users SET sheet_row = ? WHERE chat_id = ?", (row_index, remote.chat_id))
+            return None, remote
+
+        conn.execute("UPDATE users SET sheet_row = ? WHERE chat_id = ?", (row_index, remote.chat_id))
+        local_pending = pending.get(remote.chat_id, set())
+        edits = {
+            name: getattr(remote, name)
+            for name in USER_COLUMNS[1:]
+            if name not in local_pending and getattr(remote, name) != getattr(local, name)
+        }
+        current = self.get(remote.chat_id)
+        assert current is not None
+        changed = sorted(current.apply_updates(edits)) if edits else []
+        if not changed:
+            return None
+        row = dict(zip(USER_COLUMNS, _sheet_values(current)))
+        conn.execute(
+            f"UPDATE users SET {', '.join(f'{name} = ?' for name in changed)} WHERE chat_id = ?",
+            [row[name] for name in changed] + [remote.chat_id],
+        )
+        current.mark_clean()
+        return local, current
+
+    def _one(self, query: str, params: Tuple[Any, ...]) -> User | None:
+        row = self.conn.execute(query, params).fetchone()
+        return _to_user(row) if row is not None else None
+
+    def _transaction(self) -> "_Transaction":
+        return _Transaction(self.conn)
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.conn.execute("ROLLBACK" if exc_type is not None else "COMMIT")
+
+
+def _sheet_values(user: User) -> List[str]:
+    return user.to_sheet_row()
+
+
+def _to_user(row: Tuple[Any, ...]) -> User:
+    return user_from_sheet_row(dict(zip(USER_COLUMNS, row)))
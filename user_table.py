@@ -0,0 +1,132 @@
+"""Columnar ``User`` snapshot for vectorized audience, reminder and funnel queries."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Collection, Dict, Iterable, List
+
+import numpy as np
+
+from constants import DEFAULT_STAGE_ORDER
+from models import User
+
+UNKNOWN_STAGE = -1
+_STAGE_CODES: Dict[str, int] = {stage: code for code, stage in enumerate(DEFAULT_STAGE_ORDER)}
+
+
+def stage_code(stage: str | None) -> int:
+    """Position of ``stage`` in ``DEFAULT_STAGE_ORDER``; ``UNKNOWN_STAGE`` otherwise."""
+
+    return _STAGE_CODES.get(stage, UNKNOWN_STAGE) if stage else UNKNOWN_STAGE
+
+
+def epoch_seconds(value: datetime | None) -> float:
+    """Seconds since the epoch; naive datetimes are UTC like the rest of the bot. NaN if unset."""
+
+    if value is None:
+        return float("nan")
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@dataclass(frozen=True, slots=True)
+class UserTable:
+    """Immutable column-per-field view of a user list.
+
+    ``stage`` holds codes over ``DEFAULT_STAGE_ORDER`` (``UNKNOWN_STAGE`` for
+    empty or retired stages) and the timestamp columns are epoch seconds with
+    ``NaN`` for missing values, so every comparison against them is ``False``.
+    Query methods return ``chat_id`` arrays or plain counts.
+    """
+
+    chat_id: np.ndarray
+    stage: np.ndarray
+    registered_at: np.ndarray
+    last_step_at: np.ndarray
+    reminder_1h_sent: np.ndarray
+    reminder_24h_sent: np.ndarray
+
+    @classmethod
+    def from_users(cls, users: Iterable[User]) -> "UserTable":
+        users = list(users)
+        count = len(users)
+        return cls(
+            chat_id=np.fromiter((user.chat_id for user in users), dtype=np.int64, count=count),
+            stage=np.fromiter((stage_code(user.current_stage) for user in users), dtype=np.int16, count=count),
+            registered_at=np.fromiter(
+                (epoch_seconds(user.registered_at) for user in users), dtype=np.float64, count=count
+            ),
+            last_step_at=np.fromiter(
+                (epoch_seconds(user.last_step_at) for user in users), dtype=np.float64, count=count
+            ),
+            reminder_1h_sent=np.fromiter((user.reminder_1h_sent for user in users), dtype=np.bool_, count=count),
+            reminder_24h_sent=np.fromiter((user.reminder_24h_sent for user in users), dtype=np.bool_, count=count),
+        )
+
+    def __len__(self) -> int:
+        return int(self.chat_id.shape[0])
+
+    def in_stages(self, stages: Collection[str] | None = None) -> np.ndarray:
+        """Chat ids of users in any of ``stages`` (everyone if ``None``).
+
+        Stages outside ``DEFAULT_STAGE_ORDER`` match nobody.
+        """
+
+        if stages is None:
+            return self.chat_id
+        # Lookup table indexed by code + 1, so UNKNOWN_STAGE lands on slot 0.
+        wanted = np.zeros(len(DEFAULT_STAGE_ORDER) + 1, dtype=np.bool_)
+        for stage in stages:
+            code = _STAGE_CODES.get(stage)
+            if code is not None:
+                wanted[code + 1] = True
+        return self.chat_id[wanted[self.stage + 1]]
+
+    def stage_counts(self) -> Dict[str, int]:
+        """Number of users per stage in ``DEFAULT_STAGE_ORDER`` order; unknown stages are left out."""
+
+        counts = np.bincount(self.stage + 1, minlength=len(DEFAULT_STAGE_ORDER) + 1)
+        return {stage: int(counts[code + 1]) for code, stage in enumerate(DEFAULT_STAGE_ORDER)}
+
+    def idle_since(self, cutoff: datetime) -> np.ndarray:
+        """Boolean mask of users whose last step was at or before ``cutoff``."""
+
+        return self.last_step_at <= epoch_seconds(cutoff)
+
+    def due_reminders(self, kind: str, delay: timedelta, now: datetime) -> np.ndarray:
+        """Chat ids whose ``kind`` (``"1h"``/``"24h"``) reminder is due at ``now`` and not yet sent.
+
+        Users on the final stage get no reminders and the 24h reminder does
+        not wait for the 1h one, matching ``reminder_scheduler.next_reminder``.
+        A user who is a day idle without either is due for both here; the
+        scheduler sends only the 24h one.
+        """
+
+        mask = self.idle_since(now - delay) & (self.stage != len(DEFAULT_STAGE_ORDER) - 1)
+        if kind == "1h":
+            mask &= ~self.reminder_1h_sent & ~self.reminder_24h_sent
+        elif kind == "24h":
+            mask &= ~self.reminder_24h_sent
+        else:
+            raise ValueError(f"Unknown reminder kind '{kind}'")
+        return self.chat_id[mask]
+
+    def archivable(self, completed_before: datetime, inactive_before: datetime) -> np.ndarray:
+        """Chat ids of users who finished onboarding by ``completed_before`` or went idle by ``inactive_before``."""
+
+        finished = (self.stage == len(DEFAULT_STAGE_ORDER) - 1) & self.idle_since(completed_before)
+        return self.chat_id[finished | self.idle_since(inactive_before)]
+
+    def registered_between(self, start: datetime, end: datetime) -> np.ndarray:
+        """Chat ids of users registered in ``[start, end)``."""
+
+        registered = self.registered_at
+        return self.chat_id[(registered >= epoch_seconds(start)) & (registered < epoch_seconds(end))]
+
+
+def chat_ids(values: np.ndarray) -> List[int]:
+    """Convert a query result to plain ``int`` chat ids for the Bot API."""
+
+    return values.tolist()
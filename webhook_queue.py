@@ -0,0 +1,214 @@
+"""Fast-ack webhook handling with a per-chat ordered worker pool."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Set, Tuple
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+DEDUP_WINDOW = 10_000
+ENQUEUE_TIMEOUT_SECONDS = 2.0
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+_CHAT_SOURCES = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+
+def update_chat_id(payload: Dict[str, Any]) -> int:
+    """Best-effort chat (or sender) id of a raw update; ``0`` if it has none."""
+
+    for key in _CHAT_SOURCES:
+        item = payload.get(key)
+        if item and "chat" in item:
+            return int(item["chat"]["id"])
+    callback = payload.get("callback_query")
+    if callback:
+        message = callback.get("message")
+        if message and "chat" in message:
+            return int(message["chat"]["id"])
+        return int(callback["from"]["id"])
+    for item in payload.values():
+        if isinstance(item, dict) and "from" in item:
+            return int(item["from"]["id"])
+    return 0
+
+
+class FastAckWebhook:
+    """Answers Telegram immediately and feeds updates to a fixed worker pool.
+
+    Each chat has its own FIFO of pending updates and is handed to at most one
+    worker at a time, so a chat's updates run in order while other chats
+    proceed in parallel. When ``capacity`` updates are pending the request
+    waits briefly for room and then gets ``503`` so Telegram redelivers later.
+    An update that cannot be parsed is logged, counted as ``invalid`` and
+    acknowledged, so it does not hold back the updates behind it.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, workers: int = 8, capacity: int = 1000) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.workers = max(workers, 1)
+        self.capacity = max(capacity, 1)
+        self._pending: Dict[int, Deque[Tuple[float, Update]]] = {}
+        self._ready: asyncio.Queue[int] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._seen: OrderedDict[int, None] = OrderedDict()
+        self._accepting: Set[int] = set()
+        self._tasks: List[asyncio.Task[None]] = []
+        self.depth = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.invalid = 0
+        self.failed = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def register(self, app: web.Application, path: str) -> None:
+        app.router.add_post(path, self.handle)
+        app.router.add_get(f"{path.rstrip('/')}/queue", self.handle_stats)
+        app.on_startup.append(self._on_startup)
+        app.on_shutdown.append(self._on_shutdown)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "depth": self.depth,
+            "busy_chats": len(self._pending),
+            "processed": self.processed,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "last_lag_seconds": self.last_lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            payload = await request.json()
+            if not isinstance(payload, dict):
+                raise ValueError(f"expected a JSON object, got {type(payload).__name__}")
+        except ValueError:
+            self.invalid += 1
+            logger.warning("Dropping a webhook request with a malformed body", exc_info=True)
+            return web.Response()
+        update_id = payload.get("update_id")
+        if update_id in self._seen:
+            self.duplicates += 1
+            return web.Response()
+        if update_id in self._accepting:
+            # The first delivery is still waiting for room; only its outcome counts.
+            self.duplicates += 1
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(payload, context={"bot": self.bot})
+        except ValueError:  # pydantic's ValidationError
+            self.invalid += 1
+            logger.warning("Dropping update %s that failed validation", update_id, exc_info=True)
+            self._remember(update_id)
+            return web.Response()
+        if update_id is not None:
+            self._accepting.add(update_id)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), ENQUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            logger.warning("Webhook queue full (%s pending), asking Telegram to retry", self.depth)
+            return web.Response(status=503)
+        finally:
+            self._accepting.discard(update_id)
+
+        self._remember(update_id)
+        self._enqueue(update_chat_id(payload), update)
+        return web.Response()
+
+    async def put(self, chat_id: int, update: Update) -> None:
+        """Queue an already accepted update, waiting for room when ``capacity`` are pending."""
+
+        await self._slots.acquire()
+        self._enqueue(chat_id, update)
+
+    def _remember(self, update_id: int | None) -> None:
+        if update_id is None:
+            return
+        self._seen[update_id] = None
+        if len(self._seen) > DEDUP_WINDOW:
+            self._seen.popitem(last=False)
+
+    def _enqueue(self, chat_id: int, update: Update) -> None:
+        self.depth += 1
+        queue = self._pending.get(chat_id)
+        if queue is None:
+            self._pending[chat_id] = deque([(time.monotonic(), update)])
+            self._ready.put_nowait(chat_id)
+        else:
+            queue.append((time.monotonic(), update))
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._pending[chat_id]
+            enqueued_at, update = queue.popleft()
+            self.last_lag_seconds = time.monotonic() - enqueued_at
+            self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+            try:
+                result = await self.dispatcher.feed_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    # The update was acknowledged already, so a handler's reply-in-webhook is sent as a call.
+                    await self.bot(result)
+                self.processed += 1
+            except Exception:  # noqa: BLE001 - keep the worker alive
+                self.failed += 1
+                logger.exception("Failed to process update %s", update.update_id)
+            finally:
+                self.depth -= 1
+                self._slots.release()
+                if queue:
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._pending[chat_id]
+                self._ready.task_done()
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info("Fast-ack webhook started with %s workers, capacity %s", self.workers, self.capacity)
+
+    async def stop(self) -> None:
+        """Finish the pending updates (for up to ``DRAIN_TIMEOUT_SECONDS``) and stop the workers."""
+
+        if self.depth:
+            logger.info("Draining %s pending updates", self.depth)
+            try:
+                await asyncio.wait_for(self._ready.join(), DRAIN_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning("Dropped %s pending updates on shutdown", self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _on_startup(self, app: web.Application) -> None:
+        self.start()
+
+    async def _on_shutdown(self, app: web.Application) -> None:
+        await self.stop()
@@ -0,0 +1,112 @@
+"""Durable append-only journal of user writes that could not reach Google Sheets."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class WriteJournal:
+    """JSON-lines file of ``{"record": [...], "fields": [...], "create": bool}`` entries.
+
+    Each entry holds the user's full sheet row after the write, so the
+    journal can be overlaid on a fresh snapshot as well as replayed. ``append``
+    takes effect in memory at once; ``sync`` waits until it is on disk, and
+    appends made together share one write and fsync in a worker thread (group
+    commit). Replayed entries are dropped from the front with ``consume`` so
+    entries added during a replay survive.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._entries: List[Dict[str, Any]] = []
+        self._unwritten: List[str] = []
+        self._commit: asyncio.Future[None] | None = None
+        self._last_commit: asyncio.Future[None] | None = None
+        self._write_lock = asyncio.Lock()
+        self._writers: Set[asyncio.Task[None]] = set()
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    self._entries.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping torn journal line in %s", path)
+            if self._entries:
+                logger.warning("Write journal %s holds %s unreplayed writes", path, len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return list(self._entries)
+
+    def chat_ids(self) -> Set[int]:
+        return {int(entry["record"][0]) for entry in self._entries}
+
+    def append(self, record: List[Any], fields: List[str], create: bool = False) -> None:
+        """Add an entry and schedule its write; await ``sync`` for durability."""
+
+        entry = {"record": record, "fields": fields, "create": create}
+        self._entries.append(entry)
+        self._unwritten.append(json.dumps(entry, ensure_ascii=False) + "\n")
+        if self._commit is None:
+            self._commit = asyncio.get_running_loop().create_future()
+            writer = asyncio.create_task(self._write_batch(self._commit))
+            self._writers.add(writer)
+            writer.add_done_callback(self._writers.discard)
+        self._last_commit = self._commit
+
+    async def sync(self) -> None:
+        """Wait until every entry appended so far is on disk."""
+
+        if self._last_commit is not None:
+            await asyncio.shield(self._last_commit)
+
+    async def consume(self, count: int) -> None:
+        """Drop the first ``count`` entries after they were written to the sheet."""
+
+        self._entries = self._entries[count:]
+        async with self._write_lock:
+            # The rewrite also covers appends whose batch has not run yet.
+            lines = [json.dumps(entry, ensure_ascii=False) + "\n" for entry in self._entries]
+            unwritten = len(self._unwritten)
+            await asyncio.to_thread(self._rewrite, lines)
+            del self._unwritten[:unwritten]
+
+    async def _write_batch(self, commit: asyncio.Future[None]) -> None:
+        async with self._write_lock:
+            # Appends made from here on wait for the next batch.
+            self._commit = None
+            lines, self._unwritten = self._unwritten, []
+            try:
+                if lines:
+                    await asyncio.to_thread(self._append_lines, lines)
+            except Exception as exc:
+                self._unwritten[:0] = lines
+                commit.set_exception(exc)
+                # Surfaced to the writers awaiting ``sync``; mark it retrieved here.
+                commit.exception()
+            else:
+                commit.set_result(None)
+
+    def _append_lines(self, lines: List[str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as handle:
+            handle.writelines(lines)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def _rewrite(self, lines: List[str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            handle.writelines(lines)
+            handle.flush()
+            os.fsync(handle.fileno())
+        tmp_path.replace(self.path)